@@ -2,11 +2,23 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
-from app.database import engine, Base
-from app.routers import auth, teachers, students, files, analytics
+from app.database import engine, async_engine, Base, SessionLocal
+from app.migrations import run_migrations
+from app.routers import auth, teachers, students, files, analytics, jobs
+from app.services.job_queue import worker_pool, enqueue_job_once, JOB_WORKERS
+from app.services.answer_sheet_pipeline import requeue_orphaned_answer_sheets
+from app.services.pdf_service import PDFService
+from app.services.rollups import rollups_need_backfill
+from app.services.search_index import search_index_needs_backfill
+from app.services.similarity import similarity_needs_backfill
+from app.services.llm_cache import llm_cache
+from app.services.llm_client import llm_client, openai_breaker
+from app.services.upload_service import UploadSizeLimitMiddleware, UPLOAD_MAX_BYTES
+from app.services.batch_upload import BATCH_UPLOAD_MAX_BYTES
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 app = FastAPI(
     title="Insightful Learner API",
@@ -14,6 +26,18 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Oversized uploads are refused before the form is parsed; bulk uploads and
+# score imports allow the batch limit. Added before CORS, so the 413 still
+# carries CORS headers.
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=UPLOAD_MAX_BYTES,
+    path_limits={
+        "/api/teachers/answer-sheets/batch": BATCH_UPLOAD_MAX_BYTES,
+        "/api/teachers/scores/import": BATCH_UPLOAD_MAX_BYTES,
+    }
+)
+
 # CORS configuration
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:8080")
 app.add_middleware(
@@ -24,11 +48,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files for uploaded PDFs
+# Mount static files for uploaded PDFs (stored under uploads/blobs)
 os.makedirs("uploads", exist_ok=True)
-os.makedirs("uploads/syllabus", exist_ok=True)
-os.makedirs("uploads/answers", exist_ok=True)
-os.makedirs("uploads/text", exist_ok=True)
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 # Include routers
@@ -37,6 +58,48 @@ app.include_router(teachers.router, prefix="/api/teachers", tags=["teachers"])
 app.include_router(students.router, prefix="/api/students", tags=["students"])
 app.include_router(files.router, prefix="/api/files", tags=["files"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
+
+# Data stored before rollups, the search index and similarity detection
+# existed is backfilled by the job workers, so startup does not wait for it
+BACKFILL_JOBS = [
+    ("backfill_rollups", rollups_need_backfill),
+    ("backfill_search_index", search_index_needs_backfill),
+    ("backfill_similarity", similarity_needs_backfill),
+]
+
+@app.on_event("startup")
+def enqueue_backfills():
+    db = SessionLocal()
+    try:
+        for kind, needed in BACKFILL_JOBS:
+            if needed(db):
+                enqueue_job_once(db, kind)
+        db.commit()
+    finally:
+        db.close()
+
+# Background workers for answer-sheet processing (JOB_WORKERS=0 disables them)
+@app.on_event("startup")
+def start_job_workers():
+    if JOB_WORKERS <= 0:
+        return
+    db = SessionLocal()
+    try:
+        requeue_orphaned_answer_sheets(db)
+    finally:
+        db.close()
+    worker_pool.start()
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    worker_pool.stop()
+    PDFService.shutdown_executor()
+    llm_client.close()
+
+@app.on_event("shutdown")
+async def close_database():
+    await async_engine.dispose()
 
 @app.get("/")
 async def root():
@@ -46,3 +109,16 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/ai/stats")
+async def ai_stats():
+    """LLM client, circuit breaker and response cache counters"""
+    return {
+        "client": llm_client.stats(),
+        "circuit_breaker": openai_breaker.stats(),
+        "cache": llm_cache.stats()
+    }
+
+@app.get("/api/pdf/stats")
+async def pdf_stats():
+    """PDF extraction counters per engine"""
+    return PDFService.stats()
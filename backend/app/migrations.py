@@ -0,0 +1,234 @@
+"""
+Lightweight schema migrations
+Base.metadata.create_all() only creates missing tables. These steps bring
+tables created by an older version up to date. Every step is idempotent.
+"""
+import os
+import json
+import hashlib
+from sqlalchemy import inspect, text, bindparam, LargeBinary
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+# (table, column, column DDL or SQLAlchemy type)
+ADDED_COLUMNS = [
+    ("syllabus", "file_name", "VARCHAR"),
+    ("syllabus", "content_hash", "VARCHAR"),
+    ("answer_sheets", "file_name", "VARCHAR"),
+    ("answer_sheets", "content_hash", "VARCHAR"),
+    ("analyses", "topic_id", "INTEGER REFERENCES topics(id)"),
+    ("blobs", "text_z", LargeBinary()),
+    ("blobs", "questions_answers_z", LargeBinary()),
+    ("answer_sheets", "batch_id", "INTEGER REFERENCES upload_batches(id)"),
+    ("syllabus", "scored_sheets", "INTEGER DEFAULT 0"),
+    ("blobs", "claimed_by", "VARCHAR"),
+    ("blobs", "claimed_at", "TIMESTAMP"),
+]
+
+# (index name, table, columns)
+ADDED_INDEXES = [
+    ("ix_syllabus_content_hash", "syllabus", ["content_hash"]),
+    ("ix_answer_sheets_content_hash", "answer_sheets", ["content_hash"]),
+    ("ix_answer_sheets_student_id", "answer_sheets", ["student_id"]),
+    ("ix_answer_sheets_batch_id", "answer_sheets", ["batch_id"]),
+    ("ix_analyses_topic_id_answer_sheet_id", "analyses", ["topic_id", "answer_sheet_id"]),
+]
+
+# JSON columns created as TEXT by older versions; converted to JSONB on
+# PostgreSQL (SQLite stores JSON as text either way)
+JSONB_COLUMNS = [
+    ("syllabus", "topics"),
+    ("analyses", "details"),
+    ("blobs", "topics"),
+    ("jobs", "payload"),
+]
+
+# (index name, table, column, operator class) GIN indexes on PostgreSQL
+GIN_INDEXES = [
+    ("ix_syllabus_topics_gin", "syllabus", "topics", "jsonb_ops"),
+]
+
+# Indexes no query uses any more; they only slowed writes down
+DROPPED_INDEXES = ["ix_jobs_payload_gin"]
+
+# Rollup tables keyed by topic name before the topics table existed; they are
+# recreated empty and rebuilt by the backfill job queued at startup
+ROLLUP_TABLES = ["student_topic_rollups", "topic_rollups"]
+
+# Columns whose data has moved elsewhere. They are dropped where the database
+# supports it (older SQLite versions do not) and otherwise left unused.
+DROPPED_COLUMNS = [
+    ("analyses", "topic"),
+    ("syllabus", "text_content"),
+    ("answer_sheets", "text_content"),
+    ("answer_sheets", "questions_answers"),
+    ("blobs", "text_content"),
+    ("blobs", "questions_answers"),
+]
+
+def _backfill_topics(conn):
+    """Create Topic rows for existing syllabi and analyses and link the analyses"""
+    from app.services.topics import normalize_topic_key
+
+    topic_ids = {}
+    for row in conn.execute(text("SELECT id, syllabus_id, key FROM topics")):
+        topic_ids[(row.syllabus_id, row.key)] = row.id
+
+    def topic_id(syllabus_id, name):
+        key = normalize_topic_key(name)
+        if not key:
+            return None
+        if (syllabus_id, key) not in topic_ids:
+            conn.execute(
+                text("INSERT INTO topics (syllabus_id, name, key) VALUES (:syllabus_id, :name, :key)"),
+                {"syllabus_id": syllabus_id, "name": str(name).strip(), "key": key}
+            )
+            topic_ids[(syllabus_id, key)] = conn.execute(
+                text("SELECT id FROM topics WHERE syllabus_id = :syllabus_id AND key = :key"),
+                {"syllabus_id": syllabus_id, "key": key}
+            ).scalar()
+        return topic_ids[(syllabus_id, key)]
+
+    # Syllabus topic names first, so they become the canonical spelling
+    for row in conn.execute(text("SELECT id, topics FROM syllabus ORDER BY id")).fetchall():
+        topics = row.topics
+        if isinstance(topics, str):
+            topics = json.loads(topics)
+        for name in topics or []:
+            topic_id(row.id, name)
+
+    pairs = conn.execute(text(
+        "SELECT DISTINCT syllabus_id, topic FROM analyses WHERE topic_id IS NULL AND topic IS NOT NULL"
+    )).fetchall()
+    for syllabus_id, name in pairs:
+        conn.execute(
+            text("UPDATE analyses SET topic_id = :topic_id WHERE syllabus_id = :syllabus_id AND topic = :topic AND topic_id IS NULL"),
+            {"topic_id": topic_id(syllabus_id, name), "syllabus_id": syllabus_id, "topic": name}
+        )
+
+def _move_text_to_blobs(conn, columns):
+    """
+    Make blobs the only copy of extracted text and Q&A, stored compressed
+    Rows uploaded before content hashing are adopted into the store first.
+    """
+    from app.models import CompressedText, CompressedJSON
+
+    set_text = text(
+        "UPDATE blobs SET text_z = :text_z WHERE sha256 = :sha256 AND text_z IS NULL"
+    ).bindparams(bindparam("text_z", type_=CompressedText()))
+    set_qa = text(
+        "UPDATE blobs SET questions_answers_z = :qa WHERE sha256 = :sha256 AND questions_answers_z IS NULL"
+    ).bindparams(bindparam("qa", type_=CompressedJSON()))
+
+    if "text_content" in columns["blobs"]:
+        for row in conn.execute(text(
+            "SELECT sha256, text_content, questions_answers FROM blobs "
+            "WHERE text_content IS NOT NULL OR questions_answers IS NOT NULL"
+        )).fetchall():
+            if row.text_content is not None:
+                conn.execute(set_text, {"sha256": row.sha256, "text_z": row.text_content})
+            if row.questions_answers is not None:
+                conn.execute(set_qa, {"sha256": row.sha256, "qa": json.loads(row.questions_answers)})
+
+    for table in ("syllabus", "answer_sheets"):
+        if "text_content" not in columns[table]:
+            continue
+        has_qa = "questions_answers" in columns[table]
+        rows = conn.execute(text(
+            f"SELECT id, file_path, content_hash, text_content"
+            f"{', questions_answers' if has_qa else ''} FROM {table}"
+        )).fetchall()
+        for row in rows:
+            sha256 = row.content_hash
+            if not sha256:
+                if row.file_path and os.path.exists(row.file_path):
+                    with open(row.file_path, "rb") as f:
+                        sha256 = hashlib.sha256(f.read()).hexdigest()
+                    size = os.path.getsize(row.file_path)
+                elif row.text_content is not None:
+                    # File is gone; key the blob by its text so the text survives
+                    sha256 = hashlib.sha256(row.text_content.encode("utf-8")).hexdigest()
+                    size = 0
+                else:
+                    continue
+                exists = conn.execute(text("SELECT 1 FROM blobs WHERE sha256 = :sha256"), {"sha256": sha256}).first()
+                if not exists:
+                    conn.execute(
+                        text("INSERT INTO blobs (sha256, file_path, size, ref_count) VALUES (:sha256, :file_path, :size, 0)"),
+                        {"sha256": sha256, "file_path": row.file_path, "size": size}
+                    )
+                conn.execute(text("UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = :sha256"), {"sha256": sha256})
+                conn.execute(text(f"UPDATE {table} SET content_hash = :sha256 WHERE id = :id"), {"sha256": sha256, "id": row.id})
+            if row.text_content is not None:
+                conn.execute(set_text, {"sha256": sha256, "text_z": row.text_content})
+            if has_qa and row.questions_answers is not None:
+                conn.execute(set_qa, {"sha256": sha256, "qa": json.loads(row.questions_answers)})
+
+    # Release the uncompressed copies even where the columns cannot be dropped
+    for table, column in DROPPED_COLUMNS:
+        if table != "analyses" and column in columns[table]:
+            conn.execute(text(f"UPDATE {table} SET {column} = NULL"))
+
+def run_migrations(engine: Engine):
+    """Add columns and indexes missing from existing tables"""
+    from app.database import Base
+    from app.services.search_index import create_search_index
+
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    columns = {table: {c["name"] for c in inspector.get_columns(table)} for table in tables}
+
+    with engine.begin() as conn:
+        for table, column, ddl in ADDED_COLUMNS:
+            if table not in tables:
+                continue
+            if column not in columns[table]:
+                if not isinstance(ddl, str):
+                    ddl = ddl.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+        for name, table, index_columns in ADDED_INDEXES:
+            if table not in tables:
+                continue
+            existing = {i["name"] for i in inspector.get_indexes(table)}
+            if name not in existing:
+                conn.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(index_columns)})"))
+
+        if engine.dialect.name == "postgresql":
+            for table, column in JSONB_COLUMNS:
+                if table not in tables:
+                    continue
+                types = {c["name"]: str(c["type"]).upper() for c in inspector.get_columns(table)}
+                if types.get(column) != "JSONB":
+                    conn.execute(text(
+                        f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb"
+                    ))
+            for name, table, column, ops in GIN_INDEXES:
+                if table in tables and name not in {i["name"] for i in inspector.get_indexes(table)}:
+                    conn.execute(text(f"CREATE INDEX {name} ON {table} USING gin ({column} {ops})"))
+        for name in DROPPED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+        if "topic" in columns.get("analyses", ()):
+            _backfill_topics(conn)
+
+        if {"syllabus", "answer_sheets", "blobs"} <= tables:
+            _move_text_to_blobs(conn, columns)
+
+        if "search_entries" in tables:
+            create_search_index(conn)
+
+        for table in ROLLUP_TABLES:
+            if table in tables and "topic_id" not in columns[table]:
+                conn.execute(text(f"DROP TABLE {table}"))
+        for table in reversed(ROLLUP_TABLES):
+            Base.metadata.tables[table].create(conn, checkfirst=True)
+
+    for table, column in DROPPED_COLUMNS:
+        if column not in columns.get(table, ()):
+            continue
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        except SQLAlchemyError:
+            pass
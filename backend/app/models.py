@@ -1,23 +1,43 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Text, Boolean, UniqueConstraint, Index, LargeBinary
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
-from sqlalchemy import TypeDecorator
-import json
-from app.database import Base
+from sqlalchemy import TypeDecorator, JSON
+from sqlalchemy.dialects.postgresql import JSONB
+import zlib
+from datetime import datetime
+from app.database import Base, json_dumps, json_loads
 
-# JSON type for SQLite compatibility
-class JSONType(TypeDecorator):
-    impl = Text
+# Native JSON: JSONB on PostgreSQL (indexable and queryable), JSON elsewhere.
+# None is stored as SQL NULL rather than JSON null.
+JSONType = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql")
+
+# Large text stored deflate-compressed (the same compression as gzip)
+class CompressedText(TypeDecorator):
+    impl = LargeBinary
     cache_ok = True
     
     def process_bind_param(self, value, dialect):
         if value is not None:
-            return json.dumps(value)
+            return zlib.compress(value.encode("utf-8"), 6)
+        return value
+    
+    def process_result_value(self, value, dialect):
+        if value is not None:
+            return zlib.decompress(value).decode("utf-8")
         return value
+
+class CompressedJSON(CompressedText):
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is not None:
+            value = json_dumps(value)
+        return super().process_bind_param(value, dialect)
     
     def process_result_value(self, value, dialect):
+        value = super().process_result_value(value, dialect)
         if value is not None:
-            return json.loads(value)
+            return json_loads(value)
         return value
 
 class User(Base):
@@ -50,40 +70,79 @@ class AccessCode(Base):
 
 class Syllabus(Base):
     __tablename__ = "syllabus"
+    __table_args__ = (
+        # Topic containment lookups (topics @> '["..."]'); PostgreSQL only
+        Index("ix_syllabus_topics_gin", "topics", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     teacher_id = Column(Integer, ForeignKey("users.id"))
     file_path = Column(String)
-    text_content = Column(Text)
+    file_name = Column(String, nullable=True)  # Original upload name
+    content_hash = Column(String, nullable=True, index=True)  # Blob.sha256
     topics = Column(JSONType)  # List of extracted topics
+    scored_sheets = Column(Integer, default=0)  # Answer sheets counted in its TermFrequency rows
     created_at = Column(DateTime, server_default=func.now())
     
     teacher = relationship("User", back_populates="syllabus", foreign_keys=[teacher_id])
+    # Extracted text lives on the blob
+    blob = relationship("Blob", primaryjoin="foreign(Syllabus.content_hash) == Blob.sha256", viewonly=True)
     analyses = relationship("Analysis", back_populates="syllabus")
+    topic_rows = relationship("Topic", back_populates="syllabus")
 
 class AnswerSheet(Base):
     __tablename__ = "answer_sheets"
     
     id = Column(Integer, primary_key=True, index=True)
-    student_id = Column(Integer, ForeignKey("users.id"))
+    student_id = Column(Integer, ForeignKey("users.id"), index=True)
     access_code = Column(String)
     file_path = Column(String)
-    text_content = Column(Text)
-    questions_answers = Column(JSONType)  # Segmented Q&A
+    file_name = Column(String, nullable=True)  # Original upload name
+    content_hash = Column(String, nullable=True, index=True)  # Blob.sha256
     status = Column(String, default="processing")  # processing, processed, error
+    batch_id = Column(Integer, ForeignKey("upload_batches.id"), nullable=True, index=True)  # Bulk upload, if any
     created_at = Column(DateTime, server_default=func.now())
     processed_at = Column(DateTime, nullable=True)
     
     student = relationship("User", back_populates="answer_sheets")
+    batch = relationship("UploadBatch", back_populates="answer_sheets")
     analyses = relationship("Analysis", back_populates="answer_sheet")
+    # Extracted text and segmented Q&A live on the blob
+    blob = relationship("Blob", primaryjoin="foreign(AnswerSheet.content_hash) == Blob.sha256", viewonly=True)
+
+class UploadBatch(Base):
+    """A teacher's bulk upload of a class's answer sheets"""
+    __tablename__ = "upload_batches"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    teacher_id = Column(Integer, ForeignKey("users.id"), index=True)
+    file_count = Column(Integer, default=0)  # Files received, including rejected ones
+    rejected = Column(JSONType)  # [{"file_name", "error"}] for files not stored
+    created_at = Column(DateTime, server_default=func.now())
+    
+    answer_sheets = relationship("AnswerSheet", back_populates="batch")
+
+class Topic(Base):
+    """Canonical topic of a syllabus"""
+    __tablename__ = "topics"
+    __table_args__ = (UniqueConstraint("syllabus_id", "key", name="uq_topics_syllabus_key"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    syllabus_id = Column(Integer, ForeignKey("syllabus.id"), index=True)
+    name = Column(String)  # Canonical display name
+    key = Column(String, index=True)  # Normalized name used for matching
+    created_at = Column(DateTime, server_default=func.now())
+    
+    syllabus = relationship("Syllabus", back_populates="topic_rows")
 
 class Analysis(Base):
     __tablename__ = "analyses"
+    __table_args__ = (Index("ix_analyses_topic_id_answer_sheet_id", "topic_id", "answer_sheet_id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     answer_sheet_id = Column(Integer, ForeignKey("answer_sheets.id"))
     syllabus_id = Column(Integer, ForeignKey("syllabus.id"))
-    topic = Column(String)
+    topic_id = Column(Integer, ForeignKey("topics.id"))
     understanding_score = Column(Float)  # 0-100
     confidence = Column(Float)  # 0-1
     details = Column(JSONType)  # Additional analysis details
@@ -91,4 +150,125 @@ class Analysis(Base):
     
     answer_sheet = relationship("AnswerSheet", back_populates="analyses")
     syllabus = relationship("Syllabus", back_populates="analyses")
+    topic = relationship("Topic")
+
+class TopicRollup(Base):
+    """Running score totals per topic, maintained with each analysis"""
+    __tablename__ = "topic_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    topic_id = Column(Integer, ForeignKey("topics.id"), unique=True)
+    score_sum = Column(Float, default=0)
+    score_count = Column(Integer, default=0)
+    score_min = Column(Float, nullable=True)
+    score_max = Column(Float, nullable=True)
+
+class StudentTopicRollup(Base):
+    """Running score totals per (topic, student)"""
+    __tablename__ = "student_topic_rollups"
+    __table_args__ = (UniqueConstraint("topic_id", "student_id", name="uq_student_topic_rollups"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    topic_id = Column(Integer, ForeignKey("topics.id"))
+    student_id = Column(Integer, ForeignKey("users.id"), index=True)
+    score_sum = Column(Float, default=0)
+    score_count = Column(Integer, default=0)
+    score_min = Column(Float, nullable=True)
+    score_max = Column(Float, nullable=True)
+
+class TermFrequency(Base):
+    """Answer sheets of a syllabus that use a topic term, for IDF weighting"""
+    __tablename__ = "term_frequencies"
+    __table_args__ = (UniqueConstraint("syllabus_id", "term", name="uq_term_frequencies"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    syllabus_id = Column(Integer, ForeignKey("syllabus.id"), index=True)
+    term = Column(String)  # Stemmed topic term, as in TopicMatcher.terms
+    sheet_count = Column(Integer, default=0)
+
+class Blob(Base):
+    """Content-addressed upload, shared by every row that uploaded the same bytes"""
+    __tablename__ = "blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String, unique=True, index=True)
+    file_path = Column(String)
+    size = Column(Integer)
+    ref_count = Column(Integer, default=0)
+    # Derived artifacts, shared by every upload of the same content. The large
+    # ones are compressed and only loaded when accessed.
+    text_content = deferred(Column("text_z", CompressedText, nullable=True))
+    topics = Column(JSONType, nullable=True)
+    questions_answers = deferred(Column("questions_answers_z", CompressedJSON, nullable=True))
+    created_at = Column(DateTime, server_default=func.now())
+    last_used_at = Column(DateTime, nullable=True)
+    # Worker deriving the artifacts, so identical uploads processed at the
+    # same time are extracted once (compare-and-set, like Job claims)
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+
+class SearchEntry(Base):
+    """
+    One searchable passage: a Q&A pair of an answer sheet or a passage of a
+    syllabus. The full-text index over it is dialect specific (FTS5 on SQLite,
+    a tsvector column with a GIN index on PostgreSQL); see search_index.
+    """
+    __tablename__ = "search_entries"
+    
+    id = Column(Integer, primary_key=True)
+    blob_id = Column(Integer, ForeignKey("blobs.id"), index=True)
+    kind = Column(String)  # "answer" or "syllabus"
+    position = Column(Integer)  # Pair or passage number within the document
+    question = Column(Text, nullable=True)
+    answer = Column(Text)
+
+class AnswerSignature(Base):
+    """MinHash signature of one answer of a blob's Q&A pairs"""
+    __tablename__ = "answer_signatures"
+    __table_args__ = (UniqueConstraint("blob_id", "position", name="uq_answer_signatures"),)
+    
+    id = Column(Integer, primary_key=True)
+    blob_id = Column(Integer, ForeignKey("blobs.id"), index=True)
+    position = Column(Integer)  # Index of the pair in Blob.questions_answers
+    signature = Column(LargeBinary)  # uint32 hash minimums
+
+class AnswerBand(Base):
+    """LSH band of an answer signature; answers sharing a band are compared"""
+    __tablename__ = "answer_bands"
+    
+    id = Column(Integer, primary_key=True)
+    band_hash = Column(BigInteger, index=True)  # Hash of the band number and its values
+    blob_id = Column(Integer, ForeignKey("blobs.id"), index=True)
+    position = Column(Integer)
+
+class SimilarityFlag(Base):
+    """Nearly identical answers by two students of the same cohort"""
+    __tablename__ = "similarity_flags"
+    __table_args__ = (
+        UniqueConstraint("answer_sheet_id", "position", "other_answer_sheet_id", "other_position", name="uq_similarity_flags"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    answer_sheet_id = Column(Integer, ForeignKey("answer_sheets.id"), index=True)  # The lower sheet id
+    position = Column(Integer)
+    other_answer_sheet_id = Column(Integer, ForeignKey("answer_sheets.id"), index=True)
+    other_position = Column(Integer)
+    similarity = Column(Float)  # Estimated Jaccard similarity of the answers' word 3-grams
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, index=True)  # e.g. "process_answer_sheet"
+    payload = Column(JSONType)
+    status = Column(String, default="queued", index=True)  # queued, running, done, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    last_error = Column(Text, nullable=True)  # Error of each failed attempt, newest last
+    created_at = Column(DateTime, default=datetime.utcnow)
+    run_after = Column(DateTime, default=datetime.utcnow, index=True)  # Retry backoff
+    started_at = Column(DateTime, nullable=True)
+    locked_by = Column(String, nullable=True)  # host:pid of the claiming dispatcher
+    finished_at = Column(DateTime, nullable=True)
 
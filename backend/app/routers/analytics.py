@@ -1,24 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, insert, delete
 from app.database import get_db
-from app.models import User, Analysis, AnswerSheet, Syllabus
-from app.services.ai_service import AIService
+from app.models import User, Analysis, AnswerSheet, Syllabus, Topic, TopicRollup, StudentTopicRollup
+from app.services.ai_service import ai_service
+from app.services.rollups import apply_analyses, remove_scores
+from app.services.term_frequencies import load_term_frequencies, record_sheet_terms, forget_sheet_terms, sheet_terms
+from app.services.topic_matcher import get_syllabus_matcher
+from app.services.export_service import export_rows, EXPORT_MEDIA_TYPES
+from app.services.similarity import similarity_report
+from app.services.topics import TopicResolver, normalize_topic_key
+import importlib.util
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 router = APIRouter()
-ai_service = AIService()
 
-def process_answer_sheet_analysis(answer_sheet_id: int, db: Session):
-    """Process answer sheet and create analyses"""
+def get_analysis_syllabus(db: Session) -> Optional[Syllabus]:
+    """Syllabus answer sheets are analyzed against"""
+    # Get teacher's syllabus (for now, get the most recent one)
+    # In production, link answer sheets to specific syllabi
+    return db.query(Syllabus).order_by(Syllabus.created_at.desc()).first()
+
+def _topic_names_by_key(topics: List[str]) -> Dict[str, str]:
+    """Normalized key -> syllabus spelling, for reading rollups by Topic.key"""
+    names = {}
+    for topic in topics:
+        names.setdefault(normalize_topic_key(topic), topic)
+    names.pop("", None)
+    return names
+
+def remove_answer_sheet_analyses(db: Session, answer_sheet: AnswerSheet) -> int:
+    """
+    Delete a sheet's analyses and take them back out of the rollups and the
+    term frequencies; not committed. Returns the analyses deleted.
+    """
+    rows = db.query(Analysis.topic_id, Analysis.understanding_score, Analysis.syllabus_id).filter(
+        Analysis.answer_sheet_id == answer_sheet.id
+    ).all()
+    if not rows:
+        return 0
+    db.execute(delete(Analysis).where(Analysis.answer_sheet_id == answer_sheet.id))
+    remove_scores(db, ((answer_sheet.student_id, topic_id, score) for topic_id, score, _ in rows))
+
+    # Imported scores have no Q&A pairs and were never counted in the term frequencies
+    qa_pairs = answer_sheet.blob.questions_answers if answer_sheet.blob else None
+    if qa_pairs:
+        for syllabus in db.query(Syllabus).filter(Syllabus.id.in_({syllabus_id for _, _, syllabus_id in rows})):
+            forget_sheet_terms(db, syllabus.id, sheet_terms(get_syllabus_matcher(syllabus.id, syllabus.topics), qa_pairs))
+    return len(rows)
+
+def process_answer_sheet_analysis(
+    answer_sheet_id: int,
+    db: Session,
+    analyses_data: Optional[List[Dict[str, Any]]] = None
+):
+    """
+    Process answer sheet and create analyses
+    analyses_data may carry scores already produced together with the
+    segmentation; otherwise the topics are analyzed here. Analyses left by
+    an earlier run of the sheet's job are replaced, so a retried job does
+    not count the sheet twice.
+    """
     answer_sheet = db.query(AnswerSheet).filter(AnswerSheet.id == answer_sheet_id).first()
     if not answer_sheet:
         return
     
-    # Get teacher's syllabus (for now, get the most recent one)
-    # In production, link answer sheets to specific syllabi
-    syllabus = db.query(Syllabus).order_by(Syllabus.created_at.desc()).first()
+    syllabus = get_analysis_syllabus(db)
     
     if not syllabus or not syllabus.topics:
         answer_sheet.status = "error"
@@ -26,26 +76,47 @@ def process_answer_sheet_analysis(answer_sheet_id: int, db: Session):
         return
     
     # Get Q&A pairs
-    qa_pairs = answer_sheet.questions_answers or []
+    qa_pairs = answer_sheet.blob.questions_answers if answer_sheet.blob else None
+    qa_pairs = qa_pairs or []
     if not qa_pairs:
         answer_sheet.status = "error"
         db.commit()
         return
     
+    # Analyses of an earlier run are replaced in the same transaction as the
+    # new ones are stored, and before the corpus is read, which counted them
+    remove_answer_sheet_analyses(db, answer_sheet)
+    
     # Analyze understanding for each topic
-    analyses_data = ai_service.analyze_topic_understanding(syllabus.topics, qa_pairs)
+    if analyses_data is None:
+        corpus = load_term_frequencies(db, syllabus.id)
+        analyses_data = ai_service.analyze_topic_understanding(syllabus.topics, qa_pairs, syllabus.id, corpus)
     
-    # Create analysis records
+    # Create analysis records, mapping analyzer topic names onto syllabus topics
+    resolver = TopicResolver(db, syllabus.id)
+    rows = []
+    scores = []
     for analysis_data in analyses_data:
-        analysis = Analysis(
-            answer_sheet_id=answer_sheet.id,
-            syllabus_id=syllabus.id,
-            topic=analysis_data["topic"],
-            understanding_score=analysis_data["understanding_score"],
-            confidence=analysis_data.get("confidence", 0.5),
-            details=analysis_data.get("details", {})
-        )
-        db.add(analysis)
+        topic = resolver.resolve(analysis_data["topic"])
+        if topic is None:
+            continue
+        rows.append({
+            "answer_sheet_id": answer_sheet.id,
+            "syllabus_id": syllabus.id,
+            "topic_id": topic.id,
+            "understanding_score": analysis_data["understanding_score"],
+            "confidence": analysis_data.get("confidence", 0.5),
+            "details": analysis_data.get("details", {})
+        })
+        scores.append((topic.id, analysis_data["understanding_score"]))
+    
+    # One multi-row INSERT instead of an ORM object per topic
+    if rows:
+        db.execute(insert(Analysis), rows)
+    
+    # Keep dashboard rollups and the scorer's term frequencies in step, in the same transaction
+    apply_analyses(db, answer_sheet.student_id, scores)
+    record_sheet_terms(db, syllabus.id, sheet_terms(get_syllabus_matcher(syllabus.id, syllabus.topics), qa_pairs))
     
     answer_sheet.status = "processed"
     answer_sheet.processed_at = datetime.utcnow()
@@ -54,64 +125,79 @@ def process_answer_sheet_analysis(answer_sheet_id: int, db: Session):
 @router.get("/teacher/{teacher_id}/overview")
 async def get_teacher_overview(
     teacher_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get teacher dashboard overview"""
-    teacher = db.query(User).filter(User.id == teacher_id, User.role == "teacher").first()
+    teacher = await db.scalar(select(User).where(User.id == teacher_id, User.role == "teacher"))
     if not teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
     
-    # Get all students
-    students = db.query(User).filter(User.role == "student").all()
-    
-    # Get all analyses
-    analyses = db.query(Analysis).join(AnswerSheet).filter(
-        AnswerSheet.student_id.in_([s.id for s in students])
-    ).all()
+    total_students = await db.scalar(select(func.count(User.id)).where(User.role == "student"))
     
     # Get syllabus topics
-    syllabus = db.query(Syllabus).filter(Syllabus.teacher_id == teacher.id).order_by(Syllabus.created_at.desc()).first()
+    syllabus = await db.scalar(
+        select(Syllabus).where(Syllabus.teacher_id == teacher.id).order_by(Syllabus.created_at.desc()).limit(1)
+    )
     topics = syllabus.topics if syllabus else []
+    topic_names = _topic_names_by_key(topics)
+    
+    # Read the rollups: O(topics x students) rows, independent of history size
+    def student_rollups(*columns):
+        return select(*columns).select_from(StudentTopicRollup).join(
+            User, StudentTopicRollup.student_id == User.id
+        ).join(Topic, StudentTopicRollup.topic_id == Topic.id).where(User.role == "student")
+    
+    score_sum, score_count = (await db.execute(student_rollups(
+        func.sum(StudentTopicRollup.score_sum), func.sum(StudentTopicRollup.score_count)
+    ))).one()
+    average_understanding = score_sum / score_count if score_count else 0
+    
+    topic_totals = (await db.execute(student_rollups(
+        Topic.key,
+        func.sum(StudentTopicRollup.score_sum),
+        func.sum(StudentTopicRollup.score_count)
+    ).where(Topic.key.in_(topic_names)).group_by(Topic.key))).all() if topic_names else []
+    topic_averages = {topic_names[key]: total / count for key, total, count in topic_totals if count}
+    
+    student_topic_averages = [
+        (topic_names[key], student_name, total / count)
+        for key, student_name, total, count in (await db.execute(student_rollups(
+            Topic.key,
+            User.name,
+            func.sum(StudentTopicRollup.score_sum),
+            func.sum(StudentTopicRollup.score_count)
+        ).where(Topic.key.in_(topic_names)).group_by(
+            Topic.key, User.id, User.name
+        ))).all()
+        if count
+    ] if topic_names else []
     
     # Calculate statistics
     topic_stats = {}
     for topic in topics:
-        topic_analyses = [a for a in analyses if a.topic == topic]
-        if topic_analyses:
-            avg_score = sum(a.understanding_score for a in topic_analyses) / len(topic_analyses)
+        if topic in topic_averages:
             topic_stats[topic] = {
-                "average": round(avg_score, 1),
+                "average": round(topic_averages[topic], 1),
                 "student_scores": {}
             }
-            
-            # Get scores per student
-            for student in students:
-                student_analyses = [
-                    a for a in topic_analyses 
-                    if a.answer_sheet.student_id == student.id
-                ]
-                if student_analyses:
-                    student_avg = sum(a.understanding_score for a in student_analyses) / len(student_analyses)
-                    topic_stats[topic]["student_scores"][student.name] = round(student_avg, 1)
-    
-    # Get recent uploads
-    recent_uploads = db.query(AnswerSheet).join(User).filter(
+    for topic, student_name, student_avg in student_topic_averages:
+        topic_stats[topic]["student_scores"][student_name] = round(student_avg, 1)
+    
+    # Get recent uploads, loading each student with the same query
+    recent_uploads = (await db.scalars(select(AnswerSheet).join(AnswerSheet.student).where(
         User.role == "student"
-    ).order_by(AnswerSheet.created_at.desc()).limit(10).all()
+    ).options(contains_eager(AnswerSheet.student)).order_by(AnswerSheet.created_at.desc()).limit(10))).all()
     
     return {
-        "total_students": len(students),
+        "total_students": total_students,
         "topics_analyzed": len(topics),
-        "average_understanding": round(
-            sum(a.understanding_score for a in analyses) / len(analyses) if analyses else 0,
-            1
-        ),
+        "average_understanding": round(average_understanding or 0, 1),
         "pending_analysis": len([s for s in recent_uploads if s.status == "processing"]),
         "topic_statistics": topic_stats,
         "recent_uploads": [{
             "id": upload.id,
             "student_name": upload.student.name,
-            "file_name": upload.file_path.split("/")[-1],
+            "file_name": upload.file_name or upload.file_path.split("/")[-1],
             "status": upload.status,
             "upload_date": upload.created_at.isoformat()
         } for upload in recent_uploads]
@@ -120,42 +206,37 @@ async def get_teacher_overview(
 @router.get("/student/{student_id}/performance")
 async def get_student_performance(
     student_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get student performance data"""
-    student = db.query(User).filter(User.id == student_id, User.role == "student").first()
+    student = await db.scalar(select(User).where(User.id == student_id, User.role == "student"))
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Get all analyses for this student
-    analyses = db.query(Analysis).join(AnswerSheet).filter(
-        AnswerSheet.student_id == student.id
-    ).all()
-    
-    # Group by topic
-    topic_scores = {}
-    for analysis in analyses:
-        if analysis.topic not in topic_scores:
-            topic_scores[analysis.topic] = []
-        topic_scores[analysis.topic].append(analysis.understanding_score)
+    # Average per topic for this student, in the order topics were first analyzed
+    topic_rows = (await db.execute(select(
+        func.min(Topic.name),
+        func.sum(StudentTopicRollup.score_sum),
+        func.sum(StudentTopicRollup.score_count)
+    ).join(Topic, StudentTopicRollup.topic_id == Topic.id).where(
+        StudentTopicRollup.student_id == student.id
+    ).group_by(Topic.key).order_by(func.min(StudentTopicRollup.id)))).all()
     
-    # Calculate averages
     topic_averages = {
-        topic: round(sum(scores) / len(scores), 1)
-        for topic, scores in topic_scores.items()
+        topic: round(total / count, 1)
+        for topic, total, count in topic_rows if count
     }
     
     # Get class averages for comparison
-    all_analyses = db.query(Analysis).join(AnswerSheet).all()
-    class_topic_scores = {}
-    for analysis in all_analyses:
-        if analysis.topic not in class_topic_scores:
-            class_topic_scores[analysis.topic] = []
-        class_topic_scores[analysis.topic].append(analysis.understanding_score)
+    class_rows = (await db.execute(select(
+        func.min(Topic.name),
+        func.sum(TopicRollup.score_sum),
+        func.sum(TopicRollup.score_count)
+    ).join(Topic, TopicRollup.topic_id == Topic.id).group_by(Topic.key).order_by(func.min(TopicRollup.id)))).all()
     
     class_averages = {
-        topic: round(sum(scores) / len(scores), 1)
-        for topic, scores in class_topic_scores.items()
+        topic: round(total / count, 1)
+        for topic, total, count in class_rows if count
     }
     
     overall_average = round(
@@ -178,25 +259,49 @@ async def get_student_performance(
 @router.get("/teacher/{teacher_id}/topic-comparison")
 async def get_topic_comparison(
     teacher_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get topic comparison data for charts"""
-    teacher = db.query(User).filter(User.id == teacher_id, User.role == "teacher").first()
+    teacher = await db.scalar(select(User).where(User.id == teacher_id, User.role == "teacher"))
     if not teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
     
     # Get syllabus topics
-    syllabus = db.query(Syllabus).filter(Syllabus.teacher_id == teacher.id).order_by(Syllabus.created_at.desc()).first()
+    syllabus = await db.scalar(
+        select(Syllabus).where(Syllabus.teacher_id == teacher.id).order_by(Syllabus.created_at.desc()).limit(1)
+    )
     if not syllabus:
         return {"topics": [], "data": []}
     
     topics = syllabus.topics or []
+    topic_names = _topic_names_by_key(topics)
     
     # Get all students
-    students = db.query(User).filter(User.role == "student").all()
+    students = (await db.execute(select(User.id, User.name).where(User.role == "student"))).all()
+    
+    # Averages per topic and per (topic, student) from the rollups
+    topic_averages = {
+        topic_names[key]: total / count
+        for key, total, count in (await db.execute(select(
+            Topic.key, func.sum(TopicRollup.score_sum), func.sum(TopicRollup.score_count)
+        ).join(Topic, TopicRollup.topic_id == Topic.id).where(
+            Topic.key.in_(topic_names)
+        ).group_by(Topic.key))).all()
+        if count
+    } if topic_names else {}
     
-    # Get all analyses
-    all_analyses = db.query(Analysis).join(AnswerSheet).all()
+    student_averages = {
+        (topic_names[key], student_id): total / count
+        for key, student_id, total, count in (await db.execute(select(
+            Topic.key,
+            StudentTopicRollup.student_id,
+            func.sum(StudentTopicRollup.score_sum),
+            func.sum(StudentTopicRollup.score_count)
+        ).join(Topic, StudentTopicRollup.topic_id == Topic.id).where(
+            Topic.key.in_(topic_names)
+        ).group_by(Topic.key, StudentTopicRollup.student_id))).all()
+        if count
+    } if topic_names else {}
     
     # Build chart data
     chart_data = []
@@ -204,21 +309,15 @@ async def get_topic_comparison(
         topic_data = {"topic": topic}
         
         # Get average for topic
-        topic_analyses = [a for a in all_analyses if a.topic == topic]
-        if topic_analyses:
-            avg = sum(a.understanding_score for a in topic_analyses) / len(topic_analyses)
-            topic_data["average"] = round(avg, 1)
+        if topic in topic_averages:
+            topic_data["average"] = round(topic_averages[topic], 1)
         else:
             topic_data["average"] = 0
         
         # Get scores per student
         for student in students:
-            student_analyses = [
-                a for a in topic_analyses
-                if a.answer_sheet.student_id == student.id
-            ]
-            if student_analyses:
-                student_avg = sum(a.understanding_score for a in student_analyses) / len(student_analyses)
+            student_avg = student_averages.get((topic, student.id))
+            if student_avg is not None:
                 topic_data[student.name.split()[0]] = round(student_avg, 1)
             else:
                 topic_data[student.name.split()[0]] = 0
@@ -231,3 +330,47 @@ async def get_topic_comparison(
         "students": [s.name.split()[0] for s in students]
     }
 
+@router.get("/teacher/{teacher_id}/export")
+async def export_class_analytics(
+    teacher_id: int,
+    format: str = Query("csv", pattern="^(csv|jsonl|parquet)$"),
+    detail: str = Query("analyses", pattern="^(analyses|summary)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stream per-student, per-topic scores as CSV, JSONL or Parquet
+    detail=analyses exports every analysis; detail=summary exports each
+    student's average, count, min and max per topic. Students are identified
+    by student ID, and rows are streamed from the database as they are read.
+    """
+    teacher = await db.scalar(select(User).where(User.id == teacher_id, User.role == "teacher"))
+    if not teacher:
+        raise HTTPException(status_code=404, detail="Teacher not found")
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+    
+    file_name = f"class-{detail}-{teacher_id}-{datetime.utcnow():%Y%m%d}.{format}"
+    return StreamingResponse(
+        export_rows(teacher_id, format, detail),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'}
+    )
+
+@router.get("/teacher/{teacher_id}/similarity")
+async def get_similar_answers(
+    teacher_id: int,
+    access_code: Optional[str] = None,
+    min_similarity: Optional[float] = Query(None, ge=0, le=1),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Suspiciously similar answers between students
+    Sheets are compared within an access code or bulk upload when they are
+    processed; pairs with the most matching answers come first.
+    """
+    teacher = await db.scalar(select(User).where(User.id == teacher_id, User.role == "teacher"))
+    if not teacher:
+        raise HTTPException(status_code=404, detail="Teacher not found")
+    
+    return await db.run_sync(similarity_report, teacher.id, access_code, min_similarity, limit)
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from app.database import get_db
 from app.models import User
@@ -42,9 +43,9 @@ def get_password_hash(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
 @router.post("/login", response_model=UserResponse)
-async def login(credentials: LoginRequest, db: Session = Depends(get_db)):
+async def login(credentials: LoginRequest, db: AsyncSession = Depends(get_db)):
     """Login with email and password"""
-    user = db.query(User).filter(User.email == credentials.email).first()
+    user = await db.scalar(select(User).where(User.email == credentials.email))
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -67,29 +68,29 @@ async def login(credentials: LoginRequest, db: Session = Depends(get_db)):
     return user
 
 @router.post("/login-code", response_model=UserResponse)
-async def login_with_code(credentials: CodeLoginRequest, db: Session = Depends(get_db)):
+async def login_with_code(credentials: CodeLoginRequest, db: AsyncSession = Depends(get_db)):
     """Login with access code and student ID"""
     from app.models import AccessCode
     
     # Validate access code
-    access_code = db.query(AccessCode).filter(
+    access_code = await db.scalar(select(AccessCode).where(
         AccessCode.code == credentials.access_code.upper(),
         AccessCode.is_active == True
-    ).first()
+    ))
     
     if not access_code:
         raise HTTPException(status_code=401, detail="Invalid or expired access code")
     
     if datetime.utcnow() > access_code.expires_at:
         access_code.is_active = False
-        db.commit()
+        await db.commit()
         raise HTTPException(status_code=401, detail="Access code has expired")
     
     # Find student
-    user = db.query(User).filter(
+    user = await db.scalar(select(User).where(
         User.student_id == credentials.student_id.upper(),
         User.role == "student"
-    ).first()
+    ))
     
     if not user:
         raise HTTPException(status_code=404, detail="Student not found")
@@ -97,9 +98,9 @@ async def login_with_code(credentials: CodeLoginRequest, db: Session = Depends(g
     return user
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(user_id: int, db: Session = Depends(get_db)):
+async def get_current_user(user_id: int, db: AsyncSession = Depends(get_db)):
     """Get current user info"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
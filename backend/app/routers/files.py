@@ -1,18 +1,26 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import FileResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app.models import Syllabus, AnswerSheet, Blob
 import os
 
 router = APIRouter()
 
+# Uploads are stored once per content in the blob store, keyed by their hash
+FILE_TYPES = {"syllabus": Syllabus, "answers": AnswerSheet}
+
 @router.get("/download/{file_type}/{file_id}")
-async def download_file(file_type: str, file_id: str):
-    """Download uploaded files"""
-    if file_type not in ["syllabus", "answers", "text"]:
+async def download_file(file_type: str, file_id: int, db: AsyncSession = Depends(get_db)):
+    """Download the PDF uploaded for a syllabus or answer sheet"""
+    model = FILE_TYPES.get(file_type)
+    if model is None:
         raise HTTPException(status_code=400, detail="Invalid file type")
     
-    file_path = f"uploads/{file_type}/{file_id}"
-    if not os.path.exists(file_path):
+    row = await db.get(model, file_id)
+    blob = await db.scalar(select(Blob).where(Blob.sha256 == row.content_hash)) if row and row.content_hash else None
+    if not blob or not blob.file_path or not os.path.exists(blob.file_path):
         raise HTTPException(status_code=404, detail="File not found")
     
-    return FileResponse(file_path)
-
+    return FileResponse(blob.file_path, media_type="application/pdf", filename=row.file_name or os.path.basename(blob.file_path))
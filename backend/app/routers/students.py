@@ -1,19 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from sqlalchemy import select, delete, or_
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.models import User, AnswerSheet, AccessCode
-from app.services.pdf_service import PDFService
-from app.services.ai_service import AIService
+from app.models import User, AnswerSheet, AccessCode, SimilarityFlag
+from app.services.upload_service import UploadService
+from app.services.blob_store import BlobStore
+from app.services.job_queue import enqueue_job, worker_pool
 from datetime import datetime
 import os
 import uuid
 
 router = APIRouter()
-pdf_service = PDFService()
-ai_service = AIService()
+upload_service = UploadService()
+blob_store = BlobStore()
 
-def get_student(user_id: int, db: Session):
-    user = db.query(User).filter(User.id == user_id, User.role == "student").first()
+async def get_student(user_id: int, db: AsyncSession):
+    user = await db.scalar(select(User).where(User.id == user_id, User.role == "student"))
     if not user:
         raise HTTPException(status_code=403, detail="Student access required")
     return user
@@ -23,16 +26,16 @@ async def upload_answer_sheet(
     student_id: int,
     access_code: str,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Upload answer sheet PDF"""
-    student = get_student(student_id, db)
+    student = await get_student(student_id, db)
     
     # Validate access code
-    access_code_obj = db.query(AccessCode).filter(
+    access_code_obj = await db.scalar(select(AccessCode).where(
         AccessCode.code == access_code.upper(),
         AccessCode.is_active == True
-    ).first()
+    ))
     
     if not access_code_obj:
         raise HTTPException(status_code=401, detail="Invalid access code")
@@ -43,47 +46,29 @@ async def upload_answer_sheet(
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
-    # Save file
+    # Save file into the content-addressed store
     file_id = str(uuid.uuid4())
-    file_path = f"uploads/answers/{file_id}_{file.filename}"
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    upload = await upload_service.save_upload_file(file, f"uploads/tmp/{file_id}.pdf")
+    blob = await db.run_sync(blob_store.add, upload["path"], upload["sha256"], upload["size"])
+    # Committed on its own, so the stored file stays tracked if the steps below fail
+    await db.commit()
     
     try:
-        # Extract text
-        text_content = pdf_service.extract_text_from_pdf(file_path)
-        
-        # Save text version
-        text_path = f"uploads/text/answer_{file_id}.txt"
-        pdf_service.save_text_to_file(text_content, text_path)
-        
-        # Segment into Q&A pairs
-        qa_pairs = ai_service.segment_qa_from_answer_sheet(text_content)
-        
-        # Create answer sheet record
+        # Create answer sheet record; extraction, segmentation and analysis
+        # run on the background job workers
         answer_sheet = AnswerSheet(
             student_id=student.id,
             access_code=access_code.upper(),
-            file_path=file_path,
-            text_content=text_content,
-            questions_answers=qa_pairs,
+            file_path=blob.file_path,
+            file_name=file.filename,
+            content_hash=blob.sha256,
             status="processing"
         )
         db.add(answer_sheet)
-        db.commit()
-        db.refresh(answer_sheet)
-        
-        # Process analysis asynchronously (in production, use background tasks)
-        # For now, process immediately
-        try:
-            from app.routers.analytics import process_answer_sheet_analysis
-            process_answer_sheet_analysis(answer_sheet.id, db)
-        except Exception as e:
-            print(f"Error processing analysis: {e}")
-            # Analysis will be processed later
+        await db.flush()
+        await db.run_sync(enqueue_job, "process_answer_sheet", {"answer_sheet_id": answer_sheet.id})
+        await db.commit()
+        worker_pool.notify()
         
         return {
             "id": answer_sheet.id,
@@ -91,26 +76,62 @@ async def upload_answer_sheet(
             "message": "Answer sheet uploaded and is being processed"
         }
     except Exception as e:
-        # Clean up on error
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Drop the reference taken above; gc_blobs.py removes the file once unreferenced
+        await db.rollback()
+        await db.run_sync(blob_store.release, upload["sha256"])
+        await db.commit()
         raise HTTPException(status_code=500, detail=f"Error processing answer sheet: {str(e)}")
 
+def delete_answer_sheet_rows(db: Session, answer_sheet_id: int):
+    """Delete an answer sheet with its analyses and flags, and release its stored file; not committed"""
+    from app.routers.analytics import remove_answer_sheet_analyses
+
+    answer_sheet = db.get(AnswerSheet, answer_sheet_id)
+    remove_answer_sheet_analyses(db, answer_sheet)
+    db.execute(delete(SimilarityFlag).where(or_(
+        SimilarityFlag.answer_sheet_id == answer_sheet_id,
+        SimilarityFlag.other_answer_sheet_id == answer_sheet_id
+    )))
+    BlobStore.release(db, answer_sheet.content_hash)
+    db.delete(answer_sheet)
+
+@router.delete("/answer-sheets/{answer_sheet_id}")
+async def delete_answer_sheet(
+    answer_sheet_id: int,
+    student_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Delete one of the student's answer sheets"""
+    student = await get_student(student_id, db)
+    
+    answer_sheet = await db.scalar(select(AnswerSheet).where(
+        AnswerSheet.id == answer_sheet_id,
+        AnswerSheet.student_id == student.id
+    ))
+    if not answer_sheet:
+        raise HTTPException(status_code=404, detail="Answer sheet not found")
+    if answer_sheet.status == "processing":
+        raise HTTPException(status_code=409, detail="Answer sheet is still being processed")
+    
+    await db.run_sync(delete_answer_sheet_rows, answer_sheet.id)
+    await db.commit()
+    return {"message": "Answer sheet deleted"}
+
 @router.get("/answer-sheets")
 async def get_answer_sheets(
     student_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get student's answer sheets"""
-    student = get_student(student_id, db)
+    student = await get_student(student_id, db)
     
-    sheets = db.query(AnswerSheet).filter(
+    sheets = (await db.scalars(select(AnswerSheet).where(
         AnswerSheet.student_id == student.id
-    ).order_by(AnswerSheet.created_at.desc()).all()
+    ).order_by(AnswerSheet.created_at.desc()))).all()
     
     return [{
         "id": sheet.id,
-        "file_name": os.path.basename(sheet.file_path),
+        "file_name": sheet.file_name or os.path.basename(sheet.file_path),
         "status": sheet.status,
         "created_at": sheet.created_at.isoformat(),
         "processed_at": sheet.processed_at.isoformat() if sheet.processed_at else None
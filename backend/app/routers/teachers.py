@@ -1,21 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from app.database import get_db
-from app.models import User, AccessCode, Syllabus
+from app.models import User, AccessCode, Syllabus, Blob, AnswerSheet, UploadBatch
 from app.services.pdf_service import PDFService
-from app.services.ai_service import AIService
+from app.services.ai_service import ai_service
+from app.services.upload_service import UploadService
+from app.services.blob_store import BlobStore
+from app.services.topics import ensure_syllabus_topics
+from app.services.topic_matcher import compile_syllabus_matcher
+from app.services.job_queue import worker_pool
+from app.services.score_import import import_file
+from app.services.search_index import index_syllabus_text, search, SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE
+from app.services.batch_upload import (
+    BATCH_UPLOAD_MAX_BYTES, BATCH_MAX_FILES, MANIFEST_NAME, MANIFEST_MAX_BYTES, MANIFEST_TOO_LARGE,
+    unpack_zip, parse_manifest, create_batch, discard_files
+)
 from datetime import datetime, timedelta
+from typing import List, Optional
 import os
 import uuid
 import json
+import zipfile
 
 router = APIRouter()
+upload_service = UploadService()
+blob_store = BlobStore()
 pdf_service = PDFService()
-ai_service = AIService()
 
-def get_teacher(user_id: int, db: Session):
-    user = db.query(User).filter(User.id == user_id, User.role == "teacher").first()
+async def get_teacher(user_id: int, db: AsyncSession):
+    user = await db.scalar(select(User).where(User.id == user_id, User.role == "teacher"))
     if not user:
         raise HTTPException(status_code=403, detail="Teacher access required")
     return user
@@ -31,10 +47,10 @@ class GenerateCodeRequest(BaseModel):
 @router.post("/access-codes/generate")
 async def generate_access_code(
     request: GenerateCodeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Generate a new access code for students (valid for 1 hour)"""
-    teacher = get_teacher(request.teacher_id, db)
+    teacher = await get_teacher(request.teacher_id, db)
     
     # Generate 6-character code
     import random
@@ -49,8 +65,8 @@ async def generate_access_code(
         is_active=True
     )
     db.add(access_code)
-    db.commit()
-    db.refresh(access_code)
+    await db.commit()
+    await db.refresh(access_code)
     
     return {
         "code": code,
@@ -61,16 +77,16 @@ async def generate_access_code(
 @router.get("/access-codes")
 async def get_active_codes(
     teacher_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all active access codes for a teacher"""
-    teacher = get_teacher(teacher_id, db)
+    teacher = await get_teacher(teacher_id, db)
     
-    codes = db.query(AccessCode).filter(
+    codes = (await db.scalars(select(AccessCode).where(
         AccessCode.teacher_id == teacher.id,
         AccessCode.is_active == True,
         AccessCode.expires_at > datetime.utcnow()
-    ).all()
+    ))).all()
     
     return [{
         "code": code.code,
@@ -82,44 +98,51 @@ async def get_active_codes(
 async def upload_syllabus(
     teacher_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Upload syllabus PDF and extract topics"""
-    teacher = get_teacher(teacher_id, db)
+    teacher = await get_teacher(teacher_id, db)
     
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
-    # Save file
+    # Save file into the content-addressed store
     file_id = str(uuid.uuid4())
-    file_path = f"uploads/syllabus/{file_id}_{file.filename}"
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    upload = await upload_service.save_upload_file(file, f"uploads/tmp/{file_id}.pdf")
+    blob = await db.run_sync(blob_store.add, upload["path"], upload["sha256"], upload["size"])
+    # Committed on its own, so the stored file stays tracked if the steps below fail
+    await db.commit()
     
     try:
-        # Extract text
-        text_content = pdf_service.extract_text_from_pdf(file_path)
-        
-        # Save text version
-        text_path = f"uploads/text/syllabus_{file_id}.txt"
-        pdf_service.save_text_to_file(text_content, text_path)
-        
-        # Extract topics using AI
-        topics = ai_service.extract_topics_from_syllabus(text_content)
+        if blob.topics is not None:
+            # Same content was processed before
+            topics = blob.topics
+        else:
+            # Extract text (in the threadpool, off the event loop)
+            text_content = await db.scalar(select(Blob.text_content).where(Blob.id == blob.id))
+            if text_content is None:
+                text_content = await run_in_threadpool(pdf_service.extract_text_from_pdf, blob.file_path)
+                blob.text_content = text_content
+                await db.run_sync(index_syllabus_text, blob.id, text_content)
+            
+            # Extract topics using AI
+            topics = await run_in_threadpool(ai_service.extract_topics_from_syllabus, text_content)
+            blob.topics = topics
         
         # Save to database
         syllabus = Syllabus(
             teacher_id=teacher.id,
-            file_path=file_path,
-            text_content=text_content,
+            file_path=blob.file_path,
+            file_name=file.filename,
+            content_hash=blob.sha256,
             topics=topics
         )
         db.add(syllabus)
-        db.commit()
-        db.refresh(syllabus)
+        await db.flush()
+        await db.run_sync(ensure_syllabus_topics, syllabus.id, topics)
+        await db.commit()
+        # Compile the fallback scorer's topic matcher ahead of the first answer sheet
+        compile_syllabus_matcher(syllabus.id, topics)
         
         return {
             "id": syllabus.id,
@@ -127,22 +150,23 @@ async def upload_syllabus(
             "message": "Syllabus uploaded and processed successfully"
         }
     except Exception as e:
-        # Clean up on error
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Drop the reference taken above; gc_blobs.py removes the file once unreferenced
+        await db.rollback()
+        await db.run_sync(blob_store.release, upload["sha256"])
+        await db.commit()
         raise HTTPException(status_code=500, detail=f"Error processing syllabus: {str(e)}")
 
 @router.get("/syllabus")
 async def get_syllabus(
     teacher_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get teacher's syllabus"""
-    teacher = get_teacher(teacher_id, db)
+    teacher = await get_teacher(teacher_id, db)
     
-    syllabus = db.query(Syllabus).filter(
+    syllabus = await db.scalar(select(Syllabus).where(
         Syllabus.teacher_id == teacher.id
-    ).order_by(Syllabus.created_at.desc()).first()
+    ).order_by(Syllabus.created_at.desc()).limit(1))
     
     if not syllabus:
         return {"message": "No syllabus uploaded yet"}
@@ -153,3 +177,174 @@ async def get_syllabus(
         "created_at": syllabus.created_at.isoformat()
     }
 
+
+@router.post("/answer-sheets/batch")
+async def upload_answer_sheet_batch(
+    teacher_id: int,
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Upload a class's answer sheets as a ZIP, or as several PDFs
+    Files are matched to students by student ID: a manifest.csv
+    ("file,student_id"), a folder per student, or file names such as
+    "STU001.pdf" / "STU001_Alex.pdf". Processing runs in the background;
+    poll the batch for per-file progress.
+    """
+    teacher = await get_teacher(teacher_id, db)
+    
+    directory = f"uploads/tmp/batch-{uuid.uuid4()}"
+    try:
+        pdfs, manifest, rejected = [], {}, []
+        for file in files:
+            name = file.filename or ""
+            extension = os.path.splitext(name)[1].lower()
+            if extension == ".zip":
+                # Stream the archive to disk, then unpack it entry by entry
+                upload = await upload_service.save_upload_file(
+                    file, f"{directory}/{uuid.uuid4()}.zip", BATCH_UPLOAD_MAX_BYTES
+                )
+                try:
+                    unpacked = await run_in_threadpool(unpack_zip, upload["path"], directory)
+                except zipfile.BadZipFile:
+                    raise HTTPException(status_code=400, detail=f"{name} is not a valid ZIP file")
+                finally:
+                    os.remove(upload["path"])
+                pdfs.extend(unpacked[0])
+                manifest.update(unpacked[1])
+                rejected.extend(unpacked[2])
+            elif os.path.basename(name).lower() == MANIFEST_NAME:
+                content = await file.read(MANIFEST_MAX_BYTES + 1)
+                if len(content) > MANIFEST_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=MANIFEST_TOO_LARGE)
+                manifest.update(parse_manifest(content))
+            elif extension == ".pdf":
+                upload = await upload_service.save_upload_file(file, f"{directory}/{uuid.uuid4()}.pdf")
+                pdfs.append({"file_name": name, **upload})
+            else:
+                rejected.append({"file_name": name, "error": "Only PDF and ZIP files are allowed"})
+        
+        if len(pdfs) > BATCH_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"Batch exceeds {BATCH_MAX_FILES} files")
+        
+        try:
+            batch = await db.run_sync(create_batch, teacher.id, pdfs, manifest, rejected)
+            await db.commit()
+        except Exception as e:
+            # create_batch took its references in this transaction, so rolling
+            # back drops them with the sheets; files moved into the store
+            # without a blob row are removed by gc_blobs.py
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
+        worker_pool.notify()
+    finally:
+        discard_files(directory)
+    
+    return {
+        "id": batch.id,
+        "file_count": batch.file_count,
+        "accepted": batch.file_count - len(batch.rejected),
+        "rejected": batch.rejected,
+        "message": "Answer sheets uploaded and are being processed"
+    }
+
+@router.get("/answer-sheets/batch/{batch_id}")
+async def get_answer_sheet_batch(
+    batch_id: int,
+    teacher_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get per-file progress of a bulk upload"""
+    teacher = await get_teacher(teacher_id, db)
+    
+    batch = await db.scalar(select(UploadBatch).where(
+        UploadBatch.id == batch_id,
+        UploadBatch.teacher_id == teacher.id
+    ))
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    sheets = (await db.execute(select(
+        AnswerSheet.id, AnswerSheet.file_name, AnswerSheet.status, AnswerSheet.processed_at,
+        User.student_id, User.name
+    ).join(User, AnswerSheet.student_id == User.id).where(
+        AnswerSheet.batch_id == batch.id
+    ).order_by(AnswerSheet.id))).all()
+    
+    counts = {"processing": 0, "processed": 0, "error": 0, "rejected": len(batch.rejected or [])}
+    for sheet in sheets:
+        counts[sheet.status] = counts.get(sheet.status, 0) + 1
+    
+    return {
+        "id": batch.id,
+        "status": "processing" if counts["processing"] else "done",
+        "file_count": batch.file_count,
+        "counts": counts,
+        "created_at": batch.created_at.isoformat(),
+        "files": [{
+            "answer_sheet_id": sheet.id,
+            "file_name": sheet.file_name,
+            "student_id": sheet.student_id,
+            "student_name": sheet.name,
+            "status": sheet.status,
+            "processed_at": sheet.processed_at.isoformat() if sheet.processed_at else None
+        } for sheet in sheets] + [{
+            "file_name": file["file_name"],
+            "status": "rejected",
+            "error": file["error"]
+        } for file in batch.rejected or []]
+    }
+
+@router.post("/scores/import")
+async def import_historical_scores(
+    teacher_id: int,
+    syllabus_id: Optional[int] = None,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Import past terms' topic scores from a CSV or JSONL file
+    Records need student_id, topic and score (0-100); confidence, sheet and
+    date are optional. Returns counts and throughput per batch.
+    """
+    teacher = await get_teacher(teacher_id, db)
+    
+    query = select(Syllabus).where(Syllabus.teacher_id == teacher.id)
+    if syllabus_id is not None:
+        query = query.where(Syllabus.id == syllabus_id)
+    syllabus = await db.scalar(query.order_by(Syllabus.created_at.desc()).limit(1))
+    if not syllabus:
+        raise HTTPException(status_code=404, detail="Syllabus not found")
+    
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    if extension not in (".csv", ".jsonl", ".ndjson"):
+        raise HTTPException(status_code=400, detail="Only CSV and JSONL files are allowed")
+    
+    upload = await upload_service.save_upload_file(
+        file, f"uploads/tmp/{uuid.uuid4()}{extension}", BATCH_UPLOAD_MAX_BYTES
+    )
+    try:
+        # Batches are committed on a worker thread, off the event loop
+        return await run_in_threadpool(import_file, upload["path"], syllabus.id, file.filename)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File is not UTF-8 text")
+    finally:
+        os.remove(upload["path"])
+
+@router.get("/search")
+async def search_answers(
+    teacher_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = Query(None, pattern="^(answer|syllabus)$"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Full-text search over the Q&A pairs of the teacher's classes and their syllabi
+    Results are ranked, highlighted and paginated; each lists the answer
+    sheets (with their students) or syllabi it was found in. Only the
+    ranked_candidates most recent matches are ranked, see older_matches_omitted.
+    """
+    teacher = await get_teacher(teacher_id, db)
+    return await db.run_sync(search, q, kind, teacher.id, page, page_size)
@@ -1,16 +1,49 @@
 import os
 import json
 import re
-from typing import List, Dict, Any
-from openai import OpenAI
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from pydantic import BaseModel, Field
 import httpx
+from app.services.llm_cache import llm_cache, LLM_CACHE_ENABLED
+from app.services.llm_client import llm_client, LLM_MAX_CONCURRENCY
+from app.services.topic_scorer import score_sheets
+from app.services.topic_matcher import get_syllabus_matcher
+from app.services.qa_segmenter import segment_qa
+from app.services.chunking import (
+    chunk_text, chunk_qa_pairs, format_qa_chunk,
+    merge_topics, merge_qa_pairs, merge_analyses
+)
+from concurrent.futures import ThreadPoolExecutor
+
+# One structured-output call for segmentation + analysis instead of two
+AI_COMBINED_ANALYSIS = os.getenv("AI_COMBINED_ANALYSIS", "true").lower() == "true"
+
+# Fans chunk prompts out; the shared client still caps requests in flight
+_chunk_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm-chunk")
+
+class QAPair(BaseModel):
+    question: str
+    answer: str
+
+class TopicAnalysis(BaseModel):
+    topic: str
+    understanding_score: float = Field(ge=0, le=100)
+    confidence: float = Field(default=0.5, ge=0, le=1)
+    details: str = ""
+    covered: bool = True
+
+class CombinedAnalysis(BaseModel):
+    """Schema of the combined segmentation + analysis reply"""
+    questions_answers: List[QAPair]
+    analyses: List[TopicAnalysis]
 
 class AIService:
     def __init__(self):
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.client = None
         if self.openai_api_key:
-            self.client = OpenAI(api_key=self.openai_api_key)
+            # Shared async client: pooled connections and a global in-flight limit
+            self.client = llm_client
     
     def extract_topics_from_syllabus(self, syllabus_text: str) -> List[str]:
         """
@@ -30,29 +63,135 @@ class AIService:
         else:
             return self._segment_qa_fallback(answer_text)
     
-    def analyze_topic_understanding(self, topics: List[str], qa_pairs: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    def segment_qa_stream(self, pages: Iterable[str]) -> Optional[List[Dict[str, str]]]:
+        """
+        Segment an answer sheet while its pages are being extracted
+        Returns None without reading the pages when the LLM segments, since
+        it needs the whole text.
+        """
+        if self.client:
+            return None
+        return segment_qa(pages)
+    
+    def analyze_topic_understanding(
+        self,
+        topics: List[str],
+        qa_pairs: List[Dict[str, str]],
+        syllabus_id: Optional[int] = None,
+        corpus: Optional[Tuple[int, Dict[str, int]]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Analyze how well each topic is understood based on Q&A pairs
-        Returns list of {topic, understanding_score, confidence, details}
+        Returns list of {topic, understanding_score, confidence, details}.
+        corpus holds the syllabus's term frequencies for the local scorer.
         """
         if self.client:
             return self._analyze_with_openai(topics, qa_pairs)
         else:
-            return self._analyze_fallback(topics, qa_pairs)
+            return self._analyze_fallback(topics, qa_pairs, syllabus_id, corpus)
+    
+    def segment_and_analyze(self, answer_text: str, topics: List[str]) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """
+        Segment an answer sheet and score each topic in one LLM round trip
+        Returns {"questions_answers": [...], "analyses": [...]}, or None when
+        the combined call is unavailable or fails, in which case callers use
+        segment_qa_from_answer_sheet + analyze_topic_understanding instead.
+        """
+        if not self.client or not AI_COMBINED_ANALYSIS or not topics:
+            return None
+        
+        chunks = chunk_text(answer_text)
+        results = self._map_chunks(lambda chunk: self._segment_and_analyze_chunk(chunk, topics), chunks)
+        if not results or any(result is None for result in results):
+            return None
+        if len(results) == 1:
+            return results[0]
+        
+        return {
+            "questions_answers": merge_qa_pairs([r["questions_answers"] for r in results]),
+            "analyses": merge_analyses([r["analyses"] for r in results], [float(len(c)) for c in chunks], topics)
+        }
+    
+    def _segment_and_analyze_chunk(self, text: str, topics: List[str]) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        try:
+            prompt = f"""Extract all question-answer pairs from the following answer sheet text, then analyze the student's understanding of each topic based on their answers.
+Topics: {', '.join(topics)}
+
+Answer sheet text:
+{text}
+
+For each topic, provide:
+- understanding_score (0-100): How well the student understands this topic
+- confidence (0-1): How confident you are in this assessment
+- details: Brief explanation
+- covered: false when these answers give no evidence about the topic at all (then score it 0), otherwise true
+
+Return a JSON object: {{"questions_answers": [{{"question": "Q1", "answer": "A1"}}], "analyses": [{{"topic": "topic1", "understanding_score": 85, "confidence": 0.9, "details": "...", "covered": true}}]}}"""
+            
+            result = self._chat(
+                messages=[
+                    {"role": "system", "content": "You are an educational assessment AI. Extract question-answer pairs from exam answer sheets, analyze student understanding and return valid JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=3000,
+                schema=CombinedAnalysis,
+                response_format={"type": "json_object"}
+            )
+            return result
+        except Exception as e:
+            print(f"OpenAI combined analysis failed: {e}, using two-step path")
+            return None
+    
+    def _chat(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo", schema: Optional[type] = None, **params) -> Any:
+        """
+        Run a chat completion and parse its JSON reply
+        Replies are cached by model, messages and parameters; only replies
+        that parse (and validate against schema, if given) are stored.
+        """
+        key = llm_cache.make_key(model, messages, **params)
+        if LLM_CACHE_ENABLED:
+            cached = llm_cache.get(key)
+            if cached is not None:
+                return json.loads(cached)
+        
+        # Raises CircuitOpenError while the circuit is open; callers then use the local fallback
+        result = self.client.complete(model=model, messages=messages, **params).strip()
+        # Clean JSON response
+        result = re.sub(r'```json\s*', '', result)
+        result = re.sub(r'```\s*', '', result)
+        parsed = json.loads(result)
+        if schema is not None:
+            parsed = schema.model_validate(parsed).model_dump()
+        
+        if LLM_CACHE_ENABLED:
+            llm_cache.set(key, json.dumps(parsed))
+        return parsed
+    
+    def _map_chunks(self, func, chunks: List[Any]) -> List[Any]:
+        """Run func over chunks concurrently, keeping chunk order"""
+        if len(chunks) <= 1:
+            return [func(chunk) for chunk in chunks]
+        return list(_chunk_executor.map(func, chunks))
     
     def _extract_with_openai(self, text: str, task: str) -> List[str]:
-        """Extract topics using OpenAI"""
+        """Extract topics using OpenAI, one prompt per chunk of the syllabus"""
+        chunks = chunk_text(text)
+        if len(chunks) <= 1:
+            return self._extract_chunk_with_openai(text)
+        return merge_topics(self._map_chunks(self._extract_chunk_with_openai, chunks))
+    
+    def _extract_chunk_with_openai(self, text: str) -> List[str]:
         try:
             prompt = f"""Extract all distinct topics/subjects from the following syllabus text. 
 Return only a JSON array of topic names, nothing else.
 
 Syllabus text:
-{text[:3000]}
+{text}
 
 Return format: ["topic1", "topic2", "topic3"]"""
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            topics = self._chat(
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant that extracts topics from educational content. Always return valid JSON arrays."},
                     {"role": "user", "content": prompt}
@@ -60,12 +199,6 @@ Return format: ["topic1", "topic2", "topic3"]"""
                 temperature=0.3,
                 max_tokens=500
             )
-            
-            result = response.choices[0].message.content.strip()
-            # Clean JSON response
-            result = re.sub(r'```json\s*', '', result)
-            result = re.sub(r'```\s*', '', result)
-            topics = json.loads(result)
             return topics if isinstance(topics, list) else []
         except Exception as e:
             print(f"OpenAI extraction failed: {e}, using fallback")
@@ -108,18 +241,23 @@ Return format: ["topic1", "topic2", "topic3"]"""
         return topics[:15]  # Limit to 15 topics
     
     def _segment_with_openai(self, text: str) -> List[Dict[str, str]]:
-        """Segment Q&A using OpenAI"""
+        """Segment Q&A using OpenAI, one prompt per chunk of the answer sheet"""
+        chunks = chunk_text(text)
+        if len(chunks) <= 1:
+            return self._segment_chunk_with_openai(text)
+        return merge_qa_pairs(self._map_chunks(self._segment_chunk_with_openai, chunks))
+    
+    def _segment_chunk_with_openai(self, text: str) -> List[Dict[str, str]]:
         try:
             prompt = f"""Extract all question-answer pairs from the following answer sheet text.
 Return a JSON array of objects with "question" and "answer" keys.
 
 Answer sheet text:
-{text[:4000]}
+{text}
 
 Return format: [{{"question": "Q1", "answer": "A1"}}, {{"question": "Q2", "answer": "A2"}}]"""
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            qa_pairs = self._chat(
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant that extracts question-answer pairs from exam answer sheets. Always return valid JSON arrays."},
                     {"role": "user", "content": prompt}
@@ -127,76 +265,44 @@ Return format: [{{"question": "Q1", "answer": "A1"}}, {{"question": "Q2", "answe
                 temperature=0.3,
                 max_tokens=2000
             )
-            
-            result = response.choices[0].message.content.strip()
-            result = re.sub(r'```json\s*', '', result)
-            result = re.sub(r'```\s*', '', result)
-            qa_pairs = json.loads(result)
             return qa_pairs if isinstance(qa_pairs, list) else []
         except Exception as e:
             print(f"OpenAI segmentation failed: {e}, using fallback")
             return self._segment_qa_fallback(text)
     
     def _segment_qa_fallback(self, text: str) -> List[Dict[str, str]]:
-        """Fallback Q&A segmentation using pattern matching"""
-        qa_pairs = []
-        
-        # Split by common question patterns
-        question_patterns = [
-            r'(?:^|\n)\s*(?:Q|Question)\s*\d+[\.\):]\s*(.+?)(?=\n\s*(?:Q|Question|Answer|A)\s*\d|$)',
-            r'(?:^|\n)\s*\d+[\.\)]\s*(.+?)(?=\n\s*\d+[\.\)]|$)',
-        ]
-        
-        for pattern in question_patterns:
-            matches = re.finditer(pattern, text, re.MULTILINE | re.IGNORECASE)
-            for match in matches:
-                question = match.group(1).strip()
-                # Find answer (next paragraph or section)
-                start_pos = match.end()
-                next_match = re.search(r'(?:^|\n)\s*(?:Q|Question|A|Answer)\s*\d', text[start_pos:], re.IGNORECASE)
-                end_pos = start_pos + (next_match.start() if next_match else len(text))
-                answer = text[start_pos:end_pos].strip()
-                
-                if question and answer and len(answer) > 10:
-                    qa_pairs.append({
-                        "question": question[:500],
-                        "answer": answer[:2000]
-                    })
-            
-            if qa_pairs:
-                break
-        
-        # If no structured Q&A found, split by paragraphs
-        if not qa_pairs:
-            paragraphs = [p.strip() for p in text.split('\n\n') if len(p.strip()) > 20]
-            for i in range(0, len(paragraphs) - 1, 2):
-                qa_pairs.append({
-                    "question": paragraphs[i][:500],
-                    "answer": paragraphs[i + 1][:2000] if i + 1 < len(paragraphs) else ""
-                })
-        
-        return qa_pairs[:20]  # Limit to 20 Q&A pairs
+        """Fallback Q&A segmentation by question and answer markers"""
+        return segment_qa(text)
     
     def _analyze_with_openai(self, topics: List[str], qa_pairs: List[Dict[str, str]]) -> List[Dict[str, Any]]:
-        """Analyze understanding using OpenAI"""
+        """Analyze understanding using OpenAI, one prompt per chunk of Q&A pairs"""
+        chunks = chunk_qa_pairs(qa_pairs)
+        if len(chunks) <= 1:
+            return self._analyze_chunk_with_openai(topics, qa_pairs)
+        results = self._map_chunks(lambda chunk: self._analyze_chunk_with_openai(topics, chunk), chunks)
+        # Larger chunks carry more evidence
+        weights = [float(len(format_qa_chunk(chunk))) for chunk in chunks]
+        return merge_analyses(results, weights, topics)
+    
+    def _analyze_chunk_with_openai(self, topics: List[str], qa_pairs: List[Dict[str, str]]) -> List[Dict[str, Any]]:
         try:
-            qa_text = "\n\n".join([f"Q: {qa['question']}\nA: {qa['answer']}" for qa in qa_pairs[:10]])
+            qa_text = format_qa_chunk(qa_pairs)
             
             prompt = f"""Analyze the student's understanding of each topic based on their answers.
-Topics: {', '.join(topics[:10])}
+Topics: {', '.join(topics)}
 
 Question-Answer pairs:
-{qa_text[:3000]}
+{qa_text}
 
 For each topic, provide:
 - understanding_score (0-100): How well the student understands this topic
 - confidence (0-1): How confident you are in this assessment
 - details: Brief explanation
+- covered: false when these answers give no evidence about the topic at all (then score it 0), otherwise true
 
-Return JSON array: [{{"topic": "topic1", "understanding_score": 85, "confidence": 0.9, "details": "..."}}, ...]"""
+Return JSON array: [{{"topic": "topic1", "understanding_score": 85, "confidence": 0.9, "details": "...", "covered": true}}, ...]"""
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            analyses = self._chat(
                 messages=[
                     {"role": "system", "content": "You are an educational assessment AI. Analyze student understanding and return valid JSON."},
                     {"role": "user", "content": prompt}
@@ -205,11 +311,6 @@ Return JSON array: [{{"topic": "topic1", "understanding_score": 85, "confidence"
                 max_tokens=2000
             )
             
-            result = response.choices[0].message.content.strip()
-            result = re.sub(r'```json\s*', '', result)
-            result = re.sub(r'```\s*', '', result)
-            analyses = json.loads(result)
-            
             if isinstance(analyses, list):
                 return analyses
             return []
@@ -217,32 +318,16 @@ Return JSON array: [{{"topic": "topic1", "understanding_score": 85, "confidence"
             print(f"OpenAI analysis failed: {e}, using fallback")
             return self._analyze_fallback(topics, qa_pairs)
     
-    def _analyze_fallback(self, topics: List[str], qa_pairs: List[Dict[str, str]]) -> List[Dict[str, Any]]:
-        """Fallback analysis using keyword matching"""
-        all_text = " ".join([qa.get("answer", "") + " " + qa.get("question", "") for qa in qa_pairs]).lower()
-        
-        analyses = []
-        for topic in topics:
-            topic_lower = topic.lower()
-            topic_words = topic_lower.split()
-            
-            # Count keyword matches
-            matches = sum(1 for word in topic_words if word in all_text)
-            word_coverage = matches / len(topic_words) if topic_words else 0
-            
-            # Calculate understanding score (0-100)
-            base_score = min(100, word_coverage * 100)
-            # Add some randomness for demo purposes
-            import random
-            score = base_score + random.uniform(-10, 10)
-            score = max(0, min(100, score))
-            
-            analyses.append({
-                "topic": topic,
-                "understanding_score": round(score, 1),
-                "confidence": min(1.0, word_coverage + 0.3),
-                "details": f"Found {matches}/{len(topic_words)} topic keywords in answers"
-            })
-        
-        return analyses
+    def _analyze_fallback(
+        self,
+        topics: List[str],
+        qa_pairs: List[Dict[str, str]],
+        syllabus_id: Optional[int] = None,
+        corpus: Optional[Tuple[int, Dict[str, int]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Fallback analysis using local TF-IDF keyword scoring"""
+        matcher = get_syllabus_matcher(syllabus_id, topics) if syllabus_id is not None else None
+        return score_sheets(topics, [qa_pairs], matcher, corpus)[0]
 
+# Shared by all routers and background workers
+ai_service = AIService()
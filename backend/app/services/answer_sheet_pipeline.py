@@ -0,0 +1,166 @@
+"""
+Background processing of uploaded answer sheets
+Runs extraction, segmentation and analysis for one AnswerSheet row.
+"""
+import io
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+from app.models import AnswerSheet, Blob, Job
+from app.services.pdf_service import PDFService
+from app.services.ai_service import ai_service
+from app.services.job_queue import WORKER_ID, JOB_STALE_AFTER, JobDeferred
+from app.services.search_index import index_qa_pairs
+from app.services.similarity import flag_similar_answers, index_signatures
+
+pdf_service = PDFService()
+
+class _DocumentText:
+    """
+    Document text built up as its pages pass through, joined like
+    pdf_service.join_page_texts. The full text is still kept, since it is
+    stored on the blob, but page strings are released as soon as they are read.
+    """
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+
+    def feed(self, pages: Iterable[str]) -> Iterator[str]:
+        for page in pages:
+            if page:
+                if self._buffer.tell():
+                    self._buffer.write("\n\n")
+                self._buffer.write(page)
+            yield page
+
+    def text(self) -> str:
+        text = self._buffer.getvalue().strip()
+        self._buffer = io.StringIO()
+        if not text:
+            raise Exception("No text could be extracted from the PDF")
+        return text
+
+def _claim_blob(db: Session, blob_id: int, claimant: str) -> bool:
+    """Compare-and-set claim on a blob; a claim older than JOB_STALE_AFTER is taken over"""
+    now = datetime.utcnow()
+    result = db.execute(
+        update(Blob)
+        .where(Blob.id == blob_id, or_(
+            Blob.claimed_by.is_(None),
+            Blob.claimed_by == claimant,
+            Blob.claimed_at < now - timedelta(seconds=JOB_STALE_AFTER)
+        ))
+        .values(claimed_by=claimant, claimed_at=now)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+def _release_blob(db: Session, blob_id: int, claimant: str):
+    db.rollback()
+    db.execute(update(Blob).where(Blob.id == blob_id, Blob.claimed_by == claimant).values(claimed_by=None, claimed_at=None))
+    db.commit()
+
+def _derive_blob(db: Session, blob: Blob) -> Optional[List[Dict[str, Any]]]:
+    """
+    Text, Q&A pairs, search entries and answer signatures of a claimed blob,
+    skipping those already stored; returns topic analyses when the Q&A pairs
+    came from a combined AI call
+    """
+    if blob.text_content is None:
+        # Local segmentation reads the pages as they are extracted
+        document = _DocumentText()
+        pages = document.feed(pdf_service.iter_pages(blob.file_path))
+        qa_pairs = None
+        if blob.questions_answers is None:
+            qa_pairs = ai_service.segment_qa_stream(pages)
+        # Pages the segmenter did not need (or all of them, when it is not local)
+        for _ in pages:
+            pass
+        blob.text_content = document.text()
+        if qa_pairs is not None:
+            blob.questions_answers = qa_pairs
+            index_qa_pairs(db, blob.id, qa_pairs)
+        db.commit()
+
+    from app.routers.analytics import get_analysis_syllabus
+
+    analyses_data = None
+    if blob.questions_answers is None:
+        # One round trip for Q&A pairs and topic scores when possible
+        syllabus = get_analysis_syllabus(db)
+        combined = ai_service.segment_and_analyze(
+            blob.text_content,
+            syllabus.topics if syllabus and syllabus.topics else []
+        )
+        if combined is not None:
+            blob.questions_answers = combined["questions_answers"]
+            analyses_data = combined["analyses"]
+        else:
+            blob.questions_answers = ai_service.segment_qa_from_answer_sheet(blob.text_content)
+        index_qa_pairs(db, blob.id, blob.questions_answers)
+        db.commit()
+
+    index_signatures(db, blob.id, blob.questions_answers)
+    db.commit()
+    return analyses_data
+
+def process_answer_sheet(answer_sheet_id: int, db: Session):
+    """
+    Extract, segment and analyze an answer sheet
+    Each finished stage is committed so a retry resumes where it failed.
+    """
+    answer_sheet = db.query(AnswerSheet).filter(AnswerSheet.id == answer_sheet_id).first()
+    if not answer_sheet or answer_sheet.status != "processing":
+        return
+
+    # Text and Q&A are stored on the blob, so identical uploads reuse them
+    blob = answer_sheet.blob
+    if blob is None:
+        raise Exception(f"No stored file for answer sheet {answer_sheet.id}")
+
+    # Identical uploads processed at the same time run again later, and then
+    # reuse the first one's artifacts instead of deriving them again
+    claimant = f"{WORKER_ID}:{answer_sheet.id}"
+    if not _claim_blob(db, blob.id, claimant):
+        raise JobDeferred(f"Stored file of answer sheet {answer_sheet.id} is being processed by {blob.claimed_by}")
+    try:
+        analyses_data = _derive_blob(db, blob)
+    finally:
+        _release_blob(db, blob.id, claimant)
+
+    # Compare the answers with other students' in the same cohort
+    flag_similar_answers(db, answer_sheet, blob)
+    db.commit()
+
+    from app.routers.analytics import process_answer_sheet_analysis
+
+    process_answer_sheet_analysis(answer_sheet.id, db, analyses_data)
+
+def process_answer_sheet_job(payload: Dict[str, Any], db: Session):
+    process_answer_sheet(payload["answer_sheet_id"], db)
+
+def mark_answer_sheet_failed(payload: Dict[str, Any], db: Session, error: str):
+    answer_sheet = db.query(AnswerSheet).filter(AnswerSheet.id == payload.get("answer_sheet_id")).first()
+    if answer_sheet and answer_sheet.status == "processing":
+        answer_sheet.status = "error"
+        db.commit()
+
+def requeue_orphaned_answer_sheets(db: Session) -> int:
+    """Enqueue sheets stuck in "processing" that have no live job (e.g. after a crash)"""
+    from app.services.job_queue import enqueue_job
+
+    pending = db.query(Job).filter(
+        Job.kind == "process_answer_sheet",
+        Job.status.in_(["queued", "running"])
+    ).all()
+    covered = {job.payload.get("answer_sheet_id") for job in pending if job.payload}
+
+    orphaned = db.query(AnswerSheet.id).filter(AnswerSheet.status == "processing").all()
+    count = 0
+    for (answer_sheet_id,) in orphaned:
+        if answer_sheet_id not in covered:
+            enqueue_job(db, "process_answer_sheet", {"answer_sheet_id": answer_sheet_id})
+            count += 1
+    db.commit()
+    return count
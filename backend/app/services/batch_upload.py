@@ -0,0 +1,166 @@
+"""
+Bulk answer-sheet uploads
+A teacher uploads a whole class's scans as a ZIP (or several PDFs in one
+request). Entries are unpacked to disk one at a time, matched to students by
+student ID, and stored as answer sheets in one transaction. The background
+job workers then extract, segment and analyze them in parallel.
+"""
+import csv
+import hashlib
+import io
+import os
+import shutil
+import uuid
+import zipfile
+from typing import Dict, List, Tuple, Optional, Any
+from sqlalchemy.orm import Session
+from app.models import User, AnswerSheet, UploadBatch
+from app.services.blob_store import BlobStore
+from app.services.job_queue import enqueue_jobs
+from app.services.upload_service import UPLOAD_MAX_BYTES, UPLOAD_CHUNK_SIZE
+
+BATCH_UPLOAD_MAX_BYTES = int(os.getenv("BATCH_UPLOAD_MAX_BYTES", str(1024 * 1024 * 1024)))  # 1 GB
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+
+# Optional "file,student_id" mapping; otherwise files are named by student ID
+MANIFEST_NAME = "manifest.csv"
+# Manifests are parsed in memory, so they get a much smaller cap than PDFs
+MANIFEST_MAX_BYTES = int(os.getenv("MANIFEST_MAX_BYTES", str(1024 * 1024)))  # 1 MB
+MANIFEST_TOO_LARGE = f"Manifest exceeds maximum size of {MANIFEST_MAX_BYTES} bytes"
+
+def parse_manifest(content: bytes) -> Dict[str, str]:
+    """File name -> student ID from a manifest CSV (header row optional)"""
+    rows = csv.reader(io.StringIO(content.decode("utf-8-sig")))
+    manifest = {}
+    for row in rows:
+        if len(row) < 2 or not row[0].strip() or row[0].strip().lower() in ("file", "file_name", "filename"):
+            continue
+        manifest[row[0].strip()] = row[1].strip()
+    return manifest
+
+def unpack_zip(zip_path: str, directory: str) -> Tuple[List[Dict[str, Any]], Dict[str, str], List[Dict[str, str]]]:
+    """
+    Unpack the PDFs of a ZIP into directory, one entry at a time
+    Returns (files, manifest, rejected). Each file is hashed while it is
+    copied, and entries larger than UPLOAD_MAX_BYTES (MANIFEST_MAX_BYTES for
+    the manifest) are rejected whatever size the archive claims.
+    """
+    files, rejected = [], []
+    manifest: Dict[str, str] = {}
+    os.makedirs(directory, exist_ok=True)
+
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            base = os.path.basename(name)
+            if info.is_dir() or not base or base.startswith(".") or name.startswith("__MACOSX/"):
+                continue
+            if base.lower() == MANIFEST_NAME:
+                content = b""
+                if info.file_size <= MANIFEST_MAX_BYTES:
+                    # Bounded read, whatever size the archive claims
+                    with archive.open(info) as source:
+                        content = source.read(MANIFEST_MAX_BYTES + 1)
+                if info.file_size > MANIFEST_MAX_BYTES or len(content) > MANIFEST_MAX_BYTES:
+                    rejected.append({"file_name": name, "error": MANIFEST_TOO_LARGE})
+                else:
+                    manifest.update(parse_manifest(content))
+                continue
+            if not base.lower().endswith(".pdf"):
+                rejected.append({"file_name": name, "error": "Only PDF files are allowed"})
+                continue
+            if len(files) >= BATCH_MAX_FILES:
+                rejected.append({"file_name": name, "error": f"Batch exceeds {BATCH_MAX_FILES} files"})
+                continue
+            if info.file_size > UPLOAD_MAX_BYTES:
+                rejected.append({"file_name": name, "error": f"File exceeds maximum size of {UPLOAD_MAX_BYTES} bytes"})
+                continue
+
+            path = os.path.join(directory, f"{uuid.uuid4()}.pdf")
+            digest = hashlib.sha256()
+            size = 0
+            with archive.open(info) as source, open(path, "wb") as target:
+                while size <= UPLOAD_MAX_BYTES:
+                    chunk = source.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    digest.update(chunk)
+                    target.write(chunk)
+            if size > UPLOAD_MAX_BYTES or size == 0:
+                os.remove(path)
+                error = "Uploaded file is empty" if size == 0 else f"File exceeds maximum size of {UPLOAD_MAX_BYTES} bytes"
+                rejected.append({"file_name": name, "error": error})
+                continue
+            files.append({"file_name": name, "path": path, "sha256": digest.hexdigest(), "size": size})
+
+    return files, manifest, rejected
+
+def _student_keys(file_name: str, manifest: Dict[str, str]) -> List[str]:
+    """Candidate student IDs for a file, most specific first"""
+    if file_name in manifest:
+        return [manifest[file_name]]
+    base = os.path.basename(file_name)
+    if base in manifest:
+        return [manifest[base]]
+    stem = os.path.splitext(base)[0].strip()
+    # "STU001.pdf", "STU001_Alex.pdf", "STU001 - Alex.pdf" or "STU001/scan.pdf"
+    keys = [stem, stem.replace("-", " ").replace("_", " ").split()[0] if stem else ""]
+    parent = os.path.dirname(file_name).split("/")[0]
+    if parent:
+        keys.insert(0, parent)
+    return [key for key in keys if key]
+
+def create_batch(
+    db: Session,
+    teacher_id: int,
+    files: List[Dict[str, Any]],
+    manifest: Dict[str, str],
+    rejected: List[Dict[str, str]]
+) -> UploadBatch:
+    """
+    Store a batch's files as answer sheets and queue their processing
+    Students are looked up by their student ID in one query. Files that match
+    no student are recorded as rejected. Nothing is committed here.
+    """
+    rejected = list(rejected)
+    keys = {file["file_name"]: _student_keys(file["file_name"], manifest) for file in files}
+    wanted = {key for candidates in keys.values() for key in candidates}
+    students = {
+        student_id: user_id
+        for user_id, student_id in db.query(User.id, User.student_id).filter(
+            User.role == "student", User.student_id.in_(wanted)
+        )
+    } if wanted else {}
+
+    batch = UploadBatch(teacher_id=teacher_id, file_count=len(files) + len(rejected))
+    db.add(batch)
+    db.flush()
+
+    answer_sheets = []
+    for file in files:
+        user_id = next((students[key] for key in keys[file["file_name"]] if key in students), None)
+        if user_id is None:
+            os.remove(file["path"])
+            rejected.append({"file_name": file["file_name"], "error": "No student with this student ID"})
+            continue
+        blob = BlobStore.add(db, file["path"], file["sha256"], file["size"])
+        answer_sheets.append(AnswerSheet(
+            student_id=user_id,
+            file_path=blob.file_path,
+            file_name=file["file_name"],
+            content_hash=blob.sha256,
+            status="processing",
+            batch_id=batch.id
+        ))
+
+    db.add_all(answer_sheets)
+    db.flush()
+    enqueue_jobs(db, "process_answer_sheet", [{"answer_sheet_id": sheet.id} for sheet in answer_sheets])
+    batch.rejected = rejected
+    return batch
+
+def discard_files(directory: Optional[str]):
+    """Remove a batch's unpacked files that were not moved into the blob store"""
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,93 @@
+import os
+import time
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Blob
+from app.services.search_index import remove_entries
+from app.services.similarity import remove_signatures
+
+BLOB_DIR = "uploads/blobs"
+# Files on disk without a Blob row are only removed once they are this old,
+# so uploads that have not committed yet are left alone
+BLOB_ORPHAN_GRACE = int(os.getenv("BLOB_ORPHAN_GRACE", "3600"))
+
+class BlobStore:
+    @staticmethod
+    def path_for(sha256: str) -> str:
+        """Content-addressed location of a blob"""
+        return f"{BLOB_DIR}/{sha256[:2]}/{sha256}.pdf"
+
+    @staticmethod
+    def get(db: Session, sha256: Optional[str]) -> Optional[Blob]:
+        if not sha256:
+            return None
+        return db.query(Blob).filter(Blob.sha256 == sha256).first()
+
+    @staticmethod
+    def add(db: Session, temp_path: str, sha256: str, size: int) -> Blob:
+        """
+        Move a freshly uploaded file into the store and take a reference to it
+        If the same content is already stored, the upload is discarded.
+        """
+        blob = BlobStore.get(db, sha256)
+        if blob and os.path.exists(blob.file_path):
+            os.remove(temp_path)
+        else:
+            path = BlobStore.path_for(sha256)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+            if blob:
+                blob.file_path = path
+            else:
+                try:
+                    with db.begin_nested():
+                        db.add(Blob(sha256=sha256, file_path=path, size=size, ref_count=0))
+                except IntegrityError:
+                    # Stored concurrently by another upload of the same content
+                    pass
+                blob = BlobStore.get(db, sha256)
+
+        db.execute(
+            update(Blob)
+            .where(Blob.id == blob.id)
+            .values(ref_count=Blob.ref_count + 1, last_used_at=datetime.utcnow())
+        )
+        db.refresh(blob)
+        return blob
+
+    @staticmethod
+    def release(db: Session, sha256: Optional[str]):
+        """Drop a reference; unreferenced blobs are removed by collect_garbage"""
+        if not sha256:
+            return
+        db.execute(
+            update(Blob)
+            .where(Blob.sha256 == sha256, Blob.ref_count > 0)
+            .values(ref_count=Blob.ref_count - 1)
+        )
+
+    @staticmethod
+    def collect_garbage(db: Session) -> int:
+        """Delete unreferenced blobs and stray files in the store"""
+        removed = 0
+        for blob in db.query(Blob).filter(Blob.ref_count <= 0).all():
+            if blob.file_path and os.path.exists(blob.file_path):
+                os.remove(blob.file_path)
+            remove_entries(db, blob.id)
+            remove_signatures(db, blob.id)
+            db.delete(blob)
+            removed += 1
+        db.commit()
+
+        known = {path for (path,) in db.query(Blob.file_path).all()}
+        cutoff = time.time() - BLOB_ORPHAN_GRACE
+        for root, _, files in os.walk(BLOB_DIR):
+            for name in files:
+                path = f"{root}/{name}"
+                if path not in known and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+        return removed
@@ -0,0 +1,176 @@
+"""
+Token-aware chunking of long documents for LLM prompts, and deterministic
+merging of the per-chunk results
+"""
+import os
+import re
+from typing import List, Dict, Any
+
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "1000"))
+# Rough size of a token for English text; avoids a tokenizer dependency
+CHARS_PER_TOKEN = 4
+
+# Split points: blank lines (page and paragraph breaks) and the start of a
+# numbered question
+_BOUNDARY = re.compile(r'\n\s*\n|\n(?=[ \t]*(?:Q|Question)[ \t]*\d+|[ \t]*\d+[\.\)][ \t])', re.IGNORECASE)
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _split_long(segment: str, max_chars: int) -> List[str]:
+    """Split an oversized segment at whitespace"""
+    parts = []
+    while len(segment) > max_chars:
+        cut = segment.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        parts.append(segment[:cut])
+        segment = segment[cut:].lstrip()
+    if segment:
+        parts.append(segment)
+    return parts
+
+def chunk_text(text: str, max_tokens: int = LLM_CHUNK_TOKENS) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens
+    Chunks end on page, paragraph or question boundaries where possible.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return [text] if text.strip() else []
+
+    segments = []
+    last = 0
+    for match in _BOUNDARY.finditer(text):
+        segments.append(text[last:match.start()])
+        last = match.end()
+    segments.append(text[last:])
+
+    chunks = []
+    current = []
+    current_len = 0
+    for segment in segments:
+        segment = segment.strip()
+        if not segment:
+            continue
+        for piece in _split_long(segment, max_chars):
+            if current and current_len + len(piece) + 2 > max_chars:
+                chunks.append("\n\n".join(current))
+                current = []
+                current_len = 0
+            current.append(piece)
+            current_len += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def format_qa_pair(qa: Dict[str, str]) -> str:
+    return f"Q: {qa.get('question', '')}\nA: {qa.get('answer', '')}"
+
+def chunk_qa_pairs(qa_pairs: List[Dict[str, str]], max_tokens: int = LLM_CHUNK_TOKENS) -> List[List[Dict[str, str]]]:
+    """Group Q&A pairs into prompt-sized chunks without splitting a pair"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = []
+    current_len = 0
+    for qa in qa_pairs:
+        size = min(len(format_qa_pair(qa)), max_chars) + 2
+        if current and current_len + size > max_chars:
+            chunks.append(current)
+            current = []
+            current_len = 0
+        current.append(qa)
+        current_len += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+def format_qa_chunk(qa_pairs: List[Dict[str, str]], max_tokens: int = LLM_CHUNK_TOKENS) -> str:
+    """Prompt text for a chunk; only a single pair larger than a whole chunk is shortened"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    return "\n\n".join(format_qa_pair(qa)[:max_chars] for qa in qa_pairs)
+
+def _normalize(name: str) -> str:
+    return " ".join(str(name).lower().split())
+
+def merge_topics(results: List[List[str]]) -> List[str]:
+    """Union of topic lists in chunk order, ignoring case and spacing differences"""
+    merged = []
+    seen = set()
+    for topics in results:
+        for topic in topics:
+            if not isinstance(topic, str):
+                continue
+            key = _normalize(topic)
+            if key and key not in seen:
+                seen.add(key)
+                merged.append(topic.strip())
+    return merged
+
+def merge_qa_pairs(results: List[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+    """Concatenate Q&A pairs in chunk order, dropping exact repeats"""
+    merged = []
+    seen = set()
+    for qa_pairs in results:
+        for qa in qa_pairs:
+            if not isinstance(qa, dict):
+                continue
+            key = (_normalize(qa.get("question", "")), _normalize(qa.get("answer", "")))
+            if key not in seen:
+                seen.add(key)
+                merged.append(qa)
+    return merged
+
+def merge_analyses(results: List[List[Dict[str, Any]]], weights: List[float], topics: List[str]) -> List[Dict[str, Any]]:
+    """
+    Combine per-chunk topic analyses
+    Scores are averaged weighted by chunk size times confidence. Entries
+    marked "covered": false (no evidence for the topic in that chunk) are
+    left out for topics another chunk covers, so a topic answered in one
+    chunk is not pulled down by the chunks that never mention it. Output
+    follows syllabus topic order, then any extra topics in first-seen order.
+    """
+    names = {_normalize(t): t for t in topics}
+    order = list(names)
+    entries = [
+        (analysis, weight)
+        for analyses, weight in zip(results, weights)
+        for analysis in analyses
+        if isinstance(analysis, dict) and "topic" in analysis
+    ]
+    covered = {_normalize(analysis["topic"]) for analysis, _ in entries if analysis.get("covered", True) is not False}
+    totals: Dict[str, Dict[str, Any]] = {}
+    for analysis, weight in entries:
+        key = _normalize(analysis["topic"])
+        if key in covered and analysis.get("covered", True) is False:
+            continue
+        try:
+            score = float(analysis.get("understanding_score", 0))
+            confidence = float(analysis.get("confidence", 0.5))
+        except (TypeError, ValueError):
+            continue
+        entry = totals.setdefault(key, {
+            "topic": names.get(key, analysis["topic"]), "score": 0.0, "confidence": 0.0,
+            "weight": 0.0, "chunk_weight": 0.0, "details": []
+        })
+        w = weight * max(confidence, 0.01)
+        entry["score"] += score * w
+        entry["weight"] += w
+        entry["confidence"] += confidence * weight
+        entry["chunk_weight"] += weight
+        details = analysis.get("details")
+        if details and details not in entry["details"]:
+            entry["details"].append(details)
+
+    keys = [k for k in order if k in totals] + [k for k in totals if k not in order]
+    merged = []
+    for key in keys:
+        entry = totals[key]
+        details = entry["details"]
+        merged.append({
+            "topic": entry["topic"],
+            "understanding_score": round(entry["score"] / entry["weight"], 1) if entry["weight"] else 0,
+            "confidence": round(entry["confidence"] / entry["chunk_weight"], 2) if entry["chunk_weight"] else 0,
+            "details": details[0] if len(details) == 1 else " ".join(str(d) for d in details)
+        })
+    return merged
@@ -0,0 +1,118 @@
+"""
+Circuit breaker for calls to external services
+Trips after too many failed or slow calls within a time window. While open,
+calls are rejected immediately so callers can use a local fallback; after a
+cool-down a single probe call is let through to test the service again.
+"""
+import os
+import time
+import threading
+from collections import deque
+from typing import Dict, Any
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_WINDOW = float(os.getenv("CIRCUIT_WINDOW", "60"))  # seconds
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))  # seconds before a probe
+CIRCUIT_SLOW_CALL = float(os.getenv("CIRCUIT_SLOW_CALL", "20"))  # seconds; slower calls count as failures
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit is open"""
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        window: float = CIRCUIT_WINDOW,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+        slow_call: float = CIRCUIT_SLOW_CALL
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self._lock = threading.Lock()
+        self._state = "closed"  # closed, open, half_open
+        self._failures = deque()  # timestamps of recent failed or slow calls
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._counters = {"successes": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go through now"""
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = "half_open"
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def record_success(self, duration: float):
+        if duration > self.slow_call:
+            with self._lock:
+                self._counters["slow_calls"] += 1
+            self.record_failure(counted=False)
+            return
+        with self._lock:
+            self._counters["successes"] += 1
+            if self._state == "half_open":
+                self._state = "closed"
+                self._failures.clear()
+            self._probe_in_flight = False
+
+    def record_failure(self, counted: bool = True):
+        now = time.monotonic()
+        with self._lock:
+            if counted:
+                self._counters["failures"] += 1
+            self._probe_in_flight = False
+            if self._state == "half_open":
+                self._trip(now)
+                return
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window:
+                self._failures.popleft()
+            if self._state == "closed" and len(self._failures) >= self.failure_threshold:
+                self._trip(now)
+
+    def record_ignored(self):
+        """End a call whose outcome says nothing about the service's health"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _trip(self, now: float):
+        self._state = "open"
+        self._opened_at = now
+        self._failures.clear()
+        self._counters["opened"] += 1
+
+    def call(self, func, *args, **kwargs):
+        """Run func through the breaker, raising CircuitOpenError when open"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._state
+            if state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                state = "half_open"
+            return {
+                "name": self.name,
+                "state": state,
+                "recent_failures": len(self._failures),
+                "failure_threshold": self.failure_threshold,
+                **self._counters
+            }
@@ -0,0 +1,160 @@
+"""
+Streaming export of class analytics
+Rows are read from the database in fixed-size partitions (a server-side
+cursor where the driver supports one) and encoded one partition at a time,
+so exports of any size use constant memory and start sending at once.
+"""
+import csv
+import io
+import os
+from typing import AsyncIterator, Dict, List, Sequence
+import orjson
+from sqlalchemy import func, select, Select
+from app.database import AsyncSessionLocal
+from app.models import User, Syllabus, AnswerSheet, Analysis, Topic, StudentTopicRollup
+
+# Rows fetched and encoded per chunk (and per Parquet row group)
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "5000"))
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Column name -> Arrow type name, in output order
+ANALYSIS_COLUMNS = {
+    "student_id": "string",
+    "student_name": "string",
+    "topic": "string",
+    "score": "float64",
+    "confidence": "float64",
+    "answer_sheet_id": "int64",
+    "analyzed_at": "timestamp",
+}
+SUMMARY_COLUMNS = {
+    "student_id": "string",
+    "student_name": "string",
+    "topic": "string",
+    "average": "float64",
+    "count": "int64",
+    "min": "float64",
+    "max": "float64",
+}
+
+def analyses_query(teacher_id: int) -> Select:
+    """Every analysis against the teacher's syllabi, in insertion order"""
+    return select(
+        User.student_id, User.name, Topic.name, Analysis.understanding_score,
+        Analysis.confidence, Analysis.answer_sheet_id, Analysis.created_at
+    ).select_from(Analysis).join(
+        Syllabus, Analysis.syllabus_id == Syllabus.id
+    ).join(
+        AnswerSheet, Analysis.answer_sheet_id == AnswerSheet.id
+    ).join(
+        User, AnswerSheet.student_id == User.id
+    ).join(
+        Topic, Analysis.topic_id == Topic.id
+    ).where(Syllabus.teacher_id == teacher_id).order_by(Analysis.id)
+
+def summary_query(teacher_id: int) -> Select:
+    """Per-student, per-topic aggregates from the rollups"""
+    return select(
+        User.student_id,
+        User.name,
+        func.min(Topic.name),
+        func.sum(StudentTopicRollup.score_sum) / func.sum(StudentTopicRollup.score_count),
+        func.sum(StudentTopicRollup.score_count),
+        func.min(StudentTopicRollup.score_min),
+        func.max(StudentTopicRollup.score_max)
+    ).select_from(StudentTopicRollup).join(
+        Topic, StudentTopicRollup.topic_id == Topic.id
+    ).join(
+        Syllabus, Topic.syllabus_id == Syllabus.id
+    ).join(
+        User, StudentTopicRollup.student_id == User.id
+    ).where(Syllabus.teacher_id == teacher_id).group_by(
+        User.id, User.student_id, User.name, Topic.key
+    ).order_by(User.id, func.min(StudentTopicRollup.id))
+
+async def _partitions(query: Select, batch_rows: int) -> AsyncIterator[Sequence]:
+    # Own session: the stream outlives the request handler
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=batch_rows))
+        async for partition in result.partitions(batch_rows):
+            yield partition
+
+async def _csv(columns: List[str], partitions) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode("utf-8")
+    async for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+
+async def _jsonl(columns: List[str], partitions) -> AsyncIterator[bytes]:
+    async for rows in partitions:
+        yield b"".join(orjson.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+class _ChunkSink:
+    """Write-only file for pyarrow that hands back what was written so far"""
+    closed = False
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def _parquet(columns: Dict[str, str], partitions) -> AsyncIterator[bytes]:
+    # Imported here: pyarrow is large and only needed for Parquet exports
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"string": pa.string(), "float64": pa.float64(), "int64": pa.int64(), "timestamp": pa.timestamp("us")}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns.items()])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for rows in partitions:
+            # One row group per partition
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def export_rows(teacher_id: int, format: str, detail: str = "analyses", batch_rows: int = EXPORT_BATCH_ROWS) -> AsyncIterator[bytes]:
+    """Encoded export of a teacher's class, as an async stream of byte chunks"""
+    columns = SUMMARY_COLUMNS if detail == "summary" else ANALYSIS_COLUMNS
+    query = summary_query(teacher_id) if detail == "summary" else analyses_query(teacher_id)
+    partitions = _partitions(query, batch_rows)
+    if format == "parquet":
+        return _parquet(columns, partitions)
+    if format == "jsonl":
+        return _jsonl(list(columns), partitions)
+    return _csv(list(columns), partitions)
@@ -0,0 +1,377 @@
+"""
+DB-backed background job queue
+
+Jobs are rows in the `jobs` table, so they survive restarts. A dispatcher
+thread claims queued jobs and runs them on a thread or process pool.
+"""
+import os
+import socket
+import logging
+import threading
+import importlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from sqlalchemy import update, func
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Job
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "thread")  # "thread" or "process"
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))  # seconds, doubled per attempt
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "900"))  # seconds a job may stay "running"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Errors of earlier attempts kept in Job.last_error, newest last
+JOB_ERROR_HISTORY_CHARS = 4000
+
+logger = logging.getLogger(__name__)
+
+# Handlers are referenced by import path so they can be resolved inside
+# worker processes. Each takes (payload, db).
+JOB_HANDLERS = {
+    "process_answer_sheet": "app.services.answer_sheet_pipeline:process_answer_sheet_job",
+    "backfill_rollups": "app.services.rollups:backfill_rollups_job",
+    "backfill_search_index": "app.services.search_index:backfill_search_index_job",
+    "backfill_similarity": "app.services.similarity:backfill_similarity_job",
+}
+
+# Called with (payload, db, error) once a job has used up its attempts
+JOB_FAILURE_HANDLERS = {
+    "process_answer_sheet": "app.services.answer_sheet_pipeline:mark_answer_sheet_failed",
+}
+
+class JobDeferred(Exception):
+    """
+    Raised by a handler that cannot run yet (e.g. another worker holds what it
+    needs): the job is queued again after delay seconds, without using up an
+    attempt, instead of blocking a worker while it waits
+    """
+
+    def __init__(self, message: str, delay: float = JOB_RETRY_BACKOFF):
+        super().__init__(message, delay)
+        self.delay = delay
+
+    def __str__(self):
+        return self.args[0]
+
+def _resolve(path: str):
+    module_name, func_name = path.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+def enqueue_job(db: Session, kind: str, payload: Dict[str, Any], max_attempts: Optional[int] = None) -> Job:
+    """Add a job to the session; it becomes visible to workers when the caller commits"""
+    return enqueue_jobs(db, kind, [payload], max_attempts)[0]
+
+def enqueue_jobs(
+    db: Session,
+    kind: str,
+    payloads: List[Dict[str, Any]],
+    max_attempts: Optional[int] = None
+) -> List[Job]:
+    """Add one job per payload with a single flush (e.g. for a bulk upload)"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    now = datetime.utcnow()
+    jobs = [
+        Job(
+            kind=kind,
+            payload=payload,
+            status="queued",
+            attempts=0,
+            max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+            created_at=now,
+            run_after=now
+        )
+        for payload in payloads
+    ]
+    db.add_all(jobs)
+    db.flush()
+    return jobs
+
+def enqueue_job_once(db: Session, kind: str, payload: Optional[Dict[str, Any]] = None) -> Optional[Job]:
+    """Enqueue a job unless one of the same kind is already queued or running"""
+    pending = db.query(Job.id).filter(Job.kind == kind, Job.status.in_(["queued", "running"])).first()
+    if pending is not None:
+        return None
+    return enqueue_job(db, kind, payload or {})
+
+def run_job(job_id: int):
+    """Execute a claimed job in the current worker (thread or process)"""
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if not job:
+            return
+        handler = _resolve(JOB_HANDLERS[job.kind])
+        try:
+            handler(job.payload or {}, db)
+        except JobDeferred:
+            raise
+        except Exception:
+            # Logged here, where the traceback is still available
+            logger.exception("Job %s (%s) failed on attempt %s of %s", job.id, job.kind, job.attempts, job.max_attempts)
+            raise
+    finally:
+        db.close()
+
+def _record_error(job: Job, error: str):
+    """Append an attempt's error to the job's error history"""
+    entry = f"Attempt {job.attempts}: {error}"
+    job.last_error = f"{job.last_error}\n{entry}"[-JOB_ERROR_HISTORY_CHARS:] if job.last_error else entry
+
+def _fail_job(db: Session, job: Job, error: str):
+    job.status = "failed"
+    job.finished_at = datetime.utcnow()
+    _record_error(job, error)
+    db.commit()
+    logger.error("Job %s (%s) failed after %s attempts: %s", job.id, job.kind, job.attempts, error)
+    hook = JOB_FAILURE_HANDLERS.get(job.kind)
+    if hook:
+        try:
+            _resolve(hook)(job.payload or {}, db, error)
+        except Exception:
+            logger.exception("Failure handler for job %s failed", job.id)
+            db.rollback()
+
+def _schedule_retry(db: Session, job: Job, error: str):
+    if job.attempts >= job.max_attempts:
+        _fail_job(db, job, error)
+        return
+    job.status = "queued"
+    _record_error(job, error)
+    job.locked_by = None
+    job.run_after = datetime.utcnow() + timedelta(seconds=JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1))
+    db.commit()
+    logger.warning("Job %s (%s) attempt %s failed, retrying at %s: %s", job.id, job.kind, job.attempts, job.run_after, error)
+
+def _defer_job(db: Session, job: Job, deferred: JobDeferred):
+    job.status = "queued"
+    job.attempts -= 1
+    job.locked_by = None
+    job.run_after = datetime.utcnow() + timedelta(seconds=deferred.delay)
+    db.commit()
+    logger.info("Job %s (%s) deferred until %s: %s", job.id, job.kind, job.run_after, deferred)
+
+def _unclaim_jobs(job_ids: List[int]):
+    """Return claimed jobs that were never started to the queue, without counting an attempt"""
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Job)
+            .where(Job.id.in_(job_ids), Job.status == "running", Job.locked_by == WORKER_ID)
+            .values(status="queued", attempts=Job.attempts - 1, locked_by=None, started_at=None)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def recover_stale_jobs(db: Session) -> int:
+    """Requeue jobs left in "running" by a crashed or killed worker"""
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+    stale = db.query(Job).filter(Job.status == "running", Job.started_at < cutoff).all()
+    for job in stale:
+        _schedule_retry(db, job, f"Worker {job.locked_by} did not finish the job")
+    return len(stale)
+
+def get_queue_stats(db: Session, sample_size: int = 200) -> Dict[str, Any]:
+    """Queue depth per status and wait/run latency over recently finished jobs"""
+    counts = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    oldest_queued = db.query(func.min(Job.created_at)).filter(Job.status == "queued").scalar()
+    recent = db.query(Job).filter(
+        Job.status == "done"
+    ).order_by(Job.finished_at.desc()).limit(sample_size).all()
+
+    waits = [(j.started_at - j.created_at).total_seconds() for j in recent if j.started_at and j.created_at]
+    runs = [(j.finished_at - j.started_at).total_seconds() for j in recent if j.finished_at and j.started_at]
+
+    def summarize(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {"avg": 0, "p95": 0, "max": 0}
+        ordered = sorted(values)
+        return {
+            "avg": round(sum(ordered) / len(ordered), 3),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+            "max": round(ordered[-1], 3)
+        }
+
+    return {
+        "queue_depth": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "done": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_queued_age": round((datetime.utcnow() - oldest_queued).total_seconds(), 3) if oldest_queued else 0,
+        "wait_seconds": summarize(waits),
+        "run_seconds": summarize(runs),
+        "worker": worker_pool.stats()
+    }
+
+class JobWorkerPool:
+    """Claims queued jobs from the database and runs them on an executor"""
+
+    def __init__(self, workers: int = JOB_WORKERS, mode: str = JOB_WORKER_MODE):
+        self.workers = max(1, workers)
+        self.mode = mode
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {"claimed": 0, "succeeded": 0, "deferred": 0, "retried": 0, "failed": 0, "recovered": 0}
+
+    def _create_executor(self):
+        if self.mode == "process":
+            # spawn: the API process runs threads (this dispatcher, the LLM
+            # loop) and connection pools, which fork does not copy safely
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-worker")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._executor = self._create_executor()
+        self._stop.clear()
+
+        db = SessionLocal()
+        try:
+            self._counters["recovered"] += recover_stale_jobs(db)
+        finally:
+            db.close()
+
+        self._thread = threading.Thread(target=self._run, name="job-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+        self._thread = None
+        self._executor = None
+
+    def notify(self):
+        """Wake the dispatcher right away instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "id": WORKER_ID,
+                "mode": self.mode,
+                "workers": self.workers,
+                "in_flight": self._in_flight,
+                **self._counters
+            }
+
+    def _run(self):
+        last_recovery = datetime.utcnow()
+        while not self._stop.is_set():
+            try:
+                claimed = self._claim_jobs()
+                if (datetime.utcnow() - last_recovery).total_seconds() > JOB_STALE_AFTER / 4:
+                    db = SessionLocal()
+                    try:
+                        recovered = recover_stale_jobs(db)
+                    finally:
+                        db.close()
+                    with self._lock:
+                        self._counters["recovered"] += recovered
+                    last_recovery = datetime.utcnow()
+            except Exception:
+                logger.exception("Job dispatcher error")
+                claimed = 0
+            if not claimed:
+                self._wakeup.wait(JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+
+    def _claim_jobs(self) -> int:
+        with self._lock:
+            capacity = self.workers - self._in_flight
+        if capacity <= 0:
+            return 0
+
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            candidates = db.query(Job.id).filter(
+                Job.status == "queued",
+                Job.run_after <= now
+            ).order_by(Job.id).limit(capacity).all()
+
+            claimed = []
+            for (job_id,) in candidates:
+                # Compare-and-set so concurrent dispatchers never run the same job
+                result = db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "queued")
+                    .values(status="running", started_at=now, locked_by=WORKER_ID, attempts=Job.attempts + 1)
+                )
+                if result.rowcount == 1:
+                    claimed.append(job_id)
+            db.commit()
+        finally:
+            db.close()
+
+        for index, job_id in enumerate(claimed):
+            with self._lock:
+                self._in_flight += 1
+                self._counters["claimed"] += 1
+            try:
+                future = self._executor.submit(run_job, job_id)
+            except BrokenExecutor:
+                # A worker process died (e.g. out of memory); the pool takes no
+                # more jobs, so the unsubmitted ones go back to the queue
+                logger.error("Job executor is broken, replacing it and requeueing %s job(s)", len(claimed) - index)
+                with self._lock:
+                    self._in_flight -= 1
+                    self._counters["claimed"] -= 1
+                _unclaim_jobs(claimed[index:])
+                self._replace_executor()
+                return index
+            future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+        return len(claimed)
+
+    def _replace_executor(self):
+        broken, self._executor = self._executor, self._create_executor()
+        # Jobs still in the broken pool fail through their futures
+        broken.shutdown(wait=False)
+
+    def _on_done(self, job_id: int, future):
+        error = future.exception()
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if job and job.status == "running":
+                if error is None:
+                    job.status = "done"
+                    job.finished_at = datetime.utcnow()
+                    db.commit()
+                    outcome = "succeeded"
+                elif isinstance(error, JobDeferred):
+                    _defer_job(db, job, error)
+                    outcome = "deferred"
+                else:
+                    _schedule_retry(db, job, str(error) or repr(error))
+                    outcome = "failed" if job.status == "failed" else "retried"
+                with self._lock:
+                    self._counters[outcome] += 1
+        except Exception:
+            logger.exception("Error recording result of job %s", job_id)
+        finally:
+            db.close()
+            with self._lock:
+                self._in_flight -= 1
+            self._wakeup.set()
+
+worker_pool = JobWorkerPool()
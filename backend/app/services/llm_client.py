@@ -0,0 +1,155 @@
+"""
+Process-wide async OpenAI client
+All chat completions go through one AsyncOpenAI client running on a
+dedicated event loop thread, so connections are pooled and kept alive
+across requests. A global semaphore caps in-flight calls; transient
+failures (429, 5xx, timeouts) are retried with jittered exponential backoff.
+Every attempt goes through the circuit breaker, and only those transient
+failures count against it.
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+from typing import Dict, Any, Optional
+from openai import AsyncOpenAI, APIStatusError, APITimeoutError, APIConnectionError
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))  # seconds per attempt
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))  # seconds
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))  # seconds
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (APITimeoutError, APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+def _backoff_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when given"""
+    if isinstance(error, APIStatusError):
+        retry_after = error.response.headers.get("retry-after") if error.response is not None else None
+        try:
+            if retry_after:
+                return min(LLM_BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+class LLMClient:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, breaker: Optional[CircuitBreaker] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.breaker = breaker
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pid = None
+        self._in_flight = 0
+        self._counters = {"calls": 0, "succeeded": 0, "retries": 0, "failed": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(os.getenv("OPENAI_API_KEY"))
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # A forked worker process needs its own loop and connections
+            if self._loop is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+                self._thread.start()
+                asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+            return self._loop
+
+    async def _setup(self):
+        self._client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=LLM_TIMEOUT,
+            max_retries=0  # Retries are handled below, outside the semaphore
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _record_attempt(self, started: float, error: Optional[BaseException] = None):
+        """Report one attempt to the breaker; client errors (4xx) are not held against the service"""
+        if self.breaker is None:
+            return
+        if error is None:
+            self.breaker.record_success(time.monotonic() - started)
+        elif isinstance(error, Exception) and _is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_ignored()
+
+    async def _complete(self, **params) -> str:
+        """Run on the client loop: one completion with retries"""
+        self._counters["calls"] += 1
+        attempt = 0
+        while True:
+            # Checked per attempt, so an opened circuit also ends the retries
+            if self.breaker is not None and not self.breaker.allow():
+                self._counters["failed"] += 1
+                raise CircuitOpenError(f"{self.breaker.name} circuit is open")
+            async with self._semaphore:
+                self._in_flight += 1
+                started = time.monotonic()
+                try:
+                    response = await asyncio.wait_for(
+                        self._client.chat.completions.create(**params),
+                        timeout=LLM_TIMEOUT
+                    )
+                    self._record_attempt(started)
+                    self._counters["succeeded"] += 1
+                    return response.choices[0].message.content or ""
+                except BaseException as e:
+                    self._record_attempt(started, e)
+                    if not isinstance(e, Exception):
+                        raise
+                    if not _is_retryable(e) or attempt >= LLM_MAX_RETRIES:
+                        self._counters["failed"] += 1
+                        raise
+                    delay = _backoff_delay(attempt, e)
+                finally:
+                    self._in_flight -= 1
+            # Back off without holding a concurrency slot
+            self._counters["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def complete(self, **params) -> str:
+        """Blocking completion for worker threads; returns the message content"""
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._complete(**params), loop).result()
+
+    async def acomplete(self, **params) -> str:
+        """Completion awaitable from any event loop"""
+        loop = self._ensure_started()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._complete(**params), loop))
+
+    def close(self):
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                return
+            if self._client is not None:
+                asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            **self._counters
+        }
+
+# Fails fast while the circuit is open; callers then use the local fallback
+openai_breaker = CircuitBreaker("openai")
+llm_client = LLMClient(breaker=openai_breaker)
@@ -1,46 +1,256 @@
 import pdfplumber
 import PyPDF2
-from typing import Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Optional, List, Dict, Any, Callable, ContextManager, Iterator, Iterable, Tuple
+import multiprocessing
+import re
+import time
+import threading
 import os
 
+# Worker processes used to extract pages in parallel (0 or 1 extracts inline)
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+# Pages handed to a worker per task; each task opens the document once
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+# Smaller documents are extracted inline, where process overhead would dominate
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+# Extraction engines in escalation order: a page is re-extracted with the
+# next engine only when the previous one's text scores below the threshold
+PDF_EXTRACTORS = [name.strip() for name in os.getenv("PDF_EXTRACTORS", "pypdf2,pdfplumber").split(",") if name.strip()]
+PDF_QUALITY_THRESHOLD = float(os.getenv("PDF_QUALITY_THRESHOLD", "0.5"))
+# Pages with less text than this are escalated (e.g. scanned or layout-heavy pages)
+PDF_MIN_PAGE_CHARS = int(os.getenv("PDF_MIN_PAGE_CHARS", "20"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: the API process runs threads, which fork does not copy safely
+            _executor = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+def _count_pages(pdf_path: str) -> int:
+    try:
+        with open(pdf_path, 'rb') as file:
+            return len(PyPDF2.PdfReader(file).pages)
+    except Exception:
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+
+# name -> context manager yielding page_text(index) for an open document
+_extractors: Dict[str, Callable[[str], ContextManager[Callable[[int], str]]]] = {}
+
+def register_extractor(name: str):
+    """Register a generator function (pdf_path) -> yields page_text(index)"""
+    def decorator(func):
+        _extractors[name] = contextmanager(func)
+        return func
+    return decorator
+
+@register_extractor("pypdf2")
+def _pypdf2_pages(pdf_path: str):
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        yield lambda i: reader.pages[i].extract_text() or ""
+
+@register_extractor("pdfplumber")
+def _pdfplumber_pages(pdf_path: str):
+    with pdfplumber.open(pdf_path) as pdf:
+        def page_text(i: int) -> str:
+            page = pdf.pages[i]
+            try:
+                return page.extract_text() or ""
+            finally:
+                # Release the page's parsed layout objects
+                page.close()
+        yield page_text
+
+# Control characters, replacement/private-use characters and unmapped glyphs
+_GARBAGE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\ufffd\ue000-\uf8ff]|\(cid:\d+\)")
+
+def page_text_quality(text: str) -> float:
+    """
+    0-1 estimate of how usable extracted page text is
+    Combines the share of garbage characters, the share of letters and
+    digits, word spacing (run-together words) and line structure (one word
+    per line, or no line breaks at all).
+    """
+    stripped = text.strip()
+    if len(stripped) < PDF_MIN_PAGE_CHARS:
+        return 0.0
+    words = stripped.split()
+    visible = sum(len(word) for word in words)
+    garbage = sum(len(match) for match in _GARBAGE.findall(stripped))
+    alphanumeric = sum(char.isalnum() for char in stripped)
+    lines = [line for line in stripped.splitlines() if line.strip()]
+
+    garbage_score = max(0.0, 1 - 10 * garbage / visible)
+    alphanumeric_score = min(1.0, alphanumeric / visible / 0.6)
+    average_word = visible / len(words)
+    spacing_score = 1.0 if average_word <= 12 else max(0.0, 1 - (average_word - 12) / 12)
+    # Q&A segmentation works on lines, so broken line structure counts too
+    words_per_line = len(words) / len(lines)
+    line_score = min(1.0, words_per_line / 3) if words_per_line <= 40 else 0.3
+    return garbage_score * alphanumeric_score * spacing_score * line_score
+
+class ExtractionStats:
+    """Per-engine page counts and timings"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines: Dict[str, Dict[str, float]] = {}
+
+    def merge(self, counters: Dict[str, Dict[str, float]]):
+        with self._lock:
+            for name, values in counters.items():
+                engine = self._engines.setdefault(name, {})
+                for key, value in values.items():
+                    engine[key] = engine.get(key, 0) + value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "extractors": PDF_EXTRACTORS,
+                "quality_threshold": PDF_QUALITY_THRESHOLD,
+                "engines": {
+                    name: {**values, "seconds": round(values.get("seconds", 0), 3)}
+                    for name, values in self._engines.items()
+                }
+            }
+
+extraction_stats = ExtractionStats()
+
+def _iter_page_range(
+    pdf_path: str,
+    start: int,
+    end: int,
+    counters: Optional[Dict[str, Dict[str, float]]] = None
+) -> Iterator[str]:
+    """
+    Text of pages [start, end), one page at a time
+    Each page goes through the engines in PDF_EXTRACTORS order until one
+    produces text of acceptable quality; otherwise the best-scoring text is
+    used. Engines are opened the first time a page needs them. Timings are
+    added to counters, or to the process-wide stats.
+    """
+    local = counters if counters is not None else {}
+    engines: Dict[str, Optional[Callable[[int], str]]] = {}
+    names = [name for name in PDF_EXTRACTORS if name in _extractors] or list(_extractors)
+
+    def count(name: str, key: str, value: float = 1):
+        engine = local.setdefault(name, {})
+        engine[key] = engine.get(key, 0) + value
+
+    with ExitStack() as stack:
+        for i in range(start, end):
+            best_text, best_quality, best_name = None, -1.0, None
+            for name in names:
+                if name not in engines:
+                    try:
+                        engines[name] = stack.enter_context(_extractors[name](pdf_path))
+                    except Exception as e:
+                        print(f"{name} failed to open the PDF: {e}")
+                        engines[name] = None
+                if engines[name] is None:
+                    continue
+                started = time.perf_counter()
+                try:
+                    text = engines[name](i)
+                except Exception as e:
+                    print(f"{name} failed on page {i + 1}: {e}")
+                    count(name, "errors")
+                    continue
+                finally:
+                    count(name, "seconds", time.perf_counter() - started)
+                    count(name, "pages")
+                quality = page_text_quality(text)
+                if quality > best_quality:
+                    best_text, best_quality, best_name = text, quality, name
+                if quality >= PDF_QUALITY_THRESHOLD:
+                    break
+                if name != names[-1]:
+                    count(name, "escalated")
+            if best_name is None:
+                raise Exception(f"No extractor could read page {i + 1}")
+            count(best_name, "accepted")
+            if counters is None:
+                extraction_stats.merge(local)
+                local.clear()
+            yield best_text
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> Tuple[List[str], Dict[str, Dict[str, float]]]:
+    """Text of pages [start, end) and engine counters, for extraction on a worker process"""
+    counters: Dict[str, Dict[str, float]] = {}
+    return list(_iter_page_range(pdf_path, start, end, counters)), counters
+
 class PDFService:
     @staticmethod
-    def extract_text_from_pdf(pdf_path: str) -> str:
+    def iter_pages(pdf_path: str) -> Iterator[str]:
         """
-        Extract text from PDF using pdfplumber (better for text extraction)
-        Falls back to PyPDF2 if pdfplumber fails
+        Yield the text of each page in order, as it is extracted
+        Each page is read by the cheapest engine whose output passes the
+        quality check (see _iter_page_range). Large documents are
+        split into page ranges and extracted on a process pool, with only a
+        few ranges in flight, so memory stays flat whatever the page count.
         """
-        text = ""
-        
         try:
-            # Try pdfplumber first (better text extraction)
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n\n"
+            page_count = _count_pages(pdf_path)
         except Exception as e:
-            print(f"pdfplumber failed: {e}, trying PyPDF2...")
-            # Fallback to PyPDF2
-            try:
-                with open(pdf_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n\n"
-            except Exception as e2:
-                print(f"PyPDF2 also failed: {e2}")
-                raise Exception(f"Failed to extract text from PDF: {str(e2)}")
-        
-        if not text.strip():
-            raise Exception("No text could be extracted from the PDF")
-        
-        return text.strip()
-    
+            raise Exception(f"Failed to extract text from PDF: {str(e)}")
+
+        try:
+            if PDF_EXTRACT_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+                ranges = deque(
+                    (start, min(start + PDF_PAGES_PER_TASK, page_count))
+                    for start in range(0, page_count, PDF_PAGES_PER_TASK)
+                )
+                executor = _get_executor()
+                in_flight = deque()
+                while ranges or in_flight:
+                    while ranges and len(in_flight) < 2 * PDF_EXTRACT_WORKERS:
+                        in_flight.append(executor.submit(_extract_page_range, pdf_path, *ranges.popleft()))
+                    texts, counters = in_flight.popleft().result()
+                    extraction_stats.merge(counters)
+                    yield from texts
+            else:
+                yield from _iter_page_range(pdf_path, 0, page_count)
+        except Exception as e:
+            print(f"PDF extraction failed: {e}")
+            raise Exception(f"Failed to extract text from PDF: {str(e)}")
+
+    @staticmethod
+    def extract_text_from_pdf(pdf_path: str) -> str:
+        """
+        Extract text from PDF, with PyPDF2 first and pdfplumber for pages
+        whose text does not pass the quality check
+        """
+        return join_page_texts(PDFService.iter_pages(pdf_path))
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        """Per-engine extraction counters for this process"""
+        return extraction_stats.stats()
+
     @staticmethod
-    def save_text_to_file(text: str, output_path: str) -> str:
-        """Save extracted text to a file"""
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(text)
-        return output_path
+    def shutdown_executor():
+        """Stop the extraction worker processes"""
+        global _executor
+        with _executor_lock:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+                _executor = None
 
+def join_page_texts(page_texts: Iterable[str]) -> str:
+    """Document text from its page texts; raises when there is none"""
+    text = "\n\n".join(page_text for page_text in page_texts if page_text)
+    if not text.strip():
+        raise Exception("No text could be extracted from the PDF")
+    return text.strip()
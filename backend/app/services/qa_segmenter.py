@@ -0,0 +1,132 @@
+"""
+Local Q&A segmentation of answer-sheet text
+A single pass over the lines of the text (or of a sequence of page texts)
+that emits each Q&A pair as soon as the next question starts, so long
+booklets are segmented in linear time without copying the text.
+"""
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+QUESTION_MAX_CHARS = 500
+ANSWER_MAX_CHARS = 2000
+
+# "Q1." / "Question 2)" / "Q3:"
+_QUESTION = re.compile(r"\s*(?:question|q)\s*\d+\s*[.):]\s*", re.IGNORECASE)
+# "1." / "2)" at the start of a line, but not "3.14"
+_NUMBERED = re.compile(r"\s*\d+[.)](?:\s+|$)")
+# "A:" / "Ans." / "Answer 1:" / "A1)". A bare letter needs a colon or a
+# number, so "a)" / "a." sub-part labels stay part of the answer.
+_ANSWER = re.compile(r"\s*(?:(?:answer|ans)\s*\d*\s*[.):]|a\s*\d+\s*[.):]|a\s*:)\s*", re.IGNORECASE)
+_MARKER_START = frozenset("qQaA0123456789")
+
+class _Text:
+    """Lines of one question or answer, kept up to a character limit"""
+    __slots__ = ("lines", "size", "limit")
+
+    def __init__(self, limit: int, first: str = ""):
+        self.lines: List[str] = []
+        self.size = 0
+        self.limit = limit
+        self.add(first)
+
+    def add(self, line: str):
+        if self.size <= self.limit:
+            self.lines.append(line)
+            self.size += len(line) + 1
+
+    def extend(self, other: "_Text"):
+        for line in other.lines:
+            self.add(line)
+
+    def text(self, separator: str) -> str:
+        return separator.join(self.lines).strip()[:self.limit]
+
+def _pair(question: _Text, body: _Text, answer: Optional[_Text]) -> Optional[Dict[str, str]]:
+    """Q&A pair of a finished question, or None when it has no real answer"""
+    question_text = " ".join(" ".join(question.lines).split())[:QUESTION_MAX_CHARS]
+    answer_text = (answer if answer is not None else body).text("\n")
+    if question_text and len(answer_text) > 10:
+        return {"question": question_text, "answer": answer_text}
+    return None
+
+def _paragraph_pairs(paragraphs: List[str]) -> Iterator[Dict[str, str]]:
+    """Consecutive paragraphs as question and answer, for text without markers"""
+    for i in range(0, len(paragraphs) - 1, 2):
+        yield {
+            "question": paragraphs[i][:QUESTION_MAX_CHARS],
+            "answer": paragraphs[i + 1][:ANSWER_MAX_CHARS]
+        }
+
+def iter_qa_pairs(source: Union[str, Iterable[str]]) -> Iterator[Dict[str, str]]:
+    """
+    Yield Q&A pairs from answer-sheet text or from its page texts in order
+    The first question marker fixes the numbering style: once "Q1." style
+    questions are seen, plain "1." lines are read as part of an answer.
+    Text before the first question is ignored. Without any question markers,
+    blank-line separated paragraphs are paired up instead.
+    """
+    pages = [source] if isinstance(source, str) else source
+    style = None
+    question: Optional[_Text] = None
+    body: Optional[_Text] = None
+    answer: Optional[_Text] = None
+    # Only needed until the first question marker
+    paragraphs: List[str] = []
+    paragraph: List[str] = []
+
+    for page in pages:
+        # A page break separates paragraphs like a blank line
+        for line in page.splitlines() + [""]:
+            stripped = line.lstrip()
+            marker = kind = None
+            if stripped[:1] in _MARKER_START:
+                marker, kind = _QUESTION.match(line), "q"
+                if marker is None and style != "q":
+                    marker, kind = _NUMBERED.match(line), "numbered"
+                if marker is None and question is not None:
+                    marker, kind = _ANSWER.match(line), "answer"
+
+            if marker is None:
+                if question is not None:
+                    (answer if answer is not None else body).add(line)
+                elif stripped:
+                    paragraph.append(stripped)
+                elif paragraph:
+                    paragraphs.append(" ".join(paragraph))
+                    paragraph = []
+                continue
+
+            rest = line[marker.end():]
+            if kind == "answer":
+                if answer is None:
+                    # Lines between the question and "Answer:" belong to the question
+                    question.extend(body)
+                    answer = _Text(ANSWER_MAX_CHARS, rest)
+                else:
+                    answer.add(rest)
+                continue
+
+            if question is not None:
+                pair = _pair(question, body, answer)
+                if pair:
+                    yield pair
+            else:
+                paragraphs, paragraph = [], []
+            style = style or kind
+            question = _Text(QUESTION_MAX_CHARS, rest)
+            body = _Text(ANSWER_MAX_CHARS)
+            answer = None
+
+    if question is not None:
+        pair = _pair(question, body, answer)
+        if pair:
+            yield pair
+        return
+
+    if paragraph:
+        paragraphs.append(" ".join(paragraph))
+    yield from _paragraph_pairs([p for p in paragraphs if len(p) > 20])
+
+def segment_qa(source: Union[str, Iterable[str]]) -> List[Dict[str, str]]:
+    """All Q&A pairs of an answer sheet"""
+    return list(iter_qa_pairs(source))
@@ -0,0 +1,149 @@
+"""
+Incrementally maintained topic-score rollups
+Dashboards read these running totals instead of scanning every analysis.
+They are updated in the same transaction as the Analysis rows they summarize.
+"""
+from typing import Dict, Any, List, Tuple, Iterable
+from sqlalchemy import update, case, func, insert, select, delete, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Analysis, AnswerSheet, TopicRollup, StudentTopicRollup
+
+def _summarize(scores: List[float]) -> Dict[str, Any]:
+    return {
+        "score_sum": sum(scores),
+        "score_count": len(scores),
+        "score_min": min(scores),
+        "score_max": max(scores)
+    }
+
+def _add_to_rollup(db: Session, model, keys: Dict[str, Any], stats: Dict[str, Any]):
+    """Atomically fold stats into the rollup row for keys, creating it if needed"""
+    conditions = [getattr(model, name) == value for name, value in keys.items()]
+    values = {
+        "score_sum": model.score_sum + stats["score_sum"],
+        "score_count": model.score_count + stats["score_count"],
+        "score_min": case(
+            (model.score_min.is_(None), stats["score_min"]),
+            (model.score_min > stats["score_min"], stats["score_min"]),
+            else_=model.score_min
+        ),
+        "score_max": case(
+            (model.score_max.is_(None), stats["score_max"]),
+            (model.score_max < stats["score_max"], stats["score_max"]),
+            else_=model.score_max
+        )
+    }
+    if db.execute(update(model).where(*conditions).values(**values)).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(model).values(**keys, **stats))
+    except IntegrityError:
+        # Created concurrently; fold into that row instead
+        db.execute(update(model).where(*conditions).values(**values))
+
+def apply_analyses(db: Session, student_id: int, scores: List[Tuple[int, float]]):
+    """Add (topic_id, score) results of one answer sheet to the rollups"""
+    apply_scores(db, ((student_id, topic_id, score) for topic_id, score in scores))
+
+def apply_scores(db: Session, scores: Iterable[Tuple[int, int, float]]):
+    """
+    Add (student_id, topic_id, score) results of any number of answer sheets
+    Scores are summed per topic and per (topic, student) first, so each
+    rollup row is updated once per call.
+    """
+    by_topic: Dict[int, List[float]] = {}
+    by_student_topic: Dict[Tuple[int, int], List[float]] = {}
+    for student_id, topic_id, score in scores:
+        if topic_id is not None and score is not None:
+            by_topic.setdefault(topic_id, []).append(float(score))
+            by_student_topic.setdefault((topic_id, student_id), []).append(float(score))
+
+    for topic_id, topic_scores in by_topic.items():
+        _add_to_rollup(db, TopicRollup, {"topic_id": topic_id}, _summarize(topic_scores))
+    for (topic_id, student_id), topic_scores in by_student_topic.items():
+        _add_to_rollup(
+            db, StudentTopicRollup, {"topic_id": topic_id, "student_id": student_id}, _summarize(topic_scores)
+        )
+
+def _remove_from_rollup(db: Session, model, keys: Dict[str, Any], stats: Dict[str, Any]):
+    """
+    Take stats back out of the rollup row for keys; min and max are
+    recomputed from the analyses left, so call this after deleting them
+    """
+    def remaining(aggregate):
+        query = select(aggregate(Analysis.understanding_score)).where(
+            Analysis.topic_id == keys["topic_id"], Analysis.understanding_score.is_not(None)
+        )
+        if "student_id" in keys:
+            query = query.join(AnswerSheet, Analysis.answer_sheet_id == AnswerSheet.id).where(
+                AnswerSheet.student_id == keys["student_id"]
+            )
+        return query.scalar_subquery()
+
+    db.execute(update(model).where(*[getattr(model, name) == value for name, value in keys.items()]).values(
+        score_sum=model.score_sum - stats["score_sum"],
+        score_count=model.score_count - stats["score_count"],
+        score_min=remaining(func.min),
+        score_max=remaining(func.max)
+    ))
+
+def remove_scores(db: Session, scores: Iterable[Tuple[int, int, float]]):
+    """Reverse apply_scores for (student_id, topic_id, score) results whose analyses were deleted"""
+    by_topic: Dict[int, List[float]] = {}
+    by_student_topic: Dict[Tuple[int, int], List[float]] = {}
+    for student_id, topic_id, score in scores:
+        if topic_id is not None and score is not None:
+            by_topic.setdefault(topic_id, []).append(float(score))
+            by_student_topic.setdefault((topic_id, student_id), []).append(float(score))
+
+    for topic_id, topic_scores in by_topic.items():
+        _remove_from_rollup(db, TopicRollup, {"topic_id": topic_id}, _summarize(topic_scores))
+    for (topic_id, student_id), topic_scores in by_student_topic.items():
+        _remove_from_rollup(
+            db, StudentTopicRollup, {"topic_id": topic_id, "student_id": student_id}, _summarize(topic_scores)
+        )
+
+def rebuild_rollups(db: Session) -> Dict[str, int]:
+    """Recompute all rollups from the analyses table (for backfills)"""
+    if db.get_bind().dialect.name == "postgresql":
+        # Sheets analyzed meanwhile wait, then add to the rebuilt totals
+        db.execute(text(f"LOCK TABLE {TopicRollup.__tablename__}, {StudentTopicRollup.__tablename__} IN EXCLUSIVE MODE"))
+    db.execute(delete(StudentTopicRollup))
+    db.execute(delete(TopicRollup))
+
+    aggregates = [
+        func.sum(Analysis.understanding_score),
+        func.count(Analysis.understanding_score),
+        func.min(Analysis.understanding_score),
+        func.max(Analysis.understanding_score)
+    ]
+    db.execute(insert(TopicRollup).from_select(
+        ["topic_id", "score_sum", "score_count", "score_min", "score_max"],
+        select(Analysis.topic_id, *aggregates)
+        .where(Analysis.understanding_score.is_not(None), Analysis.topic_id.is_not(None))
+        .group_by(Analysis.topic_id)
+        .order_by(func.min(Analysis.id))
+    ))
+    db.execute(insert(StudentTopicRollup).from_select(
+        ["topic_id", "student_id", "score_sum", "score_count", "score_min", "score_max"],
+        select(Analysis.topic_id, AnswerSheet.student_id, *aggregates)
+        .join(AnswerSheet, Analysis.answer_sheet_id == AnswerSheet.id)
+        .where(Analysis.understanding_score.is_not(None), Analysis.topic_id.is_not(None))
+        .group_by(Analysis.topic_id, AnswerSheet.student_id)
+        .order_by(func.min(Analysis.id))
+    ))
+    db.commit()
+
+    return {
+        "topic_rollups": db.query(func.count(TopicRollup.id)).scalar(),
+        "student_topic_rollups": db.query(func.count(StudentTopicRollup.id)).scalar()
+    }
+
+def rollups_need_backfill(db: Session) -> bool:
+    """Whether the database has analyses from before rollups existed"""
+    return db.query(TopicRollup.id).first() is None and db.query(Analysis.id).first() is not None
+
+def backfill_rollups_job(payload: Dict[str, Any], db: Session):
+    rebuild_rollups(db)
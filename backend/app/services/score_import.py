@@ -0,0 +1,220 @@
+"""
+Bulk import of historical topic scores
+Streams (student, topic, score, confidence) records from CSV or JSONL into
+answer sheets, analyses and rollups in fixed-size batches, so past terms can
+be loaded without replaying their uploads. Memory is bounded by the batch
+size plus one cache entry per student and per imported sheet.
+"""
+import csv
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Callable, Tuple, Union
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, json_loads
+from app.models import User, AnswerSheet, Analysis
+from app.services.rollups import apply_scores
+from app.services.topics import TopicResolver
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+
+# Errors listed in the summary; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+def iter_records(path: str, format: Optional[str] = None) -> Iterator[Union[Dict[str, Any], ValueError]]:
+    """
+    Records of a CSV (with a header row) or JSONL file, read line by line
+    A line that cannot be read as a record is yielded as a ValueError naming
+    the line, so the import reports it and carries on.
+    """
+    format = format or ("jsonl" if path.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        if format == "jsonl":
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json_loads(line)
+                except ValueError as e:
+                    yield ValueError(f"line {line_number} is not valid JSON ({e})")
+                    continue
+                if not isinstance(record, dict):
+                    yield ValueError(f"line {line_number} is not a JSON object")
+                    continue
+                yield record
+        else:
+            reader = csv.DictReader(file)
+            try:
+                yield from reader
+            except csv.Error as e:
+                # The reader cannot continue past a malformed line; line_num
+                # does not yet count the line that failed
+                yield ValueError(f"line {reader.line_num + 1} could not be read, rest of the file skipped ({e})")
+
+def _parse(record: Union[Dict[str, Any], ValueError]) -> Tuple[str, str, float, float, str, Optional[datetime]]:
+    """(student ID, topic, score, confidence, sheet, date) of a record; raises ValueError"""
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("record is not an object")
+    student = str(record.get("student_id") or "").strip()
+    topic = str(record.get("topic") or "").strip()
+    if not student or not topic:
+        raise ValueError("student_id and topic are required")
+    score = float(record.get("score"))
+    if not 0 <= score <= 100:
+        raise ValueError(f"score {score} is outside 0-100")
+    confidence = record.get("confidence")
+    confidence = 1.0 if confidence in (None, "") else float(confidence)
+    date = record.get("date")
+    date = datetime.fromisoformat(str(date)) if date not in (None, "") else None
+    sheet = str(record.get("sheet") or "").strip()
+    return student, topic, score, confidence, sheet, date
+
+class ScoreImporter:
+    """Writes batches of historical score records against one syllabus"""
+
+    def __init__(self, db: Session, syllabus_id: int, source: str = "import"):
+        self.db = db
+        self.syllabus_id = syllabus_id
+        self.source = source
+        self.resolver = TopicResolver(db, syllabus_id)
+        self._students: Dict[str, Optional[int]] = {}
+        self._sheets: Dict[Tuple[int, str], int] = {}
+
+    def _load_students(self, keys: Iterable[str]):
+        missing = {key for key in keys if key not in self._students}
+        if not missing:
+            return
+        self._students.update(dict.fromkeys(missing))
+        self._students.update({
+            student_id: user_id
+            for user_id, student_id in self.db.query(User.id, User.student_id).filter(
+                User.role == "student", User.student_id.in_(missing)
+            )
+        })
+
+    def _create_sheets(self, keys: List[Tuple[int, str]], dates: Dict[Tuple[int, str], Optional[datetime]]):
+        """One processed AnswerSheet per (student, sheet label) not seen before"""
+        now = datetime.utcnow()
+        rows = [{
+            "student_id": user_id,
+            "file_path": "",
+            "file_name": label or self.source,
+            "status": "processed",
+            "created_at": dates.get((user_id, label)) or now,
+            "processed_at": dates.get((user_id, label)) or now
+        } for user_id, label in keys]
+        ids = self.db.execute(
+            insert(AnswerSheet).returning(AnswerSheet.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        self._sheets.update(zip(keys, ids))
+
+    def import_batch(self, records: List[Dict[str, Any]], errors: List[str], offset: int = 0) -> int:
+        """Insert one batch of records and commit; returns the rows imported"""
+        parsed = []
+        for index, record in enumerate(records):
+            try:
+                parsed.append(_parse(record))
+            except (TypeError, ValueError) as e:
+                errors.append(f"Record {offset + index + 1}: {e}")
+        self._load_students(student for student, *_ in parsed)
+
+        rows, new_sheets, dates = [], [], {}
+        for student, topic_name, score, confidence, label, date in parsed:
+            user_id = self._students.get(student)
+            if user_id is None:
+                errors.append(f"Unknown student ID {student}")
+                continue
+            topic = self.resolver.resolve(topic_name)
+            if topic is None:
+                errors.append(f"Invalid topic name {topic_name!r}")
+                continue
+            key = (user_id, label)
+            if key not in self._sheets and key not in dates:
+                new_sheets.append(key)
+                dates[key] = date
+            rows.append((key, topic.id, score, confidence, date))
+
+        if new_sheets:
+            self._create_sheets(new_sheets, dates)
+        if rows:
+            now = datetime.utcnow()
+            self.db.execute(insert(Analysis), [{
+                "answer_sheet_id": self._sheets[key],
+                "syllabus_id": self.syllabus_id,
+                "topic_id": topic_id,
+                "understanding_score": score,
+                "confidence": confidence,
+                "details": "Imported score",
+                "created_at": date or now
+            } for key, topic_id, score, confidence, date in rows])
+            apply_scores(self.db, ((key[0], topic_id, score) for key, topic_id, score, _, _ in rows))
+        self.db.commit()
+        return len(rows)
+
+def import_scores(
+    db: Session,
+    records: Iterable[Dict[str, Any]],
+    syllabus_id: int,
+    source: str = "import",
+    batch_size: int = IMPORT_BATCH_SIZE,
+    on_batch: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Import score records in batches of batch_size, committing each batch
+    Records need student_id (the student's school ID), topic and score
+    (0-100); confidence (default 1.0), sheet (a label grouping one student's
+    scores into one answer sheet) and date (ISO) are optional. on_batch is
+    called with each batch's counters and throughput.
+    """
+    importer = ScoreImporter(db, syllabus_id, source)
+    errors: List[str] = []
+    summary = {"records": 0, "imported": 0, "skipped": 0, "batches": [], "errors": []}
+    started = time.perf_counter()
+
+    def flush(batch: List[Dict[str, Any]]):
+        batch_started = time.perf_counter()
+        error_count = len(errors)
+        imported = importer.import_batch(batch, errors, summary["records"])
+        seconds = time.perf_counter() - batch_started
+        stats = {
+            "batch": len(summary["batches"]) + 1,
+            "records": len(batch),
+            "imported": imported,
+            "skipped": len(errors) - error_count,
+            "seconds": round(seconds, 3),
+            "records_per_second": round(len(batch) / seconds, 1) if seconds else None
+        }
+        summary["records"] += len(batch)
+        summary["imported"] += imported
+        summary["batches"].append(stats)
+        # Keep memory bounded: only the first errors are kept
+        summary["errors"].extend(errors[:MAX_REPORTED_ERRORS - len(summary["errors"])])
+        summary["skipped"] += stats["skipped"]
+        errors.clear()
+        if on_batch:
+            on_batch(stats)
+
+    batch: List[Dict[str, Any]] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    seconds = time.perf_counter() - started
+    summary["seconds"] = round(seconds, 3)
+    summary["records_per_second"] = round(summary["records"] / seconds, 1) if seconds else None
+    return summary
+
+def import_file(path: str, syllabus_id: int, source: Optional[str] = None, format: Optional[str] = None) -> Dict[str, Any]:
+    """import_scores for a CSV or JSONL file, on its own session (e.g. off the event loop)"""
+    db = SessionLocal()
+    try:
+        return import_scores(db, iter_records(path, format), syllabus_id, source or os.path.basename(path))
+    finally:
+        db.close()
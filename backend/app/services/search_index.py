@@ -0,0 +1,346 @@
+"""
+Full-text search over answer-sheet Q&A pairs and syllabi
+Every Q&A pair, and every passage of a syllabus, is a SearchEntry row written
+when its document is segmented. SQLite indexes the rows in an FTS5 table kept
+in sync by triggers; PostgreSQL in a generated tsvector column with a GIN
+index. Other databases (or SQLite built without FTS5) fall back to LIKE over
+the same rows.
+"""
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, exists, insert, or_, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from app.models import SearchEntry, Blob, AnswerSheet, Syllabus, User
+from app.services.similarity import teacher_answer_sheets
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_MAX_PAGE_SIZE = 100
+# Matches ranked per query: terms found in most pairs are ranked among their
+# most recent matches only, which keeps their latency flat as the index grows.
+# Older matches are left out, and search() reports when that happened.
+SEARCH_RANK_CANDIDATES = int(os.getenv("SEARCH_RANK_CANDIDATES", "5000"))
+
+# Syllabus text is indexed in passages of about this many characters
+PASSAGE_CHARS = 800
+# Matches are wrapped in these markers; long answers are cut to a snippet
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+SNIPPET_WORDS = 32
+
+FTS_TABLE = "search_entries_fts"
+
+_SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "question, answer, content='search_entries', content_rowid='id', tokenize='porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS search_entries_ai AFTER INSERT ON search_entries BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, question, answer) VALUES (new.id, new.question, new.answer); END",
+    f"CREATE TRIGGER IF NOT EXISTS search_entries_ad AFTER DELETE ON search_entries BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer); END",
+    f"CREATE TRIGGER IF NOT EXISTS search_entries_au AFTER UPDATE ON search_entries BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer); "
+    f"INSERT INTO {FTS_TABLE}(rowid, question, answer) VALUES (new.id, new.question, new.answer); END",
+]
+
+_POSTGRES_DDL = [
+    "ALTER TABLE search_entries ADD COLUMN IF NOT EXISTS document tsvector GENERATED ALWAYS AS "
+    "(to_tsvector('english', coalesce(question, '') || ' ' || coalesce(answer, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_search_entries_document ON search_entries USING gin (document)",
+]
+
+def create_search_index(conn: Connection):
+    """Create the dialect's full-text index over search_entries (idempotent)"""
+    if conn.dialect.name == "postgresql":
+        for ddl in _POSTGRES_DDL:
+            conn.execute(text(ddl))
+    elif conn.dialect.name == "sqlite":
+        existed = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": FTS_TABLE}
+        ).first() is not None
+        try:
+            conn.execute(text(_SQLITE_DDL[0]))
+        except OperationalError:
+            # SQLite built without FTS5: searches use LIKE
+            return
+        for ddl in _SQLITE_DDL[1:]:
+            conn.execute(text(ddl))
+        if not existed:
+            # Entries written before the index existed
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+def search_backend(db: Session) -> str:
+    """"fts5", "tsvector" or "like", depending on the database"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return "tsvector"
+    if dialect == "sqlite" and db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": FTS_TABLE}
+    ).first():
+        return "fts5"
+    return "like"
+
+def syllabus_passages(text_content: str) -> List[str]:
+    """Paragraphs of a syllabus, merged or split to about PASSAGE_CHARS"""
+    passages, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text_content or ""):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) > PASSAGE_CHARS:
+            passages.append(current)
+            current = ""
+        current = f"{current} {paragraph}".strip()
+        while len(current) > PASSAGE_CHARS:
+            cut = current.rfind(" ", 0, PASSAGE_CHARS)
+            cut = cut if cut > 0 else PASSAGE_CHARS
+            passages.append(current[:cut])
+            current = current[cut:].strip()
+    if current:
+        passages.append(current)
+    return passages
+
+def _replace_entries(db: Session, blob_id: int, kind: str, rows: List[Tuple[Optional[str], str]]):
+    db.execute(delete(SearchEntry).where(SearchEntry.blob_id == blob_id))
+    if rows:
+        db.execute(insert(SearchEntry), [
+            {"blob_id": blob_id, "kind": kind, "position": position, "question": question, "answer": answer}
+            for position, (question, answer) in enumerate(rows)
+        ])
+
+def index_qa_pairs(db: Session, blob_id: int, qa_pairs: Optional[List[Dict[str, Any]]]):
+    """Index an answer sheet's Q&A pairs, replacing earlier entries; not committed"""
+    rows = []
+    for pair in qa_pairs or []:
+        if not isinstance(pair, dict):
+            continue
+        question = str(pair.get("question") or "").strip()
+        answer = str(pair.get("answer") or "").strip()
+        if question or answer:
+            rows.append((question or None, answer))
+    _replace_entries(db, blob_id, "answer", rows)
+
+def index_syllabus_text(db: Session, blob_id: int, text_content: Optional[str]):
+    """Index a syllabus's text as passages, replacing earlier entries; not committed"""
+    _replace_entries(db, blob_id, "syllabus", [(None, passage) for passage in syllabus_passages(text_content)])
+
+def remove_entries(db: Session, blob_id: int):
+    db.execute(delete(SearchEntry).where(SearchEntry.blob_id == blob_id))
+
+def search_index_needs_backfill(db: Session) -> bool:
+    """Whether the database has documents from before the search index existed"""
+    if db.query(SearchEntry.id).first() is not None:
+        return False
+    return db.query(Blob.id).filter(or_(Blob.questions_answers.isnot(None), Blob.text_content.isnot(None))).first() is not None
+
+def backfill_search_index(db: Session, batch_size: int = 200) -> int:
+    """
+    Index documents that have no search entries yet; returns the blobs indexed
+    Committed per batch, so a retried backfill resumes where it stopped.
+    """
+    count = 0
+    sources = [
+        (Blob.questions_answers, AnswerSheet.content_hash, index_qa_pairs),
+        (Blob.text_content, Syllabus.content_hash, index_syllabus_text),
+    ]
+    for column, referenced_by, index in sources:
+        blob_ids = [blob_id for (blob_id,) in db.query(Blob.id).filter(
+            Blob.sha256.in_(select(referenced_by)),
+            column.isnot(None),
+            ~exists().where(SearchEntry.blob_id == Blob.id)
+        )]
+        for start in range(0, len(blob_ids), batch_size):
+            for blob_id, value in db.query(Blob.id, column).filter(Blob.id.in_(blob_ids[start:start + batch_size])):
+                index(db, blob_id, value)
+                count += 1
+            db.commit()
+    return count
+
+def backfill_search_index_job(payload: Dict[str, Any], db: Session):
+    backfill_search_index(db)
+
+def _fts5_query(query: str) -> str:
+    """FTS5 MATCH expression for free text: quoted phrases, prefix* terms, all required"""
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        words = re.findall(r"\w+", phrase or word)
+        if not words:
+            continue
+        term = '"' + " ".join(words) + '"'
+        if word.endswith("*") and len(words) == 1:
+            term += "*"
+        terms.append(term)
+    return " ".join(terms)
+
+def _highlight(value: Optional[str], words: List[str], snippet: bool) -> Optional[str]:
+    """Highlight for the LIKE fallback: marked words, optionally around the first match"""
+    if not value or not words:
+        return value
+    pattern = re.compile("|".join(re.escape(word) for word in words), re.IGNORECASE)
+    if snippet:
+        tokens = value.split()
+        first = next((i for i, token in enumerate(tokens) if pattern.search(token)), 0)
+        start = max(0, first - SNIPPET_WORDS // 4)
+        value = ("…" if start else "") + " ".join(tokens[start:start + SNIPPET_WORDS]) + (
+            "…" if start + SNIPPET_WORDS < len(tokens) else ""
+        )
+    return pattern.sub(lambda match: f"{HIGHLIGHT_START}{match.group(0)}{HIGHLIGHT_END}", value)
+
+def _scope(kind: Optional[str], teacher_id: Optional[int]) -> Tuple[str, Dict[str, Any]]:
+    """
+    SQL conditions on search_entries e: entry kind, and with teacher_id the
+    teacher's own syllabi and the answers of sheets under their access codes
+    or bulk uploads (the rule of similarity.teacher_answer_sheets)
+    """
+    conditions, params = [], {}
+    if kind:
+        conditions.append("e.kind = :kind")
+        params["kind"] = kind
+    if teacher_id is not None:
+        conditions.append(
+            "(e.kind <> 'syllabus' OR e.blob_id IN (SELECT b.id FROM blobs b "
+            "JOIN syllabus s ON s.content_hash = b.sha256 WHERE s.teacher_id = :teacher_id))"
+        )
+        conditions.append(
+            "(e.kind <> 'answer' OR e.blob_id IN (SELECT b.id FROM blobs b "
+            "JOIN answer_sheets a ON a.content_hash = b.sha256 "
+            "WHERE a.access_code IN (SELECT code FROM access_codes WHERE teacher_id = :teacher_id) "
+            "OR a.batch_id IN (SELECT id FROM upload_batches WHERE teacher_id = :teacher_id)))"
+        )
+        params["teacher_id"] = teacher_id
+    return "".join(f" AND {condition}" for condition in conditions), params
+
+def _hits(
+    db: Session, query: str, kind: Optional[str], teacher_id: Optional[int], limit: int, offset: int
+) -> Tuple[List[Dict[str, Any]], Optional[int], bool]:
+    """
+    Hits of one page, the number of most recent matches ranked (None when
+    results are not ranked) and whether older matches were left out
+    """
+    scope, params = _scope(kind, teacher_id)
+    params.update(limit=limit, offset=offset, start=HIGHLIGHT_START, end=HIGHLIGHT_END, words=SNIPPET_WORDS)
+    params["candidates"] = candidates = max(SEARCH_RANK_CANDIDATES, offset + limit)
+    backend = search_backend(db)
+
+    if backend == "fts5":
+        params["query"] = _fts5_query(query)
+        if not params["query"]:
+            return [], candidates, False
+        # The newest match outside the candidates bounds the ranked range
+        bound = db.execute(text(
+            f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} JOIN search_entries e ON e.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :query{scope} ORDER BY {FTS_TABLE}.rowid DESC LIMIT 1 OFFSET :candidates"
+        ), params).scalar()
+        params["bound"] = bound or 0
+        rows = db.execute(text(
+            f"SELECT e.id, e.blob_id, e.kind, e.position, "
+            f"highlight({FTS_TABLE}, 0, :start, :end) AS question, "
+            f"snippet({FTS_TABLE}, 1, :start, :end, '…', :words) AS answer, "
+            f"-bm25({FTS_TABLE}) AS score "
+            f"FROM {FTS_TABLE} JOIN search_entries e ON e.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :query{scope} AND {FTS_TABLE}.rowid > :bound "
+            f"ORDER BY bm25({FTS_TABLE}) LIMIT :limit OFFSET :offset"
+        ), params).mappings().all()
+    elif backend == "tsvector":
+        params["query"] = query
+        params["options"] = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords={SNIPPET_WORDS}, MinWords=8, MaxFragments=2"
+        bound = db.execute(text(
+            "SELECT e.id FROM search_entries e, websearch_to_tsquery('english', :query) q "
+            f"WHERE e.document @@ q{scope} ORDER BY e.id DESC LIMIT 1 OFFSET :candidates"
+        ), params).scalar()
+        params["bound"] = bound or 0
+        # Headlines are generated for the page only, after ranking
+        rows = db.execute(text(
+            "SELECT e.id, e.blob_id, e.kind, e.position, "
+            "ts_headline('english', coalesce(e.question, ''), q, :options) AS question, "
+            "ts_headline('english', e.answer, q, :options) AS answer, hits.score "
+            "FROM (SELECT e.id, ts_rank_cd(e.document, q) AS score "
+            "FROM search_entries e, websearch_to_tsquery('english', :query) q "
+            f"WHERE e.document @@ q{scope} AND e.id > :bound "
+            "ORDER BY score DESC LIMIT :limit OFFSET :offset) hits "
+            "JOIN search_entries e ON e.id = hits.id, websearch_to_tsquery('english', :query) q "
+            "ORDER BY hits.score DESC"
+        ), params).mappings().all()
+    else:
+        words = re.findall(r"\w+", query)
+        if not words:
+            return [], None, False
+        for i, word in enumerate(words):
+            scope += f" AND (e.question LIKE :w{i} OR e.answer LIKE :w{i})"
+            params[f"w{i}"] = f"%{word}%"
+        candidates, bound = None, None
+        rows = [
+            dict(row, question=_highlight(row["question"], words, False), answer=_highlight(row["answer"], words, True))
+            for row in db.execute(text(
+                "SELECT e.id, e.blob_id, e.kind, e.position, e.question, e.answer, NULL AS score "
+                f"FROM search_entries e WHERE 1 = 1{scope} ORDER BY e.id LIMIT :limit OFFSET :offset"
+            ), params).mappings()
+        ]
+    return [dict(row) for row in rows], candidates, bound is not None
+
+def _documents(db: Session, blob_ids: Iterable[int], teacher_id: Optional[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Answer sheets and syllabi stored as each blob, in one query per kind"""
+    blob_ids = list(blob_ids)
+    documents: Dict[int, List[Dict[str, Any]]] = {blob_id: [] for blob_id in blob_ids}
+    if not blob_ids:
+        return documents
+    answer_sheets = select(
+        Blob.id, AnswerSheet.id, AnswerSheet.file_name, User.id, User.student_id, User.name
+    ).join(AnswerSheet, AnswerSheet.content_hash == Blob.sha256).join(
+        User, AnswerSheet.student_id == User.id
+    ).where(Blob.id.in_(blob_ids))
+    if teacher_id is not None:
+        answer_sheets = answer_sheets.where(AnswerSheet.id.in_(teacher_answer_sheets(teacher_id)))
+    for blob_id, sheet_id, file_name, user_id, student_id, name in db.execute(answer_sheets.order_by(AnswerSheet.id)):
+        documents[blob_id].append({
+            "type": "answer_sheet", "id": sheet_id, "file_name": file_name,
+            "user_id": user_id, "student_id": student_id, "student_name": name
+        })
+    syllabi = select(Blob.id, Syllabus.id, Syllabus.file_name).join(
+        Syllabus, Syllabus.content_hash == Blob.sha256
+    ).where(Blob.id.in_(blob_ids))
+    if teacher_id is not None:
+        syllabi = syllabi.where(Syllabus.teacher_id == teacher_id)
+    for blob_id, syllabus_id, file_name in db.execute(syllabi.order_by(Syllabus.id)):
+        documents[blob_id].append({"type": "syllabus", "id": syllabus_id, "file_name": file_name})
+    return documents
+
+def search(
+    db: Session,
+    query: str,
+    kind: Optional[str] = None,
+    teacher_id: Optional[int] = None,
+    page: int = 1,
+    page_size: int = SEARCH_PAGE_SIZE
+) -> Dict[str, Any]:
+    """
+    Ranked, highlighted Q&A pairs and syllabus passages matching query
+    kind limits results to "answer" or "syllabus" entries; with teacher_id,
+    only that teacher's syllabi and the answer sheets of their classes are
+    searched. Only the ranked_candidates most recent matches are ranked;
+    older_matches_omitted tells when a query had more. Pages are fetched one
+    row ahead to report has_more without counting every match.
+    """
+    page = max(1, page)
+    page_size = max(1, min(page_size, SEARCH_MAX_PAGE_SIZE))
+    hits, ranked_candidates, older_matches_omitted = _hits(db, query, kind, teacher_id, page_size + 1, (page - 1) * page_size)
+    has_more = len(hits) > page_size
+    hits = hits[:page_size]
+    documents = _documents(db, {hit["blob_id"] for hit in hits}, teacher_id)
+    return {
+        "query": query,
+        "page": page,
+        "page_size": page_size,
+        "has_more": has_more,
+        "ranked_candidates": ranked_candidates,
+        "older_matches_omitted": older_matches_omitted,
+        "results": [{
+            "kind": hit["kind"],
+            "position": hit["position"],
+            "question": hit["question"] or None,
+            "answer": hit["answer"],
+            "score": round(hit["score"], 4) if hit["score"] is not None else None,
+            "documents": documents[hit["blob_id"]]
+        } for hit in hits]
+    }
@@ -0,0 +1,318 @@
+"""
+Near-duplicate answer detection with MinHash LSH
+Each Q&A answer gets a MinHash signature of its word 3-grams when its sheet
+is processed. Signatures are cut into bands whose hashes are stored in an
+indexed table, and a new sheet is only compared with answers that share a
+band with one of its own, among the other students of its cohort (the access
+code it was uploaded with, or its bulk upload). The cost of a sheet therefore
+does not grow with the size of the class. Pairs whose estimated Jaccard
+similarity reaches SIMILARITY_THRESHOLD are stored for the teacher dashboard.
+"""
+import hashlib
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy import delete, func, insert, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models import User, AccessCode, AnswerSheet, UploadBatch, Blob, AnswerSignature, AnswerBand, SimilarityFlag
+
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.6"))
+# Shorter answers are not compared: brief correct answers legitimately match
+SIMILARITY_MIN_WORDS = int(os.getenv("SIMILARITY_MIN_WORDS", "12"))
+
+# 128 hash functions in 32 bands of 4: answers 0.6 similar share a band with
+# 99% probability, answers 0.2 similar with 5%
+NUM_PERMUTATIONS = 128
+NUM_BANDS = 32
+SHINGLE_WORDS = 3
+
+_PRIME = (1 << 31) - 1
+# Fixed seed: stored signatures must stay comparable across processes
+_random = np.random.RandomState(20240601)
+_A = _random.randint(1, _PRIME, NUM_PERMUTATIONS).astype(np.uint64)
+_B = _random.randint(0, _PRIME, NUM_PERMUTATIONS).astype(np.uint64)
+_WORD = re.compile(r"\w+")
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """MinHash signature of a text's word 3-grams, or None for short texts"""
+    words = _WORD.findall(text.lower())
+    if len(words) < max(SIMILARITY_MIN_WORDS, SHINGLE_WORDS):
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    values = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) % _PRIME for shingle in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    # (a * x + b) mod p for every hash function and shingle; both factors are
+    # below 2^31, so the products fit in 64 bits
+    return ((np.outer(_A, values) + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+def band_hashes(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit hash per band (band number included)"""
+    rows = NUM_PERMUTATIONS // NUM_BANDS
+    return [
+        int.from_bytes(hashlib.blake2b(
+            bytes([band]) + signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8
+        ).digest(), "big", signed=True)
+        for band in range(NUM_BANDS)
+    ]
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity: the share of equal hash minimums"""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+def load_signatures(db: Session, blob_ids: Iterable[int]) -> Dict[int, Dict[int, np.ndarray]]:
+    """blob id -> answer position -> signature"""
+    signatures: Dict[int, Dict[int, np.ndarray]] = defaultdict(dict)
+    blob_ids = list(blob_ids)
+    if blob_ids:
+        for blob_id, position, signature in db.execute(select(
+            AnswerSignature.blob_id, AnswerSignature.position, AnswerSignature.signature
+        ).where(AnswerSignature.blob_id.in_(blob_ids))):
+            signatures[blob_id][position] = np.frombuffer(signature, dtype=np.uint32)
+    return signatures
+
+def _insert_ignoring_duplicates(db: Session, model):
+    """INSERT that skips rows already stored under a unique constraint, e.g. by a concurrent worker"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing()
+    return insert(model)
+
+def index_signatures(db: Session, blob_id: int, qa_pairs: Optional[List[Dict[str, Any]]]) -> Dict[int, np.ndarray]:
+    """
+    Signatures of a blob's answers, computed and stored with their bands once; not committed
+    Sheets of identical content share the blob, so another worker may store
+    them at the same time: bands are only added for the signatures this
+    call inserted.
+    """
+    stored = load_signatures(db, [blob_id]).get(blob_id)
+    if stored:
+        return stored
+    signatures = {}
+    for position, pair in enumerate(qa_pairs or []):
+        if isinstance(pair, dict):
+            signature = minhash(str(pair.get("answer") or ""))
+            if signature is not None:
+                signatures[position] = signature
+    if signatures:
+        inserted = db.execute(
+            _insert_ignoring_duplicates(db, AnswerSignature).returning(AnswerSignature.position),
+            [
+                {"blob_id": blob_id, "position": position, "signature": signature.tobytes()}
+                for position, signature in signatures.items()
+            ]
+        ).scalars().all()
+        if inserted:
+            db.execute(insert(AnswerBand), [
+                {"band_hash": band_hash, "blob_id": blob_id, "position": position}
+                for position in inserted
+                for band_hash in band_hashes(signatures[position])
+            ])
+    return signatures
+
+def remove_signatures(db: Session, blob_id: int):
+    db.execute(delete(AnswerBand).where(AnswerBand.blob_id == blob_id))
+    db.execute(delete(AnswerSignature).where(AnswerSignature.blob_id == blob_id))
+
+def _cohort(answer_sheet: AnswerSheet):
+    """Condition selecting the sheets an answer sheet is compared with"""
+    if answer_sheet.access_code:
+        return AnswerSheet.access_code == answer_sheet.access_code
+    if answer_sheet.batch_id is not None:
+        return AnswerSheet.batch_id == answer_sheet.batch_id
+    return None
+
+def flag_similar_answers(db: Session, answer_sheet: AnswerSheet, blob: Blob) -> int:
+    """
+    Flag answers of a sheet that nearly match another student's in its cohort
+    Candidates come from the band index only; each is verified against its
+    stored signature. The sheet's signatures are committed first, so of two
+    sheets processed at the same time, at least the later one finds the
+    other. Earlier flags of the sheet are replaced, so processing a sheet
+    again is safe. Returns the flags stored; the flags are not committed.
+    """
+    signatures = index_signatures(db, blob.id, blob.questions_answers)
+    db.commit()
+    db.execute(delete(SimilarityFlag).where(or_(
+        SimilarityFlag.answer_sheet_id == answer_sheet.id,
+        SimilarityFlag.other_answer_sheet_id == answer_sheet.id
+    )))
+    cohort = _cohort(answer_sheet)
+    if cohort is None or not signatures:
+        return 0
+
+    positions_by_band: Dict[int, Set[int]] = defaultdict(set)
+    for position, signature in signatures.items():
+        for band_hash in band_hashes(signature):
+            positions_by_band[band_hash].add(position)
+
+    candidates: Set[Tuple[int, int, int, int]] = set()
+    for other_sheet_id, other_blob_id, other_position, band_hash in db.execute(select(
+        AnswerSheet.id, AnswerBand.blob_id, AnswerBand.position, AnswerBand.band_hash
+    ).join(Blob, Blob.id == AnswerBand.blob_id).join(
+        AnswerSheet, AnswerSheet.content_hash == Blob.sha256
+    ).where(
+        AnswerBand.band_hash.in_(list(positions_by_band)),
+        cohort,
+        AnswerSheet.id != answer_sheet.id,
+        AnswerSheet.student_id != answer_sheet.student_id
+    )):
+        for position in positions_by_band[band_hash]:
+            candidates.add((position, other_sheet_id, other_blob_id, other_position))
+
+    other_signatures = load_signatures(db, {other_blob_id for _, _, other_blob_id, _ in candidates})
+    flags: Dict[Tuple[int, int, int, int], float] = {}
+    for position, other_sheet_id, other_blob_id, other_position in candidates:
+        other = other_signatures.get(other_blob_id, {}).get(other_position)
+        if other is None:
+            continue
+        similarity = estimate_similarity(signatures[position], other)
+        if similarity >= SIMILARITY_THRESHOLD:
+            # Each pair is stored once, from the lower sheet id
+            first, second = sorted([(answer_sheet.id, position), (other_sheet_id, other_position)])
+            flags[first + second] = similarity
+
+    if flags:
+        # The other sheet may be storing the same pair concurrently
+        db.execute(_insert_ignoring_duplicates(db, SimilarityFlag), [{
+            "answer_sheet_id": sheet_id,
+            "position": position,
+            "other_answer_sheet_id": other_sheet_id,
+            "other_position": other_position,
+            "similarity": round(similarity, 4)
+        } for (sheet_id, position, other_sheet_id, other_position), similarity in flags.items()])
+    return len(flags)
+
+def similarity_needs_backfill(db: Session) -> bool:
+    """Whether the database has sheets processed before similarity detection existed"""
+    if db.query(AnswerSignature.id).first() is not None:
+        return False
+    return db.query(AnswerSheet.id).filter(
+        AnswerSheet.status == "processed",
+        or_(AnswerSheet.access_code.isnot(None), AnswerSheet.batch_id.isnot(None))
+    ).first() is not None
+
+def backfill_similarity(db: Session, batch_size: int = 200) -> int:
+    """
+    Compare every processed sheet of a cohort, in upload order; returns the
+    sheets compared. Comparing a sheet again replaces its flags, so a retried
+    backfill is safe.
+    """
+    sheet_ids = [sheet_id for (sheet_id,) in db.query(AnswerSheet.id).filter(
+        AnswerSheet.status == "processed",
+        or_(AnswerSheet.access_code.isnot(None), AnswerSheet.batch_id.isnot(None))
+    ).order_by(AnswerSheet.id)]
+    count = 0
+    for start in range(0, len(sheet_ids), batch_size):
+        for answer_sheet in db.query(AnswerSheet).filter(AnswerSheet.id.in_(sheet_ids[start:start + batch_size])):
+            blob = answer_sheet.blob
+            if blob is not None and blob.questions_answers:
+                flag_similar_answers(db, answer_sheet, blob)
+                count += 1
+        db.commit()
+    return count
+
+def backfill_similarity_job(payload: Dict[str, Any], db: Session):
+    backfill_similarity(db)
+
+def _pair(qa_pairs: Optional[List[Dict[str, Any]]], position: int) -> Dict[str, Any]:
+    pair = qa_pairs[position] if qa_pairs and 0 <= position < len(qa_pairs) else None
+    return pair if isinstance(pair, dict) else {}
+
+def _match(flag: SimilarityFlag, qa_pairs, other_qa_pairs) -> Dict[str, Any]:
+    """A flagged answer pair with both Q&A texts"""
+    pair = _pair(qa_pairs, flag.position)
+    other = _pair(other_qa_pairs, flag.other_position)
+    return {
+        "similarity": flag.similarity,
+        "position": flag.position,
+        "other_position": flag.other_position,
+        "question": pair.get("question"),
+        "answer": pair.get("answer"),
+        "other_question": other.get("question"),
+        "other_answer": other.get("answer")
+    }
+
+def teacher_answer_sheets(teacher_id: int):
+    """Ids of the answer sheets uploaded with a teacher's access codes or in their bulk uploads"""
+    return select(AnswerSheet.id).where(or_(
+        AnswerSheet.access_code.in_(select(AccessCode.code).where(AccessCode.teacher_id == teacher_id)),
+        AnswerSheet.batch_id.in_(select(UploadBatch.id).where(UploadBatch.teacher_id == teacher_id))
+    ))
+
+def similarity_report(
+    db: Session,
+    teacher_id: int,
+    access_code: Optional[str] = None,
+    min_similarity: Optional[float] = None,
+    limit: int = 50
+) -> Dict[str, Any]:
+    """
+    Flagged sheet pairs among a teacher's access codes and bulk uploads
+    Pairs with the most matching answers come first; each lists its
+    students and the matching answers side by side.
+    """
+    min_similarity = SIMILARITY_THRESHOLD if min_similarity is None else min_similarity
+    sheets = teacher_answer_sheets(teacher_id)
+    if access_code:
+        sheets = sheets.where(AnswerSheet.access_code == access_code.upper())
+    pairs = db.execute(select(
+        SimilarityFlag.answer_sheet_id,
+        SimilarityFlag.other_answer_sheet_id,
+        func.count(SimilarityFlag.id),
+        func.max(SimilarityFlag.similarity)
+    ).where(
+        SimilarityFlag.answer_sheet_id.in_(sheets),
+        SimilarityFlag.similarity >= min_similarity
+    ).group_by(
+        SimilarityFlag.answer_sheet_id, SimilarityFlag.other_answer_sheet_id
+    ).order_by(
+        func.count(SimilarityFlag.id).desc(), func.max(SimilarityFlag.similarity).desc()
+    ).limit(limit)).all()
+    if not pairs:
+        return {"threshold": min_similarity, "pairs": []}
+
+    sheet_ids = {sheet_id for pair in pairs for sheet_id in pair[:2]}
+    sheet_info = {
+        row.id: row for row in db.execute(select(
+            AnswerSheet.id, AnswerSheet.file_name, AnswerSheet.access_code, AnswerSheet.batch_id,
+            AnswerSheet.content_hash, User.id.label("user_id"), User.student_id, User.name
+        ).join(User, AnswerSheet.student_id == User.id).where(AnswerSheet.id.in_(sheet_ids)))
+    }
+    qa_by_hash = dict(db.execute(select(Blob.sha256, Blob.questions_answers).where(
+        Blob.sha256.in_({row.content_hash for row in sheet_info.values()})
+    )).all())
+    flags = defaultdict(list)
+    for flag in db.query(SimilarityFlag).filter(
+        tuple_(SimilarityFlag.answer_sheet_id, SimilarityFlag.other_answer_sheet_id).in_([tuple(pair[:2]) for pair in pairs]),
+        SimilarityFlag.similarity >= min_similarity
+    ).order_by(SimilarityFlag.position, SimilarityFlag.other_position):
+        flags[(flag.answer_sheet_id, flag.other_answer_sheet_id)].append(flag)
+
+    def sheet(sheet_id: int) -> Dict[str, Any]:
+        row = sheet_info[sheet_id]
+        return {
+            "id": row.id, "file_name": row.file_name, "access_code": row.access_code, "batch_id": row.batch_id,
+            "user_id": row.user_id, "student_id": row.student_id, "student_name": row.name
+        }
+
+    report = []
+    for sheet_id, other_sheet_id, matches, similarity in pairs:
+        if sheet_id not in sheet_info or other_sheet_id not in sheet_info:
+            continue
+        qa = qa_by_hash.get(sheet_info[sheet_id].content_hash)
+        other_qa = qa_by_hash.get(sheet_info[other_sheet_id].content_hash)
+        report.append({
+            "similarity": similarity,
+            "matching_answers": matches,
+            "answer_sheets": [sheet(sheet_id), sheet(other_sheet_id)],
+            "answers": [_match(flag, qa, other_qa) for flag in flags[(sheet_id, other_sheet_id)]]
+        })
+    return {"threshold": min_similarity, "pairs": report}
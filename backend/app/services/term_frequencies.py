@@ -0,0 +1,63 @@
+"""
+Document frequencies of topic terms per syllabus
+The local scorer weights terms by inverse document frequency. Sheets are
+scored one at a time as they are processed, so the frequencies come from
+every sheet scored against the syllabus so far rather than from the batch.
+They are updated in the same transaction as the sheet's analyses.
+"""
+from typing import Dict, List, Tuple
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Syllabus, TermFrequency
+from app.services.topic_matcher import TopicMatcher
+
+def load_term_frequencies(db: Session, syllabus_id: int) -> Tuple[int, Dict[str, int]]:
+    """Sheets scored against the syllabus, and how many of them used each term"""
+    sheets = db.execute(select(Syllabus.scored_sheets).where(Syllabus.id == syllabus_id)).scalar()
+    counts = dict(db.execute(
+        select(TermFrequency.term, TermFrequency.sheet_count).where(TermFrequency.syllabus_id == syllabus_id)
+    ).all())
+    return sheets or 0, counts
+
+def sheet_terms(matcher: TopicMatcher, qa_pairs: List[Dict[str, str]]) -> List[str]:
+    """Topic terms used anywhere in a sheet"""
+    names = list(matcher.terms)
+    return sorted({names[term] for pair_hits in matcher.match(qa_pairs) for term in pair_hits})
+
+def record_sheet_terms(db: Session, syllabus_id: int, terms: List[str]):
+    """Count one more sheet, using terms, against the syllabus; not committed"""
+    db.execute(update(Syllabus).where(Syllabus.id == syllabus_id).values(
+        scored_sheets=func.coalesce(Syllabus.scored_sheets, 0) + 1
+    ))
+    if not terms:
+        return
+    increment = {"sheet_count": TermFrequency.sheet_count + 1}
+    existing = set(db.scalars(select(TermFrequency.term).where(
+        TermFrequency.syllabus_id == syllabus_id, TermFrequency.term.in_(terms)
+    )))
+    if existing:
+        db.execute(update(TermFrequency).where(
+            TermFrequency.syllabus_id == syllabus_id, TermFrequency.term.in_(existing)
+        ).values(**increment))
+    for term in terms:
+        if term in existing:
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(TermFrequency).values(syllabus_id=syllabus_id, term=term, sheet_count=1))
+        except IntegrityError:
+            # Created concurrently; count this sheet in that row instead
+            db.execute(update(TermFrequency).where(
+                TermFrequency.syllabus_id == syllabus_id, TermFrequency.term == term
+            ).values(**increment))
+
+def forget_sheet_terms(db: Session, syllabus_id: int, terms: List[str]):
+    """Take back a sheet counted by record_sheet_terms; not committed"""
+    db.execute(update(Syllabus).where(Syllabus.id == syllabus_id, Syllabus.scored_sheets > 0).values(
+        scored_sheets=Syllabus.scored_sheets - 1
+    ))
+    if terms:
+        db.execute(update(TermFrequency).where(
+            TermFrequency.syllabus_id == syllabus_id, TermFrequency.term.in_(terms), TermFrequency.sheet_count > 0
+        ).values(sheet_count=TermFrequency.sheet_count - 1))
@@ -0,0 +1,193 @@
+"""
+Multi-pattern topic matcher
+A syllabus's topic keywords, alternative names and plural variants are
+compiled once into an Aho-Corasick automaton over word tokens. Matching an
+answer sheet is then a single pass over its words, whatever the number of
+topics, and yields per-term hits with their positions.
+"""
+import os
+import re
+import string
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Tuple, Optional, Iterable
+import numpy as np
+from scipy import sparse
+from app.services.topics import normalize_topic_key
+
+# Compiled syllabi kept in memory per process
+TOPIC_MATCHER_CACHE_SIZE = int(os.getenv("TOPIC_MATCHER_CACHE_SIZE", "256"))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# ASCII punctuation to spaces, so str.split() tokenizes like _TOKEN
+_SEPARATORS = str.maketrans({chr(i): " " for i in range(128) if chr(i) not in string.ascii_lowercase + string.digits})
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or the to with vs "
+    "introduction intro basic basics advanced overview unit chapter part".split()
+)
+# "Name (Alternative)" and "Name / Alternative" spell out other names for a topic
+_PARENTHETICAL = re.compile(r"\(([^)]*)\)")
+_ALTERNATIVES = re.compile(r"\s*/\s*|\s+or\s+", re.IGNORECASE)
+
+def _stem(word: str) -> str:
+    """Fold plurals so "cells" matches "cell" """
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(word) for word in _TOKEN.findall(text.lower())]
+
+def _words(text: str) -> List[str]:
+    """Unstemmed tokens of text"""
+    text = text.lower()
+    if text.isascii():
+        # Several times faster than the regex for the common case
+        return text.translate(_SEPARATORS).split()
+    return _TOKEN.findall(text)
+
+def _surface_forms(term: str) -> List[str]:
+    """Words that tokenize() folds onto term"""
+    forms = [term, term + "s"]
+    if term.endswith("y"):
+        forms.append(term[:-1] + "ies")
+    return [form for form in forms if _stem(form) == term]
+
+def topic_names(topic: str) -> Tuple[str, List[str]]:
+    """Main name of a topic and its alternative names"""
+    alternatives = [alt for inner in _PARENTHETICAL.findall(topic) for alt in _ALTERNATIVES.split(inner)]
+    names = _ALTERNATIVES.split(_PARENTHETICAL.sub(" ", topic))
+    names = [name for name in names if normalize_topic_key(name)]
+    if not names:
+        return topic, []
+    return names[0], [name for name in names[1:] + alternatives if normalize_topic_key(name)]
+
+class TopicMatcher:
+    """
+    Aho-Corasick automaton over stemmed word tokens for a list of topics
+    Each topic is scored on its content words ("terms"). A term matches on
+    its own; an alternative name or synonym phrase matches all of its
+    topic's terms at once.
+    """
+
+    def __init__(self, topics: Iterable[str], synonyms: Optional[Dict[str, List[str]]] = None):
+        self.topics = list(topics)
+        self.terms: Dict[str, int] = {}
+        rows, cols = [], []
+        self.term_counts = np.zeros(len(self.topics))
+        patterns: List[Tuple[Tuple[str, ...], Tuple[int, ...]]] = []
+
+        for j, topic in enumerate(self.topics):
+            name, alternatives = topic_names(topic)
+            words = tokenize(normalize_topic_key(name))
+            topic_terms = sorted({term for term in words if term not in _STOPWORDS} or set(words))
+            self.term_counts[j] = len(topic_terms)
+            term_ids = []
+            for term in topic_terms:
+                if term not in self.terms:
+                    self.terms[term] = len(self.terms)
+                    patterns.append(((term,), (self.terms[term],)))
+                term_ids.append(self.terms[term])
+                rows.append(self.terms[term])
+                cols.append(j)
+            for phrase in alternatives + list((synonyms or {}).get(topic, [])):
+                tokens = tuple(tokenize(normalize_topic_key(phrase)))
+                if tokens and term_ids:
+                    patterns.append((tokens, tuple(term_ids)))
+
+        # (terms x topics) membership, for scoring
+        self.membership = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(self.terms), len(self.topics))
+        )
+        # Topic indices per term, for reporting where topics were found
+        self.term_topics = [
+            self.membership.indices[start:end].tolist()
+            for start, end in zip(self.membership.indptr[:-1], self.membership.indptr[1:])
+        ]
+        self._build(patterns)
+
+    def _build(self, patterns: List[Tuple[Tuple[str, ...], Tuple[int, ...]]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._output: List[Tuple[int, ...]] = [()]
+        for tokens, term_ids in patterns:
+            state = 0
+            for token in tokens:
+                if token not in self._goto[state]:
+                    self._goto.append({})
+                    self._output.append(())
+                    self._goto[state][token] = len(self._goto) - 1
+                state = self._goto[state][token]
+            self._output[state] += term_ids
+
+        # Failure links by breadth-first search; outputs of the fallback
+        # state are merged so matching never follows the failure chain for output
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for token, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+        # Sheet words are resolved to pattern tokens by one lookup, without
+        # stemming every word
+        alphabet = {token for state in self._goto for token in state}
+        self._surface = {form: token for token in alphabet for form in _surface_forms(token)}
+
+    def match(self, qa_pairs: List[Dict[str, str]]) -> List[List[int]]:
+        """
+        One pass over the sheet
+        Returns the term indices hit in each Q&A pair, in pair order. Patterns
+        do not span Q&A pairs.
+        """
+        goto, fail, output, surface = self._goto, self._fail, self._output, self._surface
+        hits = []
+        for qa in qa_pairs:
+            pair_hits = []
+            state = 0
+            for word in _words(f"{qa.get('question', '')} {qa.get('answer', '')}"):
+                token = surface.get(word)
+                if token is None:
+                    state = 0
+                    continue
+                while state and token not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(token, 0)
+                if output[state]:
+                    pair_hits.extend(output[state])
+            hits.append(pair_hits)
+        return hits
+
+_matchers: "OrderedDict[int, TopicMatcher]" = OrderedDict()
+_matchers_lock = threading.Lock()
+
+def compile_syllabus_matcher(syllabus_id: int, topics: List[str]) -> TopicMatcher:
+    """Compile and cache the matcher for a syllabus (e.g. when it is uploaded)"""
+    matcher = TopicMatcher(topics or [])
+    with _matchers_lock:
+        _matchers[syllabus_id] = matcher
+        _matchers.move_to_end(syllabus_id)
+        while len(_matchers) > TOPIC_MATCHER_CACHE_SIZE:
+            _matchers.popitem(last=False)
+    return matcher
+
+def get_syllabus_matcher(syllabus_id: int, topics: List[str]) -> TopicMatcher:
+    """Cached matcher for a syllabus, compiled on first use in this process"""
+    with _matchers_lock:
+        matcher = _matchers.get(syllabus_id)
+        if matcher is not None and matcher.topics == list(topics or []):
+            _matchers.move_to_end(syllabus_id)
+            return matcher
+    return compile_syllabus_matcher(syllabus_id, topics)
+
+@lru_cache(maxsize=64)
+def matcher_for_topics(topics: Tuple[str, ...]) -> TopicMatcher:
+    """Matcher for a topic list that is not tied to a stored syllabus"""
+    return TopicMatcher(topics)
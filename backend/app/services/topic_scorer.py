@@ -0,0 +1,114 @@
+"""
+Local topic-understanding scorer used when no LLM is available
+Answer sheets are tokenized once into sparse term-count vectors over the
+syllabus topic vocabulary. A whole batch (e.g. a class) is then scored
+against every topic with a few sparse matrix products. Terms are weighted
+by TF-IDF over the batch and any earlier sheets of the syllabus, so words
+every sheet uses count for less than distinctive ones. Scores are
+deterministic.
+"""
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from scipy import sparse
+from app.services.topic_matcher import TopicMatcher, matcher_for_topics
+
+# Term frequency saturation: one mention gives 1 / (1 + k) of a term's weight
+TF_SATURATION = 0.5
+
+def score_sheets(
+    topics: List[str],
+    sheets: List[List[Dict[str, str]]],
+    matcher: Optional[TopicMatcher] = None,
+    corpus: Optional[Tuple[int, Dict[str, int]]] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Score every sheet (a list of Q&A pairs) against every topic
+    Returns one analyses list per sheet, in the format of
+    AIService.analyze_topic_understanding. Pass the syllabus's cached
+    matcher to skip compiling the topics, and corpus (the number of earlier
+    sheets and how many used each term, see term_frequencies) to weight
+    terms by those sheets too.
+    """
+    if not topics:
+        return [[] for _ in sheets]
+    matcher = matcher or matcher_for_topics(tuple(topics))
+    membership, term_counts = matcher.membership, matcher.term_counts
+    terms = membership.shape[0]
+    if not sheets or not terms:
+        return [[_analysis(topic, 0.0, 0, int(n)) for topic, n in zip(topics, term_counts)] for _ in sheets]
+
+    # (sheets x terms) hit counts, and the Q&A pairs each topic was found in
+    indptr = [0]
+    indices: List[int] = []
+    pairs_by_sheet = []
+    for qa_pairs in sheets:
+        hits = matcher.match(qa_pairs)
+        for pair_hits in hits:
+            indices.extend(pair_hits)
+        indptr.append(len(indices))
+        pairs_by_sheet.append(hits)
+    counts = sparse.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(len(sheets), terms))
+    counts.sum_duplicates()
+
+    # Smoothed inverse document frequency over the batch and the corpus.
+    # Terms no sheet uses are weighted like the rarest used ones, so a single
+    # sheet without a corpus is scored by plain (saturated) keyword coverage.
+    documents = len(sheets)
+    document_frequency = np.bincount(counts.indices, minlength=terms)
+    if corpus is not None:
+        documents += corpus[0]
+        document_frequency = document_frequency + np.array([corpus[1].get(term, 0) for term in matcher.terms])
+    document_frequency = np.maximum(document_frequency, 1)
+    idf = np.log((1 + documents) / (1 + document_frequency)) + 1
+
+    # Saturating term frequency, weighted by idf, summed per topic
+    weighted = counts.copy()
+    weighted.data = weighted.data / (weighted.data + TF_SATURATION)
+    weighted = weighted.multiply(idf).tocsr()
+    topic_weight = membership.T @ idf
+    scores = 100 * (weighted @ membership).toarray() / np.maximum(topic_weight, 1e-12)
+
+    present = counts.copy()
+    present.data = np.ones_like(present.data)
+    matches = (present @ membership).toarray()
+
+    coverage = matches / np.maximum(term_counts, 1)
+    confidence = np.minimum(1.0, coverage + 0.3)
+    scores = np.clip(np.round(scores, 1), 0, 100)
+
+    results = []
+    for i, hits in enumerate(pairs_by_sheet):
+        found_in = _pairs_by_topic(hits, matcher.term_topics)
+        results.append([
+            _analysis(
+                topic, scores[i, j], int(matches[i, j]), int(term_counts[j]),
+                confidence[i, j], found_in.get(j)
+            )
+            for j, topic in enumerate(topics)
+        ])
+    return results
+
+def _pairs_by_topic(hits: List[List[int]], term_topics: List[List[int]]) -> Dict[int, List[int]]:
+    """Q&A pair indices each topic was matched in"""
+    found_in: Dict[int, List[int]] = {}
+    for pair_index, pair_hits in enumerate(hits):
+        for term in set(pair_hits):
+            for j in term_topics[term]:
+                pairs = found_in.setdefault(j, [])
+                if not pairs or pairs[-1] != pair_index:
+                    pairs.append(pair_index)
+    return found_in
+
+def _analysis(
+    topic: str, score: float, matches: int, terms: int,
+    confidence: float = 0.3, pairs: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    details = f"Found {matches}/{terms} topic keywords in answers"
+    if pairs:
+        details += " (" + ", ".join(f"Q{index + 1}" for index in pairs) + ")"
+    return {
+        "topic": topic,
+        "understanding_score": float(score),
+        "confidence": round(float(confidence), 2),
+        "details": details
+    }
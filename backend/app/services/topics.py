@@ -0,0 +1,91 @@
+"""
+Topic dimension: canonical topics per syllabus
+Analyzer output rarely spells a topic exactly as the syllabus does, so names
+are matched to the syllabus topics by normalized key, then fuzzily, before
+an Analysis row is written.
+"""
+import os
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Topic
+
+# Minimum similarity (0-1) for an analyzer topic to map onto a syllabus topic
+TOPIC_MATCH_THRESHOLD = float(os.getenv("TOPIC_MATCH_THRESHOLD", "0.85"))
+
+_NUMBERING = re.compile(r'^\s*(?:\d+|[ivxlc]+|[a-z])[\.\):]\s+', re.IGNORECASE)
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+def normalize_topic_key(name: str) -> str:
+    """Lowercase, numbering and punctuation stripped, single-spaced"""
+    name = _NUMBERING.sub("", str(name).strip().lower())
+    return " ".join(_NON_WORD.sub(" ", name.replace("&", " and ")).split())
+
+def _similarity(a: str, b: str) -> float:
+    ratio = SequenceMatcher(None, a, b).ratio()
+    words_a, words_b = set(a.split()), set(b.split())
+    if words_a and words_b:
+        jaccard = len(words_a & words_b) / len(words_a | words_b)
+        ratio = max(ratio, jaccard)
+    return ratio
+
+class TopicResolver:
+    """Maps topic names onto Topic rows of one syllabus, creating rows as needed"""
+
+    def __init__(self, db: Session, syllabus_id: int):
+        self.db = db
+        self.syllabus_id = syllabus_id
+        self._by_key: Dict[str, Topic] = {
+            topic.key: topic
+            for topic in db.query(Topic).filter(Topic.syllabus_id == syllabus_id).all()
+        }
+
+    def _create(self, name: str, key: str) -> Topic:
+        try:
+            with self.db.begin_nested():
+                topic = Topic(syllabus_id=self.syllabus_id, name=name.strip(), key=key)
+                self.db.add(topic)
+        except IntegrityError:
+            # Created concurrently by another worker
+            topic = self.db.query(Topic).filter(Topic.syllabus_id == self.syllabus_id, Topic.key == key).one()
+        self._by_key[key] = topic
+        return topic
+
+    def canonical(self, name: str) -> Optional[Topic]:
+        """Topic with exactly this normalized name, created if missing"""
+        key = normalize_topic_key(name)
+        if not key:
+            return None
+        return self._by_key.get(key) or self._create(name, key)
+
+    def match(self, name: str) -> Optional[Topic]:
+        """Existing topic for name, by exact key or the closest fuzzy match"""
+        key = normalize_topic_key(name)
+        if not key:
+            return None
+        if key in self._by_key:
+            return self._by_key[key]
+        best, best_score = None, 0.0
+        for candidate_key, topic in self._by_key.items():
+            score = _similarity(key, candidate_key)
+            if score > best_score:
+                best, best_score = topic, score
+        return best if best_score >= TOPIC_MATCH_THRESHOLD else None
+
+    def resolve(self, name: str) -> Optional[Topic]:
+        """Canonical topic for name; unknown topics get their own row"""
+        topic = self.match(name)
+        if topic is None:
+            key = normalize_topic_key(name)
+            if not key:
+                return None
+            topic = self._create(name, key)
+        return topic
+
+def ensure_syllabus_topics(db: Session, syllabus_id: int, names: List[str]) -> List[Topic]:
+    """Create Topic rows for a syllabus' topic list"""
+    resolver = TopicResolver(db, syllabus_id)
+    topics = [resolver.canonical(name) for name in names or []]
+    return [topic for topic in topics if topic is not None]
@@ -0,0 +1,99 @@
+import aiofiles
+import hashlib
+import os
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from typing import Dict, Any, Optional
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1 MB
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(64 * 1024 * 1024)))  # 64 MB
+# Allowance for multipart boundaries, part headers and small form fields
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File exceeds maximum size of {max_bytes} bytes")
+
+class UploadSizeLimitMiddleware:
+    """
+    Refuse multipart bodies over the upload limit before they are parsed
+    Starlette spools every file of a form before the route runs, so the
+    limit in save_upload_file alone only applies once the whole body has
+    been received. Requests are refused on their Content-Length, and
+    chunked bodies as soon as they grow past the limit.
+    """
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_BYTES, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        max_bytes = self.path_limits.get(scope["path"], self.max_bytes)
+        limit = max_bytes + UPLOAD_FORM_OVERHEAD
+        length = headers.get("content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            error = _too_large(max_bytes)
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _too_large(max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+class UploadService:
+    @staticmethod
+    async def save_upload_file(file: UploadFile, file_path: str, max_bytes: int = UPLOAD_MAX_BYTES) -> Dict[str, Any]:
+        """
+        Copy an uploaded file to disk in fixed-size chunks
+        Hashes the content on the way and rejects it as soon as it exceeds
+        max_bytes. The request body itself is capped earlier by
+        UploadSizeLimitMiddleware.
+        """
+        if file.size is not None and file.size > max_bytes:
+            raise _too_large(max_bytes)
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+
+        try:
+            async with aiofiles.open(file_path, "wb") as buffer:
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise _too_large(max_bytes)
+                    digest.update(chunk)
+                    await buffer.write(chunk)
+        except BaseException:
+            # Never leave a partial file behind
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+
+        if size == 0:
+            os.remove(file_path)
+            raise HTTPException(status_code=400, detail="Uploaded file is empty")
+
+        return {
+            "path": file_path,
+            "size": size,
+            "sha256": digest.hexdigest()
+        }
@@ -0,0 +1,117 @@
+"""
+Analytics endpoint benchmark
+Seeds a throwaway SQLite database with a large class, builds the topic
+rollups and times the dashboard endpoints. Also counts SQL statements per request, so a
+reintroduced N+1 query pattern shows up as a failure.
+
+Usage: python benchmarks/bench_analytics.py [students] [sheets_per_student] [concurrency]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import event, insert
+from app.database import engine, async_engine, Base, SessionLocal, AsyncSessionLocal
+from app.models import User, Syllabus, AnswerSheet, Analysis, Topic
+from app.services.topics import normalize_topic_key
+from app.routers import analytics
+from app.services.rollups import rebuild_rollups
+
+TOPICS = [f"Topic {i}" for i in range(12)]
+# Statements per request must not grow with the number of students
+MAX_STATEMENTS = 12
+
+def seed(students: int, sheets_per_student: int):
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "email": "teacher@bench", "name": "Bench Teacher", "role": "teacher"}])
+        conn.execute(insert(User), [
+            {"id": i + 2, "email": f"s{i}@bench", "name": f"Student{i} Bench", "role": "student", "student_id": f"B{i:06d}"}
+            for i in range(students)
+        ])
+        conn.execute(insert(Syllabus), [{"id": 1, "teacher_id": 1, "file_path": "bench.pdf", "topics": TOPICS}])
+        conn.execute(insert(Topic), [
+            {"id": i + 1, "syllabus_id": 1, "name": topic, "key": normalize_topic_key(topic)}
+            for i, topic in enumerate(TOPICS)
+        ])
+        sheets = []
+        analyses = []
+        sheet_id = 0
+        for i in range(students):
+            for _ in range(sheets_per_student):
+                sheet_id += 1
+                sheets.append({"id": sheet_id, "student_id": i + 2, "file_path": "bench.pdf", "status": "processed"})
+                for topic_id in range(1, len(TOPICS) + 1):
+                    analyses.append({
+                        "answer_sheet_id": sheet_id, "syllabus_id": 1, "topic_id": topic_id,
+                        "understanding_score": round(rng.uniform(0, 100), 1), "confidence": 0.8
+                    })
+        conn.execute(insert(AnswerSheet), sheets)
+        conn.execute(insert(Analysis), analyses)
+    db = SessionLocal()
+    try:
+        rebuild_rollups(db)
+    finally:
+        db.close()
+    return sheet_id, len(analyses)
+
+async def measure(name: str, coro_factory, repeat: int = 3):
+    statements = []
+    listener = lambda *args: statements.append(1)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+    timings = []
+    try:
+        for _ in range(repeat):
+            statements.clear()
+            async with AsyncSessionLocal() as db:
+                started = time.perf_counter()
+                await coro_factory(db)
+                timings.append(time.perf_counter() - started)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+    print(f"{name:<22} best {min(timings) * 1000:8.1f} ms   {len(statements):3d} statements")
+    return len(statements)
+
+async def measure_concurrent(name: str, coro_factory, concurrency: int):
+    """Throughput of many simultaneous requests on one event loop"""
+    async def one():
+        async with AsyncSessionLocal() as db:
+            await coro_factory(db)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<22} {concurrency} concurrent in {elapsed * 1000:8.1f} ms   {concurrency / elapsed:6.1f} req/s")
+
+async def run(concurrency: int):
+    counts = [
+        await measure("teacher overview", lambda db: analytics.get_teacher_overview(1, db)),
+        await measure("student performance", lambda db: analytics.get_student_performance(2, db)),
+        await measure("topic comparison", lambda db: analytics.get_topic_comparison(1, db)),
+    ]
+    await measure_concurrent("student performance", lambda db: analytics.get_student_performance(2, db), concurrency)
+    await async_engine.dispose()
+    return counts
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    sheets_per_student = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    sheets, analyses = seed(students, sheets_per_student)
+    print(f"{students} students, {sheets} answer sheets, {analyses} analyses")
+
+    counts = asyncio.run(run(concurrency))
+    if max(counts) > MAX_STATEMENTS:
+        print(f"FAIL: more than {MAX_STATEMENTS} statements in one request")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
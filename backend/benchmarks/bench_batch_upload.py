@@ -0,0 +1,88 @@
+"""
+Bulk class upload benchmark
+Seeds a throwaway database with a class and a syllabus, posts one ZIP of
+synthetic answer sheets (named by student ID) to the batch endpoint, and
+polls the batch until every sheet is processed by the background workers.
+Runs without an OpenAI key, so segmentation and scoring are local.
+
+Usage: python benchmarks/bench_batch_upload.py [students] [pages per sheet]
+"""
+import os
+import sys
+import io
+import time
+import random
+import zipfile
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp()
+os.chdir(WORK_DIR)  # uploads/ and data/ are relative to the working directory
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}"
+os.environ["OPENAI_API_KEY"] = ""
+os.environ.setdefault("JOB_POLL_INTERVAL", "0.2")
+
+from sqlalchemy import insert
+from fastapi.testclient import TestClient
+from bench_pdf import make_sheet
+from app.main import app
+from app.database import engine, SessionLocal
+from app.models import User, Syllabus
+from app.services.topics import ensure_syllabus_topics
+from app.services.job_queue import JOB_WORKERS
+
+TOPICS = ["Photosynthesis", "Cell Membrane", "Enzymes and Proteins", "Osmosis and Diffusion", "Genetics"]
+
+def seed(students: int):
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "email": "teacher@bench", "name": "Bench Teacher", "role": "teacher"}])
+        conn.execute(insert(User), [
+            {"id": i + 2, "email": f"s{i}@bench", "name": f"Student{i} Bench", "role": "student", "student_id": f"B{i:06d}"}
+            for i in range(students)
+        ])
+        conn.execute(insert(Syllabus), [{"id": 1, "teacher_id": 1, "file_path": "bench.pdf", "topics": TOPICS}])
+    db = SessionLocal()
+    try:
+        ensure_syllabus_topics(db, 1, TOPICS)
+        db.commit()
+    finally:
+        db.close()
+
+def make_zip(students: int, pages: int) -> bytes:
+    rng = random.Random(3)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for i in range(students):
+            archive.writestr(f"B{i:06d}_scan.pdf", make_sheet(rng, pages))
+    return buffer.getvalue()
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    seed(students)
+    archive = make_zip(students, pages)
+    print(f"{students} sheets x {pages} pages, {len(archive) / 1e6:.1f} MB ZIP, {JOB_WORKERS} job workers")
+
+    with TestClient(app) as client:
+        started = time.perf_counter()
+        response = client.post(
+            "/api/teachers/answer-sheets/batch?teacher_id=1",
+            files=[("files", ("class.zip", archive, "application/zip"))]
+        )
+        response.raise_for_status()
+        batch = response.json()
+        uploaded = time.perf_counter() - started
+        print(f"upload + unpack          {uploaded:8.2f} s   {batch['accepted']} accepted, {len(batch['rejected'])} rejected")
+
+        while True:
+            status = client.get(f"/api/teachers/answer-sheets/batch/{batch['id']}?teacher_id=1").json()
+            if status["status"] == "done":
+                break
+            time.sleep(0.5)
+        elapsed = time.perf_counter() - started
+        print(f"all sheets processed     {elapsed:8.2f} s   {students / elapsed:.1f} sheets/s   {status['counts']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Class analytics export benchmark
+Seeds the same class as bench_analytics.py and streams the export endpoint in
+each format, reporting time to first byte, total time, size and peak traced
+memory. The last line loads the same rows into one list, for comparison.
+
+Usage: python benchmarks/bench_export.py [students] [sheets_per_student]
+"""
+import os
+import sys
+import time
+import asyncio
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_analytics import seed  # sets DATABASE_URL to a throwaway database
+from app.database import async_engine, AsyncSessionLocal
+from app.routers import analytics
+from app.services.export_service import analyses_query
+
+async def measure(format: str, detail: str):
+    tracemalloc.start()
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        response = await analytics.export_class_analytics(1, format, detail, db)
+        first_byte = None
+        size = 0
+        async for chunk in response.body_iterator:
+            if first_byte is None and chunk:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+        elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{format:<8} {detail:<9} first byte {first_byte * 1000:7.1f} ms   total {elapsed:6.2f} s   "
+          f"{size / 1e6:7.1f} MB   peak {peak / 1e6:6.1f} MB")
+
+async def measure_buffered():
+    tracemalloc.start()
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        rows = (await db.execute(analyses_query(1))).all()
+        elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{'buffered':<8} {'analyses':<9} {len(rows)} rows in one list   total {elapsed:6.2f} s   peak {peak / 1e6:6.1f} MB")
+
+async def run():
+    for format in ("csv", "jsonl", "parquet"):
+        await measure(format, "analyses")
+    await measure("csv", "summary")
+    await measure_buffered()
+    await async_engine.dispose()
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    sheets_per_student = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    sheets, analyses = seed(students, sheets_per_student)
+    print(f"{students} students, {sheets} answer sheets, {analyses} analyses")
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+JSON column serialization benchmark
+Times encoding and decoding of a typical questions_answers payload with the
+stdlib json module (the previous JSONType) and with the orjson codec used by
+the engine, plus the compressed round trip used for blob Q&A.
+
+Usage: python benchmarks/bench_json.py [pairs] [iterations]
+"""
+import os
+import sys
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy.dialects import sqlite
+from app.database import json_dumps, json_loads
+from app.models import CompressedJSON
+
+WORDS = "cell membrane energy photosynthesis gene protein enzyme osmosis diffusion chlorophyll".split()
+
+def make_payload(pairs: int):
+    rng = random.Random(7)
+    sentence = lambda n: " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+    return [
+        {"question": f"Q{i + 1}. {sentence(12)}", "answer": " ".join(sentence(15) for _ in range(4))}
+        for i in range(pairs)
+    ]
+
+def measure(name: str, func, iterations: int):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    per_call = (time.perf_counter() - started) / iterations
+    print(f"{name:<28} {per_call * 1e6:9.1f} us")
+    return per_call
+
+def main():
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    payload = make_payload(pairs)
+    encoded = json.dumps(payload)
+
+    column = CompressedJSON()
+    dialect = sqlite.dialect()
+    stored = column.process_bind_param(payload, dialect)
+    print(f"{pairs} Q&A pairs, {len(encoded)} bytes as JSON, {len(stored)} bytes compressed")
+
+    stdlib = measure("json.dumps", lambda: json.dumps(payload), iterations)
+    fast = measure("orjson dumps", lambda: json_dumps(payload), iterations)
+    print(f"{'':<28} {stdlib / fast:9.1f}x")
+    stdlib = measure("json.loads", lambda: json.loads(encoded), iterations)
+    fast = measure("orjson loads", lambda: json_loads(encoded), iterations)
+    print(f"{'':<28} {stdlib / fast:9.1f}x")
+    measure("compressed bind", lambda: column.process_bind_param(payload, dialect), iterations)
+    measure("compressed result", lambda: column.process_result_value(stored, dialect), iterations)
+
+if __name__ == "__main__":
+    main()
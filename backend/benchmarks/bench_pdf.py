@@ -0,0 +1,89 @@
+"""
+PDF extraction benchmark
+Extracts a corpus of typed answer sheets with pdfplumber only (the previous
+behaviour) and with the adaptive engine order (PyPDF2 first, pdfplumber for
+pages that fail the quality check), inline on one process, and prints pages
+per second and the per-engine counters. Synthetic sheets are generated
+unless PDF paths are given.
+
+Usage: python benchmarks/bench_pdf.py [sheets] [pages per sheet] [file.pdf ...]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["PDF_EXTRACT_WORKERS"] = "1"
+
+from app.services import pdf_service
+from app.services.pdf_service import PDFService, ExtractionStats
+
+WORDS = "cell membrane energy photosynthesis gene protein enzyme osmosis diffusion chlorophyll the of and is".split()
+
+def make_pdf(pages) -> bytes:
+    """Minimal PDF with one Helvetica text line per entry of each page"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, lines in enumerate(pages):
+        stream = ("BT /F1 11 Tf 14 TL 50 780 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET").encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+def make_sheet(rng: random.Random, pages: int) -> bytes:
+    sentence = lambda: " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 12))).capitalize() + "."
+    number = 0
+    content = []
+    for _ in range(pages):
+        lines = []
+        for _ in range(4):
+            number += 1
+            lines += [f"Q{number}. {sentence()}", f"Answer: {sentence()}"] + [sentence() for _ in range(8)]
+        content.append(lines)
+    return make_pdf(content)
+
+def run(paths, extractors):
+    pdf_service.PDF_EXTRACTORS = extractors
+    pdf_service.extraction_stats = ExtractionStats()
+    started = time.perf_counter()
+    pages = sum(len(list(PDFService.iter_pages(path))) for path in paths)
+    elapsed = time.perf_counter() - started
+    print(f"{' -> '.join(extractors):<22} {pages:>6} pages {elapsed:8.2f} s {pages / elapsed:9.1f} pages/s")
+    for name, counters in PDFService.stats()["engines"].items():
+        print(f"{'':<4}{name:<18} " + " ".join(f"{key}={value}" for key, value in sorted(counters.items())))
+    return elapsed
+
+def main():
+    sheets = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    paths = sys.argv[3:]
+    with tempfile.TemporaryDirectory() as directory:
+        if not paths:
+            rng = random.Random(5)
+            for i in range(sheets):
+                path = os.path.join(directory, f"sheet_{i}.pdf")
+                with open(path, "wb") as file:
+                    file.write(make_sheet(rng, pages))
+                paths.append(path)
+        baseline = run(paths, ["pdfplumber"])
+        adaptive = run(paths, ["pypdf2", "pdfplumber"])
+        print(f"{'':<22} {baseline / adaptive:.1f}x")
+
+if __name__ == "__main__":
+    main()
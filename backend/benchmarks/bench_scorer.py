@@ -0,0 +1,58 @@
+"""
+Local topic scorer benchmark
+Scores a synthetic class of answer sheets against a syllabus in one batch,
+as done when no OpenAI key is set.
+
+Usage: python benchmarks/bench_scorer.py [sheets] [pairs_per_sheet]
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.topic_scorer import score_sheets
+
+TOPICS = [
+    "Cell Biology", "Photosynthesis", "Genetics and Heredity", "Ecology Systems",
+    "Evolution", "Human Anatomy", "Plant Physiology", "Microbiology",
+    "Biochemistry", "Molecular Biology", "Immune System", "Nervous System"
+]
+WORDS = (
+    "cell cells membrane nucleus energy light chlorophyll glucose gene genes allele dna "
+    "heredity ecosystem ecology species evolution selection organ tissue plant bacteria "
+    "virus enzyme protein immune neuron the a and of in to is because which therefore"
+).split()
+
+def make_class(sheets: int, pairs: int):
+    rng = random.Random(11)
+    sentence = lambda n: " ".join(rng.choice(WORDS) for _ in range(n))
+    return [
+        [{"question": sentence(10), "answer": sentence(80)} for _ in range(pairs)]
+        for _ in range(sheets)
+    ]
+
+def main():
+    sheets = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    pairs = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    batch = make_class(sheets, pairs)
+    words = sum(len(qa["question"].split()) + len(qa["answer"].split()) for sheet in batch for qa in sheet)
+    print(f"{sheets} sheets x {len(TOPICS)} topics, {words} words")
+
+    timings = []
+    for _ in range(5):
+        started = time.perf_counter()
+        results = score_sheets(TOPICS, batch)
+        timings.append(time.perf_counter() - started)
+    print(f"batch scoring          best {min(timings) * 1000:8.1f} ms")
+    assert results == score_sheets(TOPICS, batch), "scores are not deterministic"
+
+    started = time.perf_counter()
+    for sheet in batch[:50]:
+        score_sheets(TOPICS, [sheet])
+    per_sheet = (time.perf_counter() - started) / 50
+    print(f"one sheet at a time    {per_sheet * 1000:8.2f} ms per sheet")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Full-text search benchmark
+Seeds a throwaway SQLite database with answer sheets whose Q&A pairs are
+indexed the way the pipeline indexes them, then times the search endpoint's
+query for rare and common terms, phrases, prefixes and deep pages.
+
+Usage: python benchmarks/bench_search.py [answer sheets] [Q&A pairs per sheet]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import insert
+from app.database import engine, Base, SessionLocal
+from app.migrations import run_migrations
+from app.models import User, AnswerSheet, Blob
+from app.services.search_index import index_qa_pairs, search
+
+WORDS = (
+    "cell membrane protein enzyme energy light plant chlorophyll glucose oxygen carbon dioxide water "
+    "nucleus mitochondria ribosome gene allele dominant recessive mutation species habitat population "
+    "predator prey food chain ecosystem diffusion osmosis gradient transport active passive"
+).split()
+FILLER = "the a of and to in is that it for as with by this which are on from be".split()
+
+def word(rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.05:
+        return rng.choice(WORDS)
+    if roll < 0.55:
+        return rng.choice(FILLER)
+    # Long tail of other vocabulary, Zipf-distributed
+    return f"w{int(rng.paretovariate(1.0)) % 5000}"
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(word(rng) for _ in range(words))
+
+def seed(sheets: int, pairs: int):
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    rng = random.Random(5)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": 1, "email": "teacher@bench", "name": "Bench Teacher", "role": "teacher"},
+            {"id": 2, "email": "student@bench", "name": "Bench Student", "role": "student", "student_id": "B000001"},
+        ])
+        conn.execute(insert(Blob), [{"id": i + 1, "sha256": f"{i:064x}", "file_path": "bench.pdf", "size": 0, "ref_count": 1} for i in range(sheets)])
+        conn.execute(insert(AnswerSheet), [
+            {"id": i + 1, "student_id": 2, "file_path": "bench.pdf", "file_name": f"sheet{i}.pdf", "content_hash": f"{i:064x}", "status": "processed"}
+            for i in range(sheets)
+        ])
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        for i in range(sheets):
+            index_qa_pairs(db, i + 1, [
+                {"question": sentence(rng, 12) + "?", "answer": sentence(rng, 60)}
+                for _ in range(pairs)
+            ] + ([{"question": "What is photorespiration?", "answer": "Photorespiration wastes fixed carbon."}] if i % 1000 == 0 else []))
+            if i % 1000 == 999:
+                db.commit()
+        db.commit()
+        return time.perf_counter() - started
+    finally:
+        db.close()
+
+def measure(db, name: str, query: str, page: int = 1, repeat: int = 5):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = search(db, query, page=page)
+        timings.append(time.perf_counter() - started)
+    print(f"{name:<24} {query!r:<28} best {min(timings) * 1000:7.1f} ms   {len(result['results'])} results")
+    return min(timings)
+
+def main():
+    sheets = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    pairs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    seconds = seed(sheets, pairs)
+    print(f"{sheets} answer sheets, {sheets * pairs} Q&A pairs indexed in {seconds:.1f} s ({sheets / seconds:.0f} sheets/s)")
+
+    db = SessionLocal()
+    try:
+        measure(db, "rare term", "photorespiration")
+        measure(db, "two terms", "chlorophyll glucose")
+        measure(db, "phrase", '"cell membrane"')
+        measure(db, "prefix", "mitochond*")
+        measure(db, "common term, page 10", "energy", page=10)
+        measure(db, "stop word", "the")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
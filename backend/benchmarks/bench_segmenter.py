@@ -0,0 +1,87 @@
+"""
+Q&A segmentation benchmark
+Segments synthetic answer booklets of increasing length with the previous
+regex fallback and with the single-pass segmenter. Time per page should stay
+flat for the segmenter as booklets grow; the regex version re-scans the rest
+of the text for every question (and stopped at 20 pairs).
+
+Usage: python benchmarks/bench_segmenter.py [max pages] [questions per page]
+"""
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.qa_segmenter import segment_qa
+
+WORDS = "cell membrane energy photosynthesis gene protein enzyme osmosis diffusion chlorophyll the of and is".split()
+
+def make_pages(pages: int, per_page: int):
+    rng = random.Random(11)
+    line = lambda: " ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + "."
+    number = 0
+    result = []
+    for _ in range(pages):
+        lines = []
+        for _ in range(per_page):
+            number += 1
+            lines.append(f"Q{number}. {line()}")
+            lines.append(f"Answer: {line()}")
+            lines.extend(line() for _ in range(rng.randint(6, 14)))
+            lines.append("")
+        result.append("\n".join(lines))
+    return result
+
+def legacy_segment(text: str):
+    """The regex fallback this benchmark compares against"""
+    qa_pairs = []
+    question_patterns = [
+        r'(?:^|\n)\s*(?:Q|Question)\s*\d+[\.\):]\s*(.+?)(?=\n\s*(?:Q|Question|Answer|A)\s*\d|$)',
+        r'(?:^|\n)\s*\d+[\.\)]\s*(.+?)(?=\n\s*\d+[\.\)]|$)',
+    ]
+    for pattern in question_patterns:
+        for match in re.finditer(pattern, text, re.MULTILINE | re.IGNORECASE):
+            question = match.group(1).strip()
+            start_pos = match.end()
+            next_match = re.search(r'(?:^|\n)\s*(?:Q|Question|A|Answer)\s*\d', text[start_pos:], re.IGNORECASE)
+            end_pos = start_pos + (next_match.start() if next_match else len(text))
+            answer = text[start_pos:end_pos].strip()
+            if question and answer and len(answer) > 10:
+                qa_pairs.append({"question": question[:500], "answer": answer[:2000]})
+        if qa_pairs:
+            break
+    return qa_pairs[:20]
+
+def best_of(func, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    max_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    per_page = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    sizes = sorted({max(1, max_pages // 8), max(1, max_pages // 4), max(1, max_pages // 2), max_pages})
+
+    print(f"{'pages':>6} {'chars':>9} {'pairs':>6} {'regex ms':>10} {'us/page':>9} {'stream ms':>10} {'us/page':>9}")
+    for size in sizes:
+        pages = make_pages(size, per_page)
+        text = "\n".join(pages)
+        pairs = segment_qa(pages)
+        assert segment_qa(text) == pairs
+        assert len(pairs) == size * per_page
+        legacy = best_of(lambda: legacy_segment(text))
+        streaming = best_of(lambda: segment_qa(pages))
+        print(
+            f"{size:>6} {len(text):>9} {len(pairs):>6} "
+            f"{legacy * 1e3:>10.1f} {legacy / size * 1e6:>9.0f} "
+            f"{streaming * 1e3:>10.1f} {streaming / size * 1e6:>9.0f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Near-duplicate answer detection benchmark
+Seeds a throwaway SQLite database with one access code's worth of answer
+sheets, some of whose answers are copied from an earlier student with a few
+words changed, then runs the per-sheet LSH comparison over every sheet in
+upload order. Reports the time per sheet early and late in the run (flat if
+the lookup is sublinear) and the recall and precision of the planted copies.
+
+Usage: python benchmarks/bench_similarity.py [students] [answers per sheet] [copy rate]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import insert
+from app.database import engine, Base, SessionLocal
+from app.models import User, AnswerSheet, Blob, SimilarityFlag
+from app.services.similarity import flag_similar_answers
+
+VOCABULARY = [f"w{i}" for i in range(3000)] + (
+    "cell membrane protein enzyme energy light plant chlorophyll glucose oxygen carbon water "
+    "the a of and to in is that it for as with by this which are on from be"
+).split()
+
+def answer(rng: random.Random) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(40, 120)))
+
+def edit(rng: random.Random, text: str, changes: int = 3) -> str:
+    """A copy with a few words replaced"""
+    words = text.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return " ".join(words)
+
+def seed(students: int, answers: int, copy_rate: float):
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(9)
+    sheets, planted = [], set()
+    for i in range(students):
+        qa = [{"question": f"Question {q + 1}?", "answer": answer(rng)} for q in range(answers)]
+        if i and rng.random() < copy_rate:
+            source = rng.randrange(i)
+            for q in rng.sample(range(answers), max(1, answers // 3)):
+                qa[q]["answer"] = edit(rng, sheets[source][q]["answer"])
+                planted.add((source + 1, q, i + 1, q))
+        sheets.append(qa)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i + 1, "email": f"s{i}@bench", "name": f"Student{i}", "role": "student", "student_id": f"B{i:06d}"}
+            for i in range(students)
+        ])
+        conn.execute(insert(AnswerSheet), [
+            {"id": i + 1, "student_id": i + 1, "access_code": "BENCH1", "file_path": "bench.pdf",
+             "content_hash": f"{i:064x}", "status": "processed"}
+            for i in range(students)
+        ])
+    # Through the ORM, which maps questions_answers onto its compressed column
+    db = SessionLocal()
+    try:
+        db.execute(insert(Blob), [
+            {"id": i + 1, "sha256": f"{i:064x}", "file_path": "bench.pdf", "size": 0, "ref_count": 1, "questions_answers": qa}
+            for i, qa in enumerate(sheets)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    return planted
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    answers = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    copy_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    planted = seed(students, answers, copy_rate)
+    print(f"{students} sheets x {answers} answers in one access code, {len(planted)} copied answers planted")
+
+    db = SessionLocal()
+    try:
+        timings = []
+        for sheet_id in range(1, students + 1):
+            started = time.perf_counter()
+            sheet = db.get(AnswerSheet, sheet_id)
+            flag_similar_answers(db, sheet, sheet.blob)
+            db.commit()
+            timings.append(time.perf_counter() - started)
+        tenth = max(1, students // 10)
+        print(f"first 10% of sheets      {sum(timings[:tenth]) / tenth * 1000:7.2f} ms/sheet")
+        print(f"last 10% of sheets       {sum(timings[-tenth:]) / tenth * 1000:7.2f} ms/sheet")
+        print(f"all sheets               {sum(timings):7.2f} s ({students * (students - 1) // 2} sheet pairs not compared)")
+
+        flagged = {
+            (flag.answer_sheet_id, flag.position, flag.other_answer_sheet_id, flag.other_position)
+            for flag in db.query(SimilarityFlag)
+        }
+        found = len(flagged & planted)
+        print(f"recall {found / len(planted) if planted else 1:.3f}   precision {found / len(flagged) if flagged else 1:.3f}   {len(flagged)} flags")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
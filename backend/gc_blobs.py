@@ -0,0 +1,17 @@
+"""
+Remove uploaded files that are no longer referenced
+by any syllabus or answer sheet
+"""
+from app.database import SessionLocal
+from app.services.blob_store import BlobStore
+
+def collect_garbage():
+    db = SessionLocal()
+    try:
+        removed = BlobStore.collect_garbage(db)
+        print(f"Removed {removed} unreferenced blob(s)")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    collect_garbage()
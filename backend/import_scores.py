@@ -0,0 +1,57 @@
+"""
+Import historical topic scores from a CSV or JSONL file
+Each record needs student_id, topic and score; confidence, sheet and date
+are optional. Scores are stored against the given syllabus, or the most
+recent one.
+
+Usage: python import_scores.py scores.csv [--syllabus-id N] [--format csv|jsonl] [--batch-size N]
+"""
+import argparse
+import os
+from app.database import SessionLocal, engine, Base
+from app.migrations import run_migrations
+from app.models import Syllabus
+from app.services.score_import import import_scores, iter_records, IMPORT_BATCH_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description="Import historical topic scores")
+    parser.add_argument("path", help="CSV (with a header row) or JSONL file")
+    parser.add_argument("--syllabus-id", type=int, help="Syllabus the topics belong to (default: most recent)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (default: from the file extension)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Records per transaction")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    db = SessionLocal()
+    try:
+        query = db.query(Syllabus)
+        if args.syllabus_id:
+            syllabus = query.filter(Syllabus.id == args.syllabus_id).first()
+        else:
+            syllabus = query.order_by(Syllabus.created_at.desc()).first()
+        if not syllabus:
+            raise SystemExit("No syllabus to import scores against")
+
+        def report(stats):
+            print(f"Batch {stats['batch']}: {stats['imported']}/{stats['records']} records "
+                  f"in {stats['seconds']:.2f}s ({stats['records_per_second']} records/s)")
+
+        summary = import_scores(
+            db,
+            iter_records(args.path, args.format),
+            syllabus.id,
+            source=os.path.basename(args.path),
+            batch_size=args.batch_size,
+            on_batch=report
+        )
+        for error in summary["errors"]:
+            print(f"Skipped: {error}")
+        print(f"Imported {summary['imported']} of {summary['records']} records "
+              f"in {summary['seconds']:.2f}s ({summary['records_per_second']} records/s)")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
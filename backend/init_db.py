@@ -4,6 +4,7 @@ Creates demo users and sets up the database
 """
 from app.database import SessionLocal, engine, Base
 from app.models import User
+from app.migrations import run_migrations
 from sqlalchemy import text
 
 # Simple password hashing for demo (in production use proper bcrypt)
@@ -16,6 +17,7 @@ def hash_password(password: str) -> str:
 def init_database():
     """Initialize database with demo accounts"""
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     
     db = SessionLocal()
     
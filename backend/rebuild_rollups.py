@@ -0,0 +1,22 @@
+"""
+Rebuild the dashboard topic-score rollups from the analyses table
+Use after backfilling or correcting analyses outside the application.
+"""
+from app.database import SessionLocal, engine, Base
+from app.migrations import run_migrations
+from app.services.rollups import rebuild_rollups
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    
+    db = SessionLocal()
+    try:
+        counts = rebuild_rollups(db)
+        print(f"Rebuilt {counts['topic_rollups']} topic rollups and "
+              f"{counts['student_topic_rollups']} student topic rollups")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
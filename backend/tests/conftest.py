@@ -0,0 +1,33 @@
+"""
+Shared fixtures
+The app reads its configuration at import time, so the environment is set
+here before anything under app/ is imported: a throwaway SQLite database, no
+background workers and no OpenAI key (the AI service uses its local fallback).
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ["JOB_WORKERS"] = "0"
+os.environ["OPENAI_API_KEY"] = ""
+
+import pytest
+from sqlalchemy import text
+from app.database import engine, Base, SessionLocal
+from app import models  # noqa: F401  registers the tables
+from app.migrations import run_migrations
+
+Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(text(f"DELETE FROM {table.name}"))
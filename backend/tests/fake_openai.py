@@ -0,0 +1,79 @@
+"""
+Fake OpenAI chat completions server
+Replies are scripted per test: each request takes the next entry of the
+script ("ok", an HTTP status such as 429 or 500, or "timeout"), and the last
+entry repeats once the script runs out. Point the client at it with
+OPENAI_BASE_URL.
+"""
+import asyncio
+import socket
+import threading
+import time
+from typing import List, Union
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+class FakeOpenAI:
+    def __init__(self):
+        self.script: List[Union[str, int]] = ["ok"]
+        self.delay = 0.0  # seconds before each reply
+        self.retry_after = None  # Retry-After header on 429s
+        self.hang = 2.0  # seconds a "timeout" reply takes
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.app = FastAPI()
+        self.app.post("/v1/chat/completions")(self._complete)
+        self._server = None
+        self._thread = None
+        self.base_url = None
+
+    def reply(self, *script: Union[str, int]):
+        self.script = list(script)
+
+    async def _complete(self, request: Request):
+        body = await request.json()
+        self.requests += 1
+        action = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if action == "timeout":
+            # Longer than any client timeout in the tests; not counted as in flight
+            await asyncio.sleep(self.hang)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if action not in ("ok", "timeout"):
+            headers = {"retry-after": str(self.retry_after)} if action == 429 and self.retry_after is not None else {}
+            return JSONResponse({"error": {"message": f"fake {action}", "type": "fake"}}, status_code=action, headers=headers)
+        return {
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": f"reply {self.requests}"},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }
+
+    def start(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.base_url = f"http://127.0.0.1:{port}/v1"
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
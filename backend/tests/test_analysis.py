@@ -0,0 +1,50 @@
+from app.models import User, Syllabus, AnswerSheet, Analysis, Blob, TopicRollup, StudentTopicRollup
+from app.routers.analytics import process_answer_sheet_analysis, remove_answer_sheet_analyses
+from app.services.rollups import rebuild_rollups
+from app.services.term_frequencies import load_term_frequencies
+
+TOPICS = ["Cell Division", "Photosynthesis"]
+
+def seed(db):
+    db.add(User(id=1, email="s@x", name="Student", role="student", student_id="S1"))
+    db.add(Syllabus(id=1, topics=TOPICS))
+    for i, answer in enumerate(["cell division splits the cell", "photosynthesis in the cell"], start=1):
+        db.add(Blob(id=i, sha256=f"{i:064x}", file_path="x.pdf", size=0, ref_count=1,
+                    questions_answers=[{"question": "Explain", "answer": answer}]))
+        db.add(AnswerSheet(id=i, student_id=1, content_hash=f"{i:064x}", status="processing"))
+    db.commit()
+
+def rollups(db):
+    return sorted(
+        (row.topic_id, round(row.score_sum, 6), row.score_count, row.score_min, row.score_max)
+        for model in (TopicRollup, StudentTopicRollup) for row in db.query(model)
+    )
+
+def test_running_the_job_twice_counts_the_sheet_once(db):
+    seed(db)
+    process_answer_sheet_analysis(1, db)
+    process_answer_sheet_analysis(2, db)
+    once = (db.query(Analysis).count(), rollups(db), load_term_frequencies(db, 1))
+
+    # A retried (or stale-recovered) job runs the analysis again
+    db.get(AnswerSheet, 2).status = "processing"
+    db.commit()
+    process_answer_sheet_analysis(2, db)
+
+    assert (db.query(Analysis).count(), rollups(db), load_term_frequencies(db, 1)) == once
+    assert db.query(Analysis).filter(Analysis.answer_sheet_id == 2).count() == len(TOPICS)
+    rebuild_rollups(db)
+    assert rollups(db) == once[1]
+
+def test_removed_analyses_are_taken_out_of_rollups(db):
+    seed(db)
+    process_answer_sheet_analysis(1, db)
+    process_answer_sheet_analysis(2, db)
+
+    assert remove_answer_sheet_analyses(db, db.get(AnswerSheet, 2)) == len(TOPICS)
+    db.commit()
+    assert load_term_frequencies(db, 1)[0] == 1
+    removed = rollups(db)
+    rebuild_rollups(db)
+    # Rebuilding drops rows left without scores; the rest match
+    assert [row for row in removed if row[2]] == rollups(db)
@@ -0,0 +1,52 @@
+from app.models import User, Syllabus, AnswerSheet, Analysis, Topic, Blob, Job, SearchEntry, TopicRollup, StudentTopicRollup
+from app.services.job_queue import enqueue_job_once, JobWorkerPool
+from app.services.rollups import rollups_need_backfill
+from app.services.search_index import search_index_needs_backfill, backfill_search_index, index_qa_pairs
+from app.services.similarity import similarity_needs_backfill
+from tests.test_job_queue import drain
+
+def seed(db):
+    db.add(User(id=1, email="t@x", name="Teacher", role="teacher"))
+    db.add(User(id=2, email="s@x", name="Student", role="student", student_id="S2"))
+    db.add(Syllabus(id=1, teacher_id=1, topics=["Energy"]))
+    db.add(Topic(id=1, syllabus_id=1, name="Energy", key="energy"))
+    for i in (1, 2):
+        db.add(Blob(id=i, sha256=f"{i:064x}", file_path="x.pdf", size=0, ref_count=1,
+                    questions_answers=[{"question": f"Question {i}?", "answer": f"Energy answer number {i}"}]))
+        db.add(AnswerSheet(id=i, student_id=2, access_code="CODE", content_hash=f"{i:064x}", status="processed"))
+        db.add(Analysis(answer_sheet_id=i, syllabus_id=1, topic_id=1, understanding_score=40.0 * i, confidence=0.5))
+    db.commit()
+
+def test_backfill_is_enqueued_once(db):
+    assert enqueue_job_once(db, "backfill_rollups") is not None
+    assert enqueue_job_once(db, "backfill_rollups") is None
+    db.commit()
+    assert db.query(Job).filter(Job.kind == "backfill_rollups").count() == 1
+
+def test_backfill_jobs_run_on_the_workers(db):
+    seed(db)
+    assert rollups_need_backfill(db)
+    assert search_index_needs_backfill(db)
+    assert similarity_needs_backfill(db)
+    for kind in ("backfill_rollups", "backfill_search_index", "backfill_similarity"):
+        enqueue_job_once(db, kind)
+    db.commit()
+
+    assert drain(JobWorkerPool(workers=3)) == 3
+    assert [job.status for job in db.query(Job)] == ["done"] * 3
+
+    rollup = db.query(TopicRollup).one()
+    assert (rollup.score_sum, rollup.score_count, rollup.score_min, rollup.score_max) == (120.0, 2, 40.0, 80.0)
+    assert db.query(StudentTopicRollup).one().score_count == 2
+    assert db.query(SearchEntry).count() == 2
+    assert not rollups_need_backfill(db)
+    assert not search_index_needs_backfill(db)
+
+def test_search_backfill_skips_indexed_documents(db):
+    seed(db)
+    index_qa_pairs(db, 1, [{"question": "Indexed already?", "answer": "Yes, by the pipeline"}])
+    db.commit()
+    assert not search_index_needs_backfill(db)
+    # A backfill that was interrupted, or raced the pipeline, still covers the rest
+    assert backfill_search_index(db) == 1
+    assert sorted(e.question for e in db.query(SearchEntry)) == ["Indexed already?", "Question 2?"]
@@ -0,0 +1,68 @@
+import os
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from app.models import User, AccessCode, AnswerSheet, Blob
+from app.routers import students
+from app.services.blob_store import BlobStore
+
+PDF = b"%PDF-1.4\n% answer sheet\n%%EOF\n"
+
+@pytest.fixture
+def client(db, tmp_path, monkeypatch):
+    # Uploads and the blob store live under the working directory
+    monkeypatch.chdir(tmp_path)
+    from app.main import app
+    db.add(User(id=1, email="t@x", name="Teacher", role="teacher"))
+    db.add(User(id=2, email="s@x", name="Student", role="student", student_id="S2"))
+    db.add(AccessCode(code="CODE", teacher_id=1, expires_at=datetime.utcnow() + timedelta(days=1), is_active=True))
+    db.commit()
+    return TestClient(app)
+
+def upload(client):
+    return client.post(
+        "/api/students/answer-sheets/upload",
+        params={"student_id": 2, "access_code": "code"},
+        files={"file": ("sheet.pdf", PDF, "application/pdf")}
+    )
+
+def test_deleted_answer_sheet_file_is_collected(client, db):
+    response = upload(client)
+    assert response.status_code == 200
+    sheet_id = response.json()["id"]
+    blob = db.query(Blob).one()
+    assert blob.ref_count == 1 and os.path.exists(blob.file_path)
+
+    # Still being processed
+    assert client.delete(f"/api/students/answer-sheets/{sheet_id}", params={"student_id": 2}).status_code == 409
+    db.get(AnswerSheet, sheet_id).status = "processed"
+    db.commit()
+    assert client.delete(f"/api/students/answer-sheets/{sheet_id}", params={"student_id": 2}).status_code == 200
+    assert db.get(AnswerSheet, sheet_id) is None
+
+    assert BlobStore.collect_garbage(db) == 1
+    assert db.query(Blob).count() == 0
+    assert not os.path.exists(blob.file_path)
+
+def test_failed_upload_releases_its_reference(client, db, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("queue unavailable")
+
+    monkeypatch.setattr(students, "enqueue_job", fail)
+    assert upload(client).status_code == 500
+    assert db.query(AnswerSheet).count() == 0
+    blob = db.query(Blob).one()
+    assert blob.ref_count == 0
+
+    assert BlobStore.collect_garbage(db) == 1
+    assert db.query(Blob).count() == 0
+    assert not os.path.exists(blob.file_path)
+
+def test_uploaded_sheet_can_be_downloaded(client):
+    sheet_id = upload(client).json()["id"]
+    response = client.get(f"/api/files/download/answers/{sheet_id}")
+    assert response.status_code == 200
+    assert response.content == PDF
+    assert 'filename="sheet.pdf"' in response.headers["content-disposition"]
+    assert client.get("/api/files/download/answers/999").status_code == 404
+    assert client.get(f"/api/files/download/text/{sheet_id}").status_code == 400
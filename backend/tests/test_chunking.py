@@ -0,0 +1,94 @@
+from app.services.chunking import (
+    chunk_text, chunk_qa_pairs, format_qa_chunk, merge_topics, merge_qa_pairs, merge_analyses, CHARS_PER_TOKEN
+)
+
+def test_short_and_blank_text():
+    assert chunk_text("short", max_tokens=10) == ["short"]
+    assert chunk_text("   \n  ", max_tokens=10) == []
+
+def test_chunks_break_at_questions_and_stay_under_the_limit():
+    text = "\n".join(f"Q{i} What is item {i}?\nIt is the answer number {i}." for i in range(1, 30))
+    chunks = chunk_text(text, max_tokens=40)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 40 * CHARS_PER_TOKEN for chunk in chunks)
+    assert all(chunk.startswith("Q") for chunk in chunks)
+    assert " ".join(" ".join(chunks).split()) == " ".join(text.split())
+
+def test_oversized_segment_is_split_at_whitespace():
+    text = " ".join(["word"] * 200)
+    chunks = chunk_text(text, max_tokens=10)
+    assert all(len(chunk) <= 10 * CHARS_PER_TOKEN for chunk in chunks)
+    assert all(set(chunk.split()) == {"word"} for chunk in chunks)
+
+def test_qa_pairs_are_never_split():
+    pairs = [{"question": f"Q{i}", "answer": "x" * 50} for i in range(10)]
+    chunks = chunk_qa_pairs(pairs, max_tokens=40)
+    assert [qa for chunk in chunks for qa in chunk] == pairs
+    # A single pair larger than a chunk gets a chunk of its own, shortened in the prompt
+    huge = {"question": "Q", "answer": "y" * 1000}
+    assert chunk_qa_pairs([huge], max_tokens=40) == [[huge]]
+    assert len(format_qa_chunk([huge], max_tokens=40)) == 40 * CHARS_PER_TOKEN
+
+def test_merge_topics_ignores_case_spacing_and_junk():
+    merged = merge_topics([["Cell Biology", " Energy "], ["cell  biology", None, "Motion"], []])
+    assert merged == ["Cell Biology", "Energy", "Motion"]
+
+def test_merge_qa_pairs_drops_repeats_across_chunks():
+    first = {"question": "Q1", "answer": "A  one"}
+    merged = merge_qa_pairs([[first], [{"question": "q1", "answer": "a one"}, "junk", {"question": "Q2", "answer": "two"}]])
+    assert merged == [first, {"question": "Q2", "answer": "two"}]
+
+def test_merge_analyses_weights_by_chunk_size_and_confidence():
+    merged = merge_analyses(
+        [
+            [{"topic": "energy", "understanding_score": 80, "confidence": 1.0, "details": "good"}],
+            [
+                {"topic": "Energy", "understanding_score": 20, "confidence": 1.0, "details": "weak"},
+                {"topic": "Extra", "understanding_score": 50, "confidence": 0.5},
+                {"topic": "Bad", "understanding_score": "n/a"},
+                {"understanding_score": 90},
+            ],
+        ],
+        weights=[3, 1],
+        topics=["Motion", "Energy"]
+    )
+    assert merged == [
+        {"topic": "Energy", "understanding_score": 65.0, "confidence": 1.0, "details": "good weak"},
+        {"topic": "Extra", "understanding_score": 50.0, "confidence": 0.5, "details": ""},
+    ]
+
+def test_merge_analyses_skips_chunks_without_evidence():
+    answered = {"topic": "Energy", "understanding_score": 90, "confidence": 0.9, "details": "explained well", "covered": True}
+    absent = {"topic": "Energy", "understanding_score": 0, "confidence": 0.3, "details": "not mentioned", "covered": False}
+    never = {"topic": "Motion", "understanding_score": 0, "confidence": 0.3, "covered": False}
+    merged = merge_analyses(
+        [[answered, never], [absent, never], [absent, never], [absent, never]],
+        weights=[1, 1, 1, 1],
+        topics=["Energy", "Motion"]
+    )
+    assert merged == [
+        {"topic": "Energy", "understanding_score": 90.0, "confidence": 0.9, "details": "explained well"},
+        # Covered by no chunk: still scored, from every chunk
+        {"topic": "Motion", "understanding_score": 0.0, "confidence": 0.3, "details": ""},
+    ]
+
+def test_topic_answered_in_one_chunk_keeps_its_score(monkeypatch):
+    from app.services.ai_service import ai_service
+
+    prompts = []
+
+    def chat(messages, **params):
+        prompt = messages[-1]["content"]
+        prompts.append(prompt)
+        if "chlorophyll" in prompt:
+            return [{"topic": "Photosynthesis", "understanding_score": 90, "confidence": 0.9, "covered": True}]
+        return [{"topic": "Photosynthesis", "understanding_score": 0, "confidence": 0.3, "covered": False}]
+
+    monkeypatch.setattr(ai_service, "_chat", chat)
+    # Pairs too long to share a chunk
+    pairs = [{"question": f"Q{i}", "answer": f"{'chlorophyll ' if i == 0 else ''}{'word ' * 900}"} for i in range(4)]
+    assert len(chunk_qa_pairs(pairs)) == 4
+
+    merged = ai_service._analyze_with_openai(["Photosynthesis"], pairs)
+    assert len(prompts) == 4 and all("covered" in prompt for prompt in prompts)
+    assert merged[0]["understanding_score"] == 90.0
@@ -0,0 +1,82 @@
+import asyncio
+import csv
+import io
+from datetime import datetime
+import orjson
+import pyarrow.parquet as pq
+import pytest
+from app.models import User, Syllabus, AnswerSheet, Analysis, Topic
+from app.services.export_service import export_rows, ANALYSIS_COLUMNS, SUMMARY_COLUMNS
+from app.services.rollups import rebuild_rollups
+
+@pytest.fixture
+def class_data(db):
+    """One teacher, two students, six analyses over two topics; another teacher's class alongside"""
+    for teacher_id in (1, 2):
+        db.add(User(id=teacher_id, email=f"t{teacher_id}@x", name=f"Teacher {teacher_id}", role="teacher"))
+        db.add(Syllabus(id=teacher_id, teacher_id=teacher_id, topics=["Energy", "Motion"]))
+        db.add(Topic(id=teacher_id * 10, syllabus_id=teacher_id, name="Energy", key="energy"))
+        db.add(Topic(id=teacher_id * 10 + 1, syllabus_id=teacher_id, name="Motion", key="motion"))
+    for student in (3, 4):
+        db.add(User(id=student, email=f"s{student}@x", name=f"Student, {student}", role="student", student_id=f"S{student}"))
+    db.flush()
+    created = datetime(2026, 1, 2, 3, 4, 5)
+    for sheet_id, (student, syllabus) in enumerate([(3, 1), (3, 1), (4, 1), (4, 2)], start=1):
+        db.add(AnswerSheet(id=sheet_id, student_id=student, status="processed"))
+        for topic_id, score in ((syllabus * 10, 40.0 + sheet_id * 10), (syllabus * 10 + 1, 70.0)):
+            db.add(Analysis(answer_sheet_id=sheet_id, syllabus_id=syllabus, topic_id=topic_id,
+                            understanding_score=score, confidence=0.5, created_at=created))
+    db.commit()
+    rebuild_rollups(db)
+    db.commit()
+    return db
+
+def collect(*args, **kwargs):
+    """Export body and the number of chunks it was streamed in"""
+    async def run():
+        return [chunk async for chunk in export_rows(*args, **kwargs)]
+    chunks = asyncio.run(run())
+    return b"".join(chunks), len(chunks)
+
+def test_csv_streams_one_chunk_per_partition(class_data):
+    body, chunks = collect(1, "csv", batch_rows=2)
+    rows = list(csv.reader(io.StringIO(body.decode("utf-8"))))
+    assert rows[0] == list(ANALYSIS_COLUMNS)
+    assert len(rows) == 1 + 6
+    assert rows[1] == ["S3", "Student, 3", "Energy", "50.0", "0.5", "1", "2026-01-02 03:04:05"]
+    # Header, then three partitions of two rows
+    assert chunks == 4
+
+def test_jsonl_rows_are_objects(class_data):
+    body, _ = collect(1, "jsonl")
+    records = [orjson.loads(line) for line in body.splitlines()]
+    assert len(records) == 6
+    assert set(records[0]) == set(ANALYSIS_COLUMNS)
+    assert {r["answer_sheet_id"] for r in records} == {1, 2, 3}
+
+def test_parquet_has_one_row_group_per_partition(class_data):
+    body, _ = collect(1, "parquet", batch_rows=4)
+    parquet = pq.ParquetFile(io.BytesIO(body))
+    assert parquet.metadata.num_row_groups == 2
+    table = parquet.read()
+    assert table.column_names == list(ANALYSIS_COLUMNS)
+    assert table.num_rows == 6
+    assert str(table.schema.field("analyzed_at").type) == "timestamp[us]"
+
+def test_summary_aggregates_per_student_and_topic(class_data):
+    body, _ = collect(1, "jsonl", detail="summary")
+    records = [orjson.loads(line) for line in body.splitlines()]
+    assert [list(r) for r in records[:1]] == [list(SUMMARY_COLUMNS)]
+    by_key = {(r["student_id"], r["topic"]): r for r in records}
+    assert by_key[("S3", "Energy")] == {
+        "student_id": "S3", "student_name": "Student, 3", "topic": "Energy",
+        "average": 55.0, "count": 2, "min": 50.0, "max": 60.0
+    }
+    assert by_key[("S4", "Motion")]["count"] == 1
+    assert len(records) == 4
+
+def test_empty_class_exports_header_only(db):
+    body, _ = collect(99, "csv")
+    assert body.decode("utf-8").strip() == ",".join(ANALYSIS_COLUMNS)
+    body, _ = collect(99, "parquet")
+    assert pq.read_table(io.BytesIO(body)).num_rows == 0
@@ -0,0 +1,235 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+import pytest
+from app.database import SessionLocal
+from app.models import Job
+from app.services import job_queue
+from app.services.job_queue import JobWorkerPool, JobDeferred, enqueue_job, enqueue_jobs, recover_stale_jobs, JOB_STALE_AFTER
+
+runs = []
+failures = []
+_runs_lock = threading.Lock()
+
+def record_handler(payload, db):
+    with _runs_lock:
+        runs.append(payload["n"])
+
+def failing_handler(payload, db):
+    raise RuntimeError(payload["error"])
+
+def deferring_handler(payload, db):
+    raise JobDeferred("not yet", delay=60)
+
+def failure_hook(payload, db, error):
+    failures.append((payload, error))
+
+@pytest.fixture(autouse=True)
+def handlers(monkeypatch):
+    runs.clear()
+    failures.clear()
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "test_record", "tests.test_job_queue:record_handler")
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "test_fail", "tests.test_job_queue:failing_handler")
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "test_defer", "tests.test_job_queue:deferring_handler")
+    monkeypatch.setitem(job_queue.JOB_FAILURE_HANDLERS, "test_fail", "tests.test_job_queue:failure_hook")
+
+def drain(pool: JobWorkerPool) -> int:
+    """Claim once and wait for the claimed jobs and their result callbacks"""
+    pool._executor = ThreadPoolExecutor(max_workers=pool.workers)
+    claimed = pool._claim_jobs()
+    pool._executor.shutdown(wait=True)
+    return claimed
+
+def test_enqueue_rejects_unknown_kind(db):
+    with pytest.raises(ValueError):
+        enqueue_job(db, "no_such_kind", {})
+
+def test_claimed_job_runs_once(db):
+    job = enqueue_job(db, "test_record", {"n": 1})
+    db.commit()
+
+    pool = JobWorkerPool(workers=2)
+    assert drain(pool) == 1
+    assert drain(pool) == 0
+
+    db.refresh(job)
+    assert job.status == "done", job.last_error
+    assert job.attempts == 1
+    assert job.locked_by == job_queue.WORKER_ID
+    assert runs == [1]
+    assert pool.stats()["succeeded"] == 1
+
+def test_claim_respects_capacity(db):
+    enqueue_jobs(db, "test_record", [{"n": n} for n in range(5)])
+    db.commit()
+
+    pool = JobWorkerPool(workers=2)
+    assert drain(pool) == 2
+    assert sorted(runs) == [0, 1]
+
+def test_concurrent_dispatchers_never_share_a_job(db):
+    enqueue_jobs(db, "test_record", [{"n": n} for n in range(40)])
+    db.commit()
+
+    pools = [JobWorkerPool(workers=2) for _ in range(4)]
+    for pool in pools:
+        pool.start()
+    try:
+        deadline = time.monotonic() + 30
+        while db.query(Job).filter(Job.status != "done").count() and time.monotonic() < deadline:
+            for pool in pools:
+                pool.notify()
+            time.sleep(0.05)
+            db.expire_all()
+    finally:
+        for pool in pools:
+            pool.stop()
+
+    assert sorted(runs) == list(range(40))
+    assert sum(pool.stats()["claimed"] for pool in pools) == 40
+
+def test_failed_attempt_is_retried_with_backoff(db):
+    job = enqueue_job(db, "test_fail", {"error": "boom"}, max_attempts=2)
+    db.commit()
+
+    before = datetime.utcnow()
+    drain(JobWorkerPool(workers=1))
+    db.refresh(job)
+    assert job.status == "queued"
+    assert job.attempts == 1
+    assert job.locked_by is None
+    assert job.run_after >= before + timedelta(seconds=job_queue.JOB_RETRY_BACKOFF)
+    assert job.last_error == "Attempt 1: boom"
+    assert failures == []
+
+    # Not claimable until the backoff has passed
+    assert drain(JobWorkerPool(workers=1)) == 0
+
+def test_deferred_job_is_requeued_without_using_an_attempt(db):
+    job = enqueue_job(db, "test_defer", {}, max_attempts=1)
+    db.commit()
+
+    pool = JobWorkerPool(workers=1)
+    assert drain(pool) == 1
+    db.refresh(job)
+    assert (job.status, job.attempts, job.locked_by, job.last_error) == ("queued", 0, None, None)
+    assert job.run_after > datetime.utcnow() + timedelta(seconds=50)
+    assert pool.stats()["deferred"] == 1
+    assert drain(pool) == 0
+
+def test_last_attempt_fails_job_and_keeps_every_error(db):
+    job = enqueue_job(db, "test_fail", {"error": "boom"}, max_attempts=2)
+    db.commit()
+
+    pool = JobWorkerPool(workers=1)
+    drain(pool)
+    job.run_after = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    drain(pool)
+
+    db.refresh(job)
+    assert job.status == "failed"
+    assert job.attempts == 2
+    assert job.finished_at is not None
+    assert job.last_error.splitlines() == ["Attempt 1: boom", "Attempt 2: boom"]
+    assert failures == [({"error": "boom"}, "boom")]
+    assert pool.stats()["retried"] == 1
+    assert pool.stats()["failed"] == 1
+
+def test_error_history_is_capped(db):
+    job = enqueue_job(db, "test_fail", {"error": "x" * 3000}, max_attempts=3)
+    db.commit()
+
+    pool = JobWorkerPool(workers=1)
+    for _ in range(3):
+        drain(pool)
+        db.refresh(job)
+        job.run_after = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+
+    db.refresh(job)
+    assert job.status == "failed"
+    assert len(job.last_error) == job_queue.JOB_ERROR_HISTORY_CHARS
+    assert job.last_error.endswith("Attempt 3: " + "x" * 3000)
+
+def test_stale_running_jobs_are_requeued(db):
+    now = datetime.utcnow()
+    stale = Job(kind="test_record", payload={"n": 1}, status="running", attempts=1, max_attempts=3,
+                created_at=now, run_after=now, locked_by="gone:1",
+                started_at=now - timedelta(seconds=JOB_STALE_AFTER + 60))
+    fresh = Job(kind="test_record", payload={"n": 2}, status="running", attempts=1, max_attempts=3,
+                created_at=now, run_after=now, locked_by="alive:1", started_at=now)
+    exhausted = Job(kind="test_record", payload={"n": 3}, status="running", attempts=3, max_attempts=3,
+                    created_at=now, run_after=now, locked_by="gone:1",
+                    started_at=now - timedelta(seconds=JOB_STALE_AFTER + 60))
+    db.add_all([stale, fresh, exhausted])
+    db.commit()
+
+    assert recover_stale_jobs(db) == 2
+
+    db.refresh(stale)
+    db.refresh(fresh)
+    db.refresh(exhausted)
+    assert stale.status == "queued"
+    assert stale.locked_by is None
+    assert stale.last_error == "Attempt 1: Worker gone:1 did not finish the job"
+    assert fresh.status == "running"
+    assert exhausted.status == "failed"
+
+def test_job_rows_are_visible_to_other_sessions_only_after_commit(db):
+    enqueue_job(db, "test_record", {"n": 1})
+    other = SessionLocal()
+    try:
+        assert other.query(Job).count() == 0
+        db.commit()
+        assert other.query(Job).count() == 1
+    finally:
+        other.close()
+
+def test_process_workers_are_spawned(db):
+    # Spawned workers import the handler table afresh, so a real kind is used
+    job = enqueue_job(db, "backfill_rollups", {})
+    db.commit()
+
+    pool = JobWorkerPool(workers=1, mode="process")
+    pool.start()
+    try:
+        deadline = time.time() + 60
+        while pool.stats()["succeeded"] < 1 and time.time() < deadline:
+            time.sleep(0.1)
+        assert pool._executor._mp_context.get_start_method() == "spawn"
+    finally:
+        pool.stop()
+    db.refresh(job)
+    assert job.status == "done", job.last_error
+
+class BrokenPool:
+    """Executor whose worker process died"""
+    shut_down = False
+
+    def submit(self, fn, *args):
+        raise BrokenProcessPool("A child process terminated abruptly")
+
+    def shutdown(self, wait=True):
+        self.shut_down = True
+
+def test_broken_executor_is_replaced_and_claims_returned(db):
+    jobs = enqueue_jobs(db, "test_record", [{"n": n} for n in range(2)])
+    db.commit()
+
+    pool = JobWorkerPool(workers=2)
+    broken = pool._executor = BrokenPool()
+    assert pool._claim_jobs() == 0
+    assert broken.shut_down
+    assert isinstance(pool._executor, ThreadPoolExecutor)
+    assert (pool.stats()["in_flight"], pool.stats()["claimed"]) == (0, 0)
+    for job in jobs:
+        db.refresh(job)
+        assert (job.status, job.attempts, job.locked_by) == ("queued", 0, None)
+
+    # The replacement pool runs them
+    pool._claim_jobs()
+    pool._executor.shutdown(wait=True)
+    assert sorted(runs) == [0, 1]
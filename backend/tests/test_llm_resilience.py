@@ -0,0 +1,216 @@
+import asyncio
+import time
+import pytest
+from openai import APIStatusError, APITimeoutError
+from app.services import llm_client as llm_client_module
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.llm_client import LLMClient
+from tests.fake_openai import FakeOpenAI
+
+@pytest.fixture(scope="module")
+def server():
+    fake = FakeOpenAI()
+    fake.start()
+    yield fake
+    fake.stop()
+
+@pytest.fixture
+def fake_openai(server, monkeypatch):
+    server.reply("ok")
+    server.delay = 0.0
+    server.retry_after = None
+    server.requests = server.max_in_flight = 0
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+    monkeypatch.setattr(llm_client_module, "LLM_TIMEOUT", 0.5)
+    monkeypatch.setattr(llm_client_module, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(llm_client_module, "LLM_BACKOFF_BASE", 0.01)
+    return server
+
+@pytest.fixture
+def client(fake_openai):
+    llm = LLMClient(max_concurrency=2)
+    yield llm
+    llm.close()
+
+def complete(llm: LLMClient) -> str:
+    return llm.complete(model="fake", messages=[{"role": "user", "content": "hi"}])
+
+class Clock:
+    """Stand-in for time.monotonic in the breaker"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr("app.services.circuit_breaker.time", fake)
+    return fake
+
+def fail(breaker: CircuitBreaker):
+    with pytest.raises(RuntimeError):
+        breaker.call(lambda: (_ for _ in ()).throw(RuntimeError("down")))
+
+def test_breaker_opens_after_threshold_within_window(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, window=10, reset_timeout=5)
+    fail(breaker)
+    fail(breaker)
+    clock.now += 11  # the first two fall out of the window
+    fail(breaker)
+    fail(breaker)
+    assert breaker.stats()["state"] == "closed"
+    fail(breaker)
+    assert breaker.stats()["state"] == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "not called")
+    assert breaker.stats()["rejected"] == 1
+    assert breaker.stats()["opened"] == 1
+
+def test_half_open_allows_one_probe_then_closes_on_success(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=5)
+    fail(breaker)
+    clock.now += 4
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.stats()["state"] == "half_open"
+    assert breaker.allow()
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_success(0.1)
+    assert breaker.stats()["state"] == "closed"
+    assert breaker.call(lambda: "ok") == "ok"
+
+def test_failed_probe_reopens_for_another_timeout(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=5)
+    fail(breaker)
+    clock.now += 5
+    fail(breaker)
+    assert breaker.stats()["state"] == "open"
+    assert breaker.stats()["opened"] == 2
+    clock.now += 4
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, slow_call=1)
+    breaker.record_success(2.0)
+    breaker.record_success(0.5)
+    breaker.record_success(3.0)
+    stats = breaker.stats()
+    assert stats["state"] == "open"
+    assert stats["slow_calls"] == 2
+    assert stats["failures"] == 0
+    assert stats["successes"] == 1
+
+def test_retries_429_and_500_then_succeeds(client, fake_openai):
+    fake_openai.reply(429, 500, "ok")
+    assert complete(client) == "reply 3"
+    assert client.stats()["retries"] == 2
+    assert client.stats()["succeeded"] == 1
+
+def test_gives_up_after_max_retries(client, fake_openai):
+    fake_openai.reply(503)
+    with pytest.raises(APIStatusError) as error:
+        complete(client)
+    assert error.value.status_code == 503
+    assert fake_openai.requests == 1 + llm_client_module.LLM_MAX_RETRIES
+    assert client.stats()["failed"] == 1
+
+def test_client_errors_are_not_retried(client, fake_openai):
+    fake_openai.reply(400)
+    with pytest.raises(APIStatusError):
+        complete(client)
+    assert fake_openai.requests == 1
+
+def test_timeout_is_retried(client, fake_openai):
+    fake_openai.reply("timeout", "ok")
+    assert complete(client) == "reply 2"
+    assert client.stats()["retries"] == 1
+
+def test_backoff_honours_retry_after(client, fake_openai):
+    fake_openai.reply(429, "ok")
+    fake_openai.retry_after = 0.3
+    started = time.monotonic()
+    complete(client)
+    assert time.monotonic() - started >= 0.3
+
+def test_backoff_grows_exponentially_with_full_jitter(monkeypatch):
+    monkeypatch.setattr(llm_client_module, "LLM_BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(llm_client_module, "LLM_BACKOFF_MAX", 5.0)
+    monkeypatch.setattr(llm_client_module.random, "uniform", lambda low, high: high)
+    error = asyncio.TimeoutError()
+    assert [llm_client_module._backoff_delay(attempt, error) for attempt in range(5)] == [1, 2, 4, 5, 5]
+
+def test_semaphore_caps_concurrent_requests(client, fake_openai):
+    fake_openai.delay = 0.2
+
+    async def burst():
+        return await asyncio.gather(*[
+            client.acomplete(model="fake", messages=[{"role": "user", "content": str(i)}]) for i in range(6)
+        ])
+
+    assert len(asyncio.run(burst())) == 6
+    assert fake_openai.requests == 6
+    assert fake_openai.max_in_flight == client.max_concurrency == 2
+
+@pytest.fixture
+def guarded(fake_openai):
+    """Client whose attempts go through its own breaker"""
+    def make(**options):
+        llm = LLMClient(max_concurrency=2, breaker=CircuitBreaker("fake", **options))
+        clients.append(llm)
+        return llm
+
+    clients = []
+    yield make
+    for llm in clients:
+        llm.close()
+
+def test_breaker_stops_calling_a_failing_service(guarded, fake_openai, monkeypatch):
+    monkeypatch.setattr(llm_client_module, "LLM_MAX_RETRIES", 0)
+    llm = guarded(failure_threshold=2, reset_timeout=0.2)
+    fake_openai.reply(500)
+    for _ in range(2):
+        with pytest.raises(APIStatusError):
+            complete(llm)
+    with pytest.raises(CircuitOpenError):
+        complete(llm)
+    assert fake_openai.requests == 2
+
+    # Half-open after the reset timeout: one probe, which closes the circuit
+    fake_openai.reply("ok")
+    time.sleep(0.25)
+    assert complete(llm) == "reply 3"
+    assert llm.breaker.stats()["state"] == "closed"
+
+def test_each_failed_attempt_is_recorded(guarded, fake_openai):
+    # Opens during the retries instead of after the call gives up
+    llm = guarded(failure_threshold=2)
+    fake_openai.reply(503)
+    with pytest.raises(CircuitOpenError):
+        complete(llm)
+    assert fake_openai.requests == 2
+    assert llm.breaker.stats()["failures"] == 2
+    assert llm.breaker.stats()["state"] == "open"
+
+def test_client_errors_do_not_open_the_breaker(guarded, fake_openai):
+    llm = guarded(failure_threshold=1)
+    fake_openai.reply(400)
+    for _ in range(3):
+        with pytest.raises(APIStatusError):
+            complete(llm)
+    stats = llm.breaker.stats()
+    assert (stats["state"], stats["failures"]) == ("closed", 0)
+
+def test_timeouts_open_the_breaker(guarded, fake_openai, monkeypatch):
+    monkeypatch.setattr(llm_client_module, "LLM_MAX_RETRIES", 0)
+    monkeypatch.setattr(llm_client_module, "LLM_TIMEOUT", 0.1)
+    llm = guarded(failure_threshold=1)
+    fake_openai.reply("timeout")
+    with pytest.raises((APITimeoutError, asyncio.TimeoutError)):
+        complete(llm)
+    assert llm.breaker.stats()["state"] == "open"
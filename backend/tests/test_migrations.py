@@ -0,0 +1,108 @@
+import json
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+from app.database import Base
+from app.migrations import run_migrations, ADDED_INDEXES
+from app.models import Analysis, AnswerSheet, Blob, Syllabus, Topic
+
+# Schema of the first release, before topics, blobs and rollups existed
+BASELINE_SCHEMA = [
+    """CREATE TABLE users (
+        id INTEGER PRIMARY KEY, email VARCHAR UNIQUE, name VARCHAR, password_hash VARCHAR,
+        role VARCHAR, student_id VARCHAR UNIQUE, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE access_codes (
+        id INTEGER PRIMARY KEY, code VARCHAR UNIQUE, teacher_id INTEGER REFERENCES users(id),
+        expires_at DATETIME, created_at DATETIME DEFAULT CURRENT_TIMESTAMP, is_active BOOLEAN)""",
+    """CREATE TABLE syllabus (
+        id INTEGER PRIMARY KEY, teacher_id INTEGER REFERENCES users(id), file_path VARCHAR,
+        text_content TEXT, topics TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE answer_sheets (
+        id INTEGER PRIMARY KEY, student_id INTEGER REFERENCES users(id), access_code VARCHAR,
+        file_path VARCHAR, text_content TEXT, questions_answers TEXT, status VARCHAR,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP, processed_at DATETIME)""",
+    """CREATE TABLE analyses (
+        id INTEGER PRIMARY KEY, answer_sheet_id INTEGER REFERENCES answer_sheets(id),
+        syllabus_id INTEGER REFERENCES syllabus(id), topic VARCHAR, understanding_score FLOAT,
+        confidence FLOAT, details TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)""",
+]
+
+QA = [{"question": "What is osmosis?", "answer": "Movement of water across a membrane."}]
+
+def baseline_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for ddl in BASELINE_SCHEMA:
+            conn.execute(text(ddl))
+        conn.execute(text("INSERT INTO users (id, email, name, role) VALUES (1, 't@x', 'Teacher', 'teacher')"))
+        conn.execute(text(
+            "INSERT INTO users (id, email, name, role, student_id) VALUES (2, 's@x', 'Student', 'student', 'S1')"
+        ))
+        conn.execute(
+            text("INSERT INTO syllabus (id, teacher_id, file_path, text_content, topics) VALUES (1, 1, :path, :text, :topics)"),
+            {"path": str(path.parent / "missing-syllabus.pdf"), "text": "Osmosis and diffusion",
+             "topics": json.dumps(["Osmosis", "Diffusion"])}
+        )
+        conn.execute(
+            text("INSERT INTO answer_sheets (id, student_id, access_code, file_path, text_content, questions_answers, status) "
+                 "VALUES (1, 2, 'ABC123', :path, :text, :qa, 'processed')"),
+            {"path": str(path.parent / "missing-answers.pdf"), "text": "Q1 What is osmosis?", "qa": json.dumps(QA)}
+        )
+        conn.execute(text(
+            "INSERT INTO analyses (answer_sheet_id, syllabus_id, topic, understanding_score, confidence, details) VALUES "
+            "(1, 1, 'osmosis', 80, 0.9, '{}'), (1, 1, 'Cell Division', 60, 0.5, '{}')"
+        ))
+    return engine
+
+def migrate(engine):
+    # The order used by main.py and init_db.py
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+def test_baseline_database_is_brought_up_to_date(tmp_path):
+    engine = baseline_engine(tmp_path / "old.db")
+    migrate(engine)
+
+    inspector = inspect(engine)
+    for table in Base.metadata.tables.values():
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        assert {c.name for c in table.columns} <= columns, table.name
+    for name, table, _ in ADDED_INDEXES:
+        assert name in {i["name"] for i in inspector.get_indexes(table)}
+    assert "topic" not in {c["name"] for c in inspector.get_columns("analyses")}
+    assert "text_content" not in {c["name"] for c in inspector.get_columns("answer_sheets")}
+
+    with Session(engine) as db:
+        topics = {t.key: t.name for t in db.query(Topic).filter(Topic.syllabus_id == 1)}
+        assert topics == {"osmosis": "Osmosis", "diffusion": "Diffusion", "cell division": "Cell Division"}
+        # Analyses point at the syllabus's canonical spelling
+        names = sorted(a.topic.name for a in db.query(Analysis))
+        assert names == ["Cell Division", "Osmosis"]
+
+        sheet = db.get(AnswerSheet, 1)
+        assert sheet.content_hash
+        assert sheet.blob.text_content == "Q1 What is osmosis?"
+        assert sheet.blob.questions_answers == QA
+        assert sheet.blob.ref_count == 1
+        assert db.get(Syllabus, 1).blob.text_content == "Osmosis and diffusion"
+        assert db.query(Blob).count() == 2
+    engine.dispose()
+
+def test_migrations_are_idempotent(tmp_path):
+    engine = baseline_engine(tmp_path / "old.db")
+    migrate(engine)
+    migrate(engine)
+
+    with Session(engine) as db:
+        assert db.query(Topic).count() == 3
+        assert db.query(Analysis).filter(Analysis.topic_id.is_(None)).count() == 0
+        assert db.query(Blob).count() == 2
+        assert db.get(AnswerSheet, 1).blob.ref_count == 1
+    engine.dispose()
+
+def test_empty_database_needs_no_migration(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    migrate(engine)
+    with engine.connect() as conn:
+        tables = set(inspect(conn).get_table_names())
+    assert set(Base.metadata.tables) <= tables
+    engine.dispose()
@@ -0,0 +1,81 @@
+import pytest
+from app.services.pdf_service import join_page_texts
+from app.services.qa_segmenter import segment_qa, ANSWER_MAX_CHARS
+from app.services.answer_sheet_pipeline import _DocumentText
+
+def test_question_and_answer_markers():
+    text = (
+        "Name: Alex\n"
+        "Q1. What is osmosis?\n"
+        "A: Water moving across a membrane.\n"
+        "Question 2) Define diffusion\n"
+        "Ans. Particles spreading from high to low concentration.\n"
+        "Q3: Name an organelle\n"
+        "A1) The mitochondria, where respiration happens.\n"
+    )
+    assert segment_qa(text) == [
+        {"question": "What is osmosis?", "answer": "Water moving across a membrane."},
+        {"question": "Define diffusion", "answer": "Particles spreading from high to low concentration."},
+        {"question": "Name an organelle", "answer": "The mitochondria, where respiration happens."},
+    ]
+
+def test_lettered_sub_parts_stay_in_the_answer():
+    text = (
+        "Q1. Describe the two stages of photosynthesis.\n"
+        "Photosynthesis happens in two stages:\n"
+        "a) the light reactions, which split water and make ATP,\n"
+        "b) the Calvin cycle, which fixes carbon dioxide.\n"
+        "(a) needs light, while (b) does not.\n"
+        "Q2. What is a cell?\n"
+        "A: The smallest unit of life.\n"
+        "a. It has a membrane\n"
+    )
+    pairs = segment_qa(text)
+    assert [p["question"] for p in pairs] == ["Describe the two stages of photosynthesis.", "What is a cell?"]
+    assert pairs[0]["answer"].splitlines() == [
+        "Photosynthesis happens in two stages:",
+        "a) the light reactions, which split water and make ATP,",
+        "b) the Calvin cycle, which fixes carbon dioxide.",
+        "(a) needs light, while (b) does not.",
+    ]
+    assert pairs[1]["answer"] == "The smallest unit of life.\na. It has a membrane"
+
+def test_lines_before_the_answer_marker_belong_to_the_question():
+    pairs = segment_qa("Q1. Explain\nwhy leaves are green.\nAnswer: Chlorophyll reflects green light.")
+    assert pairs == [{"question": "Explain why leaves are green.", "answer": "Chlorophyll reflects green light."}]
+
+def test_numbering_style_is_fixed_by_the_first_question():
+    # With "Q1." questions, "1." lines are points of an answer
+    pairs = segment_qa("Q1. List two gases\n1. Oxygen is one gas\n2. Nitrogen is another\n")
+    assert len(pairs) == 1
+    assert pairs[0]["answer"] == "1. Oxygen is one gas\n2. Nitrogen is another"
+    # Without them, "1." lines are questions, but "3.14" is not
+    pairs = segment_qa("1. What is pi?\n3.14 roughly, an irrational number\n2) What is e?\nAbout 2.718 in value\n")
+    assert [p["question"] for p in pairs] == ["What is pi?", "What is e?"]
+
+def test_short_answers_and_unmarked_text():
+    assert segment_qa("Q1. Anything?\nNo.\nQ2. Nothing?\n") == []
+    assert segment_qa("") == []
+    paragraphs = "What does a ribosome make here?\n\nIt assembles proteins from amino acids.\n"
+    assert segment_qa(paragraphs) == [
+        {"question": "What does a ribosome make here?", "answer": "It assembles proteins from amino acids."}
+    ]
+
+def test_pages_segment_like_the_joined_text():
+    pages = ["Q1. First question here\nfirst answer, on the first page", "continued on page two\nQ2. Second\nsecond answer text"]
+    assert segment_qa(pages) == segment_qa(join_page_texts(pages))
+    assert segment_qa(pages)[0]["answer"] == "first answer, on the first page\n\ncontinued on page two"
+
+def test_long_answers_are_capped():
+    pairs = segment_qa("Q1. Essay\n" + "word " * 2000)
+    assert len(pairs[0]["answer"]) == ANSWER_MAX_CHARS
+
+def test_document_text_joins_pages_as_they_stream():
+    pages = ["", "  page one  ", "", "page two\n", ""]
+    document = _DocumentText()
+    assert segment_qa(document.feed(pages)) == []
+    assert document.text() == join_page_texts(pages)
+    with pytest.raises(Exception):
+        empty = _DocumentText()
+        list(empty.feed(["", "  "]))
+        empty.text()
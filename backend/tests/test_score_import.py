@@ -0,0 +1,57 @@
+from app.models import User, Syllabus, Topic, Analysis, TopicRollup
+from app.services.score_import import iter_records, import_scores
+
+def seed(db):
+    db.add(User(id=1, email="t@x", name="Teacher", role="teacher"))
+    db.add(User(id=2, email="s@x", name="Student", role="student", student_id="S2"))
+    db.add(Syllabus(id=1, teacher_id=1, topics=["Energy"]))
+    db.add(Topic(id=1, syllabus_id=1, name="Energy", key="energy"))
+    db.commit()
+
+def test_csv_records(db, tmp_path):
+    seed(db)
+    path = tmp_path / "scores.csv"
+    path.write_text("student_id,topic,score,sheet\nS2,Energy,80,t1\nS2,energy,60,t1\nS9,Energy,50,\nS2,Energy,120,\n")
+    summary = import_scores(db, iter_records(str(path)), 1)
+    assert (summary["records"], summary["imported"], summary["skipped"]) == (4, 2, 2)
+    assert summary["errors"] == ["Record 4: score 120.0 is outside 0-100", "Unknown student ID S9"]
+    rollup = db.query(TopicRollup).one()
+    assert (rollup.score_sum, rollup.score_count) == (140.0, 2)
+
+def test_malformed_jsonl_lines_are_reported_not_raised(db, tmp_path):
+    seed(db)
+    path = tmp_path / "scores.jsonl"
+    path.write_text(
+        '{"student_id": "S2", "topic": "Energy", "score": 70}\n'
+        "\n"
+        '{"student_id": "S2", "topic": \n'
+        "[1, 2]\n"
+        '"just a string"\n'
+        '{"student_id": "S2", "topic": "Energy", "score": [1]}\n'
+        '{"student_id": "S2", "topic": "Energy", "score": 90}\n'
+    )
+    # Batches of two: the bad lines land in a later batch than the first good one
+    summary = import_scores(db, iter_records(str(path)), 1, batch_size=2)
+    assert (summary["records"], summary["imported"], summary["skipped"]) == (6, 2, 4)
+    assert summary["errors"][0].startswith("Record 2: line 3 is not valid JSON")
+    assert summary["errors"][1:] == [
+        "Record 3: line 4 is not a JSON object",
+        "Record 4: line 5 is not a JSON object",
+        "Record 5: float() argument must be a string or a real number, not 'list'",
+    ]
+    assert sorted(a.understanding_score for a in db.query(Analysis)) == [70.0, 90.0]
+
+def test_non_dict_records_from_any_source_are_rejected(db):
+    seed(db)
+    summary = import_scores(db, [[1, 2], None, {"student_id": "S2", "topic": "Energy", "score": 55}], 1)
+    assert summary["imported"] == 1
+    assert summary["errors"] == ["Record 1: record is not an object", "Record 2: record is not an object"]
+
+def test_unreadable_csv_line_ends_the_import_with_a_summary(db, tmp_path):
+    seed(db)
+    path = tmp_path / "scores.csv"
+    # Longer than the csv module's field size limit
+    path.write_text("student_id,topic,score\nS2,Energy,75\nS2," + "x" * 200_000 + ",80\nS2,Energy,85\n")
+    summary = import_scores(db, iter_records(str(path)), 1)
+    assert summary["imported"] == 1
+    assert summary["errors"][0].startswith("Record 2: line 3 could not be read")
@@ -0,0 +1,62 @@
+from app.models import User, AccessCode, UploadBatch, AnswerSheet, Blob
+from app.services import search_index
+from app.services.search_index import index_qa_pairs, search
+
+def add_sheet(db, sheet_id, blob_id, student_id, access_code=None, batch_id=None, answer="Photosynthesis makes glucose"):
+    if db.get(Blob, blob_id) is None:
+        db.add(Blob(id=blob_id, sha256=f"{blob_id:064x}", file_path="x.pdf", size=0, ref_count=1))
+        db.flush()
+        index_qa_pairs(db, blob_id, [{"question": "What does photosynthesis make?", "answer": answer}])
+    db.add(AnswerSheet(id=sheet_id, student_id=student_id, access_code=access_code, batch_id=batch_id,
+                       content_hash=f"{blob_id:064x}", status="processed"))
+
+def seed(db):
+    db.add_all([
+        User(id=1, email="t1@x", name="Teacher One", role="teacher"),
+        User(id=2, email="t2@x", name="Teacher Two", role="teacher"),
+        User(id=3, email="s3@x", name="Student Three", role="student", student_id="S3"),
+        User(id=4, email="s4@x", name="Student Four", role="student", student_id="S4"),
+    ])
+    db.add_all([AccessCode(code="ONE", teacher_id=1), AccessCode(code="TWO", teacher_id=2)])
+    db.add(UploadBatch(id=1, teacher_id=1))
+    db.flush()
+
+def test_answers_are_limited_to_the_teachers_classes(db):
+    seed(db)
+    add_sheet(db, 1, 1, 3, access_code="ONE")
+    add_sheet(db, 2, 2, 4, batch_id=1, answer="Photosynthesis makes oxygen too")
+    add_sheet(db, 3, 3, 4, access_code="TWO", answer="Photosynthesis makes sugar")
+    db.commit()
+
+    sheets = lambda result: sorted(sheet["id"] for hit in result["results"] for sheet in hit["documents"])
+    assert sheets(search(db, "photosynthesis", teacher_id=1)) == [1, 2]
+    assert sheets(search(db, "photosynthesis", teacher_id=2)) == [3]
+    assert sheets(search(db, "photosynthesis")) == [1, 2, 3]
+
+def test_shared_blob_lists_only_the_teachers_sheets(db):
+    seed(db)
+    # Identical uploads in two teachers' classes share one blob
+    add_sheet(db, 1, 1, 3, access_code="ONE")
+    add_sheet(db, 2, 1, 4, access_code="TWO")
+    db.commit()
+
+    result = search(db, "glucose", teacher_id=2)
+    assert [sheet["id"] for sheet in result["results"][0]["documents"]] == [2]
+
+def test_reports_matches_left_out_of_ranking(db, monkeypatch):
+    seed(db)
+    # The oldest answer is the best match
+    add_sheet(db, 1, 1, 3, access_code="ONE", answer="Glucose, glucose and more glucose")
+    for i in range(2, 6):
+        add_sheet(db, i, i, 3, access_code="ONE", answer=f"Photosynthesis makes glucose, sheet {i}")
+    db.commit()
+
+    result = search(db, "glucose", teacher_id=1)
+    assert (result["ranked_candidates"], result["older_matches_omitted"]) == (search_index.SEARCH_RANK_CANDIDATES, False)
+    assert result["results"][0]["documents"][0]["id"] == 1
+
+    monkeypatch.setattr(search_index, "SEARCH_RANK_CANDIDATES", 2)
+    result = search(db, "glucose", teacher_id=1, page_size=1)
+    assert (result["ranked_candidates"], result["older_matches_omitted"]) == (2, True)
+    assert result["has_more"]
+    assert result["results"][0]["documents"][0]["id"] in (4, 5)
@@ -0,0 +1,112 @@
+import threading
+import time
+from app.database import SessionLocal
+from app.models import User, Syllabus, AnswerSheet, Blob, AnswerSignature, AnswerBand, SimilarityFlag
+from app.services import answer_sheet_pipeline, similarity
+from app.services.answer_sheet_pipeline import process_answer_sheet, _claim_blob, _release_blob
+from app.services.job_queue import JobDeferred
+from app.services.similarity import index_signatures, flag_similar_answers, NUM_BANDS
+
+ANSWER = "Plants use sunlight to turn water and carbon dioxide into glucose and release oxygen as a by product"
+QA_PAIRS = [{"question": "How do plants make food?", "answer": ANSWER}]
+PAGE = f"Q1. How do plants make food?\nAnswer: {ANSWER}"
+
+def seed(db, blobs=1, qa_pairs=None):
+    db.add(User(id=1, email="t@x", name="Teacher", role="teacher"))
+    db.add(Syllabus(id=1, teacher_id=1, topics=["Photosynthesis"]))
+    for i in (1, 2):
+        db.add(User(id=1 + i, email=f"s{i}@x", name=f"Student {i}", role="student", student_id=f"S{i}"))
+    for i in range(1, blobs + 1):
+        db.add(Blob(id=i, sha256=f"{i:064x}", file_path="x.pdf", size=0, ref_count=1, questions_answers=qa_pairs))
+    for i in (1, 2):
+        blob_id = min(i, blobs)
+        db.add(AnswerSheet(id=i, student_id=1 + i, access_code="CODE", content_hash=f"{blob_id:064x}", status="processing"))
+    db.commit()
+
+def test_signatures_stored_concurrently_are_kept_once(db, monkeypatch):
+    seed(db, qa_pairs=QA_PAIRS)
+    index_signatures(db, 1, QA_PAIRS)
+    db.commit()
+
+    # Another worker read no signatures before the first one committed
+    other = SessionLocal()
+    try:
+        monkeypatch.setattr(similarity, "load_signatures", lambda db, blob_ids: {})
+        assert list(index_signatures(other, 1, QA_PAIRS)) == [0]
+        other.commit()
+    finally:
+        other.close()
+    assert db.query(AnswerSignature).count() == 1
+    assert db.query(AnswerBand).count() == NUM_BANDS
+
+def test_bands_are_visible_before_flags_are_committed(db):
+    seed(db, blobs=2, qa_pairs=QA_PAIRS)
+    assert flag_similar_answers(db, db.get(AnswerSheet, 1), db.get(Blob, 1)) == 0
+
+    # A sheet processed at the same time can already find this one's bands
+    other = SessionLocal()
+    try:
+        assert other.query(AnswerBand).filter(AnswerBand.blob_id == 1).count() == NUM_BANDS
+    finally:
+        other.close()
+    db.commit()
+    assert flag_similar_answers(db, db.get(AnswerSheet, 2), db.get(Blob, 2)) == 1
+
+def test_flags_stored_concurrently_are_kept_once(db):
+    seed(db, blobs=2, qa_pairs=QA_PAIRS)
+    flag_similar_answers(db, db.get(AnswerSheet, 1), db.get(Blob, 1))
+    flag_similar_answers(db, db.get(AnswerSheet, 2), db.get(Blob, 2))
+    db.commit()
+    row = {"answer_sheet_id": 1, "position": 0, "other_answer_sheet_id": 2, "other_position": 0, "similarity": 1.0}
+    db.execute(similarity._insert_ignoring_duplicates(db, SimilarityFlag), [row])
+    db.commit()
+    assert db.query(SimilarityFlag).count() == 1
+
+def test_blob_claim_is_exclusive(db):
+    seed(db)
+    assert _claim_blob(db, 1, "worker-a")
+    assert not _claim_blob(db, 1, "worker-b")
+    assert _claim_blob(db, 1, "worker-a")
+    _release_blob(db, 1, "worker-a")
+    assert _claim_blob(db, 1, "worker-b")
+
+def test_identical_uploads_are_extracted_once(db, monkeypatch):
+    seed(db)
+    extractions = []
+    started = threading.Event()
+
+    def iter_pages(path):
+        extractions.append(path)
+        started.set()
+        # Slow enough for the other worker to find the blob claimed
+        time.sleep(0.3)
+        yield PAGE
+
+    monkeypatch.setattr(answer_sheet_pipeline.pdf_service, "iter_pages", iter_pages)
+    errors = []
+
+    def process(answer_sheet_id):
+        session = SessionLocal()
+        try:
+            process_answer_sheet(answer_sheet_id, session)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            session.close()
+
+    first = threading.Thread(target=process, args=(1,))
+    first.start()
+    started.wait()
+    # The second sheet is deferred rather than waiting on a worker
+    process(2)
+    first.join()
+    assert [type(error) for error in errors] == [JobDeferred]
+
+    # Run again by the queue, it reuses the first sheet's artifacts
+    process(2)
+    assert len(errors) == 1
+    assert len(extractions) == 1
+    assert [sheet.status for sheet in db.query(AnswerSheet).order_by(AnswerSheet.id)] == ["processed"] * 2
+    assert db.query(AnswerSignature).count() == 1
+    assert db.query(SimilarityFlag.answer_sheet_id, SimilarityFlag.other_answer_sheet_id).all() == [(1, 2)]
+    assert db.get(Blob, 1).claimed_by is None
@@ -0,0 +1,73 @@
+from app.services.topic_matcher import (
+    TopicMatcher, tokenize, topic_names, get_syllabus_matcher, compile_syllabus_matcher
+)
+
+def hit_topics(matcher, qa_pairs):
+    """Topic names hit in each pair"""
+    return [
+        sorted({matcher.topics[j] for term in hits for j in matcher.term_topics[term]})
+        for hits in matcher.match(qa_pairs)
+    ]
+
+def qa(answer, question=""):
+    return {"question": question, "answer": answer}
+
+def test_plurals_fold_onto_the_topic_term():
+    assert tokenize("Cells studies classes glass") == ["cell", "study", "classe", "glass"]
+    matcher = TopicMatcher(["Cell", "Study Skills"])
+    assert hit_topics(matcher, [qa("Two cells"), qa("Her studies"), qa("A cellar")]) == [
+        ["Cell"], ["Study Skills"], []
+    ]
+
+def test_shared_term_hits_every_topic_that_uses_it():
+    matcher = TopicMatcher(["Cell Biology", "Cell Division"])
+    assert matcher.term_topics[matcher.terms["cell"]] == [0, 1]
+    assert hit_topics(matcher, [qa("The cell membrane")]) == [["Cell Biology", "Cell Division"]]
+
+def test_overlapping_patterns_all_report():
+    # "kinetic energy" (a synonym phrase) contains the term "energy" of another topic
+    matcher = TopicMatcher(["Energy", "Motion"], synonyms={"Motion": ["kinetic energy"]})
+    hits = matcher.match([qa("kinetic energy is stored")])[0]
+    assert sorted(hits) == sorted([matcher.terms["motion"], matcher.terms["energy"]])
+
+def test_failure_links_recover_a_partial_phrase():
+    # After "heat energy" the phrase "heat energy loss" fails on "transfer";
+    # the failure link must land inside "energy transfer" to match it
+    matcher = TopicMatcher(
+        ["Conduction", "Power"],
+        synonyms={"Conduction": ["heat energy loss"], "Power": ["energy transfer"]}
+    )
+    assert hit_topics(matcher, [qa("heat energy transfer")]) == [["Power"]]
+    assert hit_topics(matcher, [qa("heat energy loss")]) == [["Conduction"]]
+
+def test_alternative_names_match_all_terms_of_the_topic():
+    assert topic_names("Cell Division (Mitosis / Meiosis)")[1] == ["Mitosis", "Meiosis"]
+    matcher = TopicMatcher(["Cell Division (Mitosis / Meiosis)"])
+    hits = matcher.match([qa("Meiosis halves the chromosomes")])[0]
+    assert sorted(hits) == sorted([matcher.terms["cell"], matcher.terms["division"]])
+
+def test_patterns_do_not_span_pairs_or_skipped_words():
+    matcher = TopicMatcher(["Motion"], synonyms={"Motion": ["kinetic energy"]})
+    assert matcher.match([qa("kinetic"), qa("energy")]) == [[], []]
+    assert matcher.match([qa("kinetic, the energy")]) == [[]]
+    # Punctuation between the words is not a word
+    assert matcher.match([qa("Kinetic-energy!")]) == [[matcher.terms["motion"]]]
+
+def test_stopword_only_topic_keeps_its_words():
+    matcher = TopicMatcher(["The Basics", "A and B"])
+    assert "basic" in matcher.terms
+    assert "b" in matcher.terms
+    assert "and" not in matcher.terms
+
+def test_non_ascii_text_and_empty_inputs():
+    matcher = TopicMatcher(["Café culture"])
+    assert hit_topics(matcher, [qa("Le café est fermé")]) == [["Café culture"]]
+    assert hit_topics(matcher, [{}]) == [[]]
+    assert TopicMatcher([]).match([qa("anything")]) == [[]]
+
+def test_cached_matcher_is_recompiled_when_topics_change():
+    first = compile_syllabus_matcher(9001, ["Energy"])
+    assert get_syllabus_matcher(9001, ["Energy"]) is first
+    second = get_syllabus_matcher(9001, ["Energy", "Motion"])
+    assert second is not first
+    assert second.topics == ["Energy", "Motion"]
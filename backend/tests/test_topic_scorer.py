@@ -0,0 +1,69 @@
+from app.models import User, Syllabus, AnswerSheet, Analysis, Blob, TermFrequency
+from app.routers.analytics import process_answer_sheet_analysis
+from app.services.term_frequencies import load_term_frequencies, record_sheet_terms
+from app.services.topic_scorer import score_sheets
+
+TOPICS = ["Cell Division", "Photosynthesis"]
+
+def sheet(answer):
+    return [{"question": "Explain", "answer": answer}]
+
+def score(results, topic="Cell Division"):
+    return next(a["understanding_score"] for a in results if a["topic"] == topic)
+
+def test_scores_are_deterministic_and_bounded():
+    sheets = [sheet("cell division in the cell"), sheet("photosynthesis"), sheet("nothing relevant")]
+    results = score_sheets(TOPICS, sheets)
+    assert results == score_sheets(TOPICS, sheets)
+    assert all(0 <= a["understanding_score"] <= 100 for analyses in results for a in analyses)
+    assert score(results[2]) == 0
+    assert results[1][1]["details"] == "Found 1/1 topic keywords in answers (Q1)"
+
+def test_term_shared_by_every_sheet_is_weighted_lower_in_a_batch():
+    sheets = [sheet("the cell"), sheet("a cell wall"), sheet("cell types"), sheet("division of labour")]
+    results = score_sheets(TOPICS, sheets)
+    assert score(results[0]) < score(results[3])
+    # Without other sheets both terms weigh the same
+    assert score(score_sheets(TOPICS, [sheets[0]])[0]) == score(score_sheets(TOPICS, [sheets[3]])[0])
+
+def test_single_sheet_is_weighted_by_the_syllabus_corpus():
+    corpus = (20, {"cell": 20, "division": 2})
+    common = score_sheets(TOPICS, [sheet("the cell")], corpus=corpus)[0]
+    rare = score_sheets(TOPICS, [sheet("division of labour")], corpus=corpus)[0]
+    assert score(common) < score(rare)
+    # Using both terms still scores full marks
+    assert score(score_sheets(TOPICS, [sheet("cell division")], corpus=corpus)[0]) == score(
+        score_sheets(TOPICS, [sheet("cell division")])[0]
+    )
+
+def test_term_frequencies_are_counted_per_sheet(db):
+    db.add(Syllabus(id=1, topics=TOPICS))
+    db.commit()
+    record_sheet_terms(db, 1, ["cell", "division"])
+    record_sheet_terms(db, 1, ["cell"])
+    record_sheet_terms(db, 1, [])
+    db.commit()
+    assert load_term_frequencies(db, 1) == (3, {"cell": 2, "division": 1})
+    assert load_term_frequencies(db, 2) == (0, {})
+
+def test_processed_sheets_feed_later_scores(db):
+    db.add(User(id=1, email="s@x", name="Student", role="student", student_id="S1"))
+    db.add(Syllabus(id=1, teacher_id=None, topics=TOPICS))
+    answers = ["every cell here"] * 5 + ["the cell again", "division of labour"]
+    for i, answer in enumerate(answers, start=1):
+        db.add(Blob(id=i, sha256=f"{i:064x}", file_path="x.pdf", size=0, ref_count=1, questions_answers=sheet(answer)))
+        db.add(AnswerSheet(id=i, student_id=1, content_hash=f"{i:064x}", status="processing"))
+    db.commit()
+
+    for i in range(1, len(answers) + 1):
+        process_answer_sheet_analysis(i, db)
+
+    assert db.get(Syllabus, 1).scored_sheets == len(answers)
+    counts = {row.term: row.sheet_count for row in db.query(TermFrequency)}
+    assert counts == {"cell": 6, "division": 1}
+    cell_division = {
+        row.answer_sheet_id: row.understanding_score
+        for row in db.query(Analysis).join(Analysis.topic).filter_by(name="Cell Division")
+    }
+    # The first sheet had nothing to compare with; later, "cell" is common and "division" rare
+    assert cell_division[6] < cell_division[1] < cell_division[7]
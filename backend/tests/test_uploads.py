@@ -0,0 +1,82 @@
+import zipfile
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from app.models import User, UploadBatch
+from app.routers import teachers
+from app.services import batch_upload
+from app.services.batch_upload import unpack_zip
+from app.services.upload_service import UploadSizeLimitMiddleware, UPLOAD_FORM_OVERHEAD
+
+LIMIT = 1024
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=LIMIT, path_limits={"/batch": 4 * LIMIT})
+    calls = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        calls.append(file.filename)
+        return {"size": len(await file.read())}
+
+    @app.post("/batch")
+    async def batch(file: UploadFile = File(...)):
+        calls.append(file.filename)
+        return {"size": len(await file.read())}
+
+    return TestClient(app), calls
+
+def multipart(size):
+    boundary = "b0undary"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.pdf\"\r\n"
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + b"x" * size + f"\r\n--{boundary}--\r\n".encode()
+    return body, {"content-type": f"multipart/form-data; boundary={boundary}"}
+
+def test_oversized_upload_is_refused_on_its_content_length():
+    client, calls = make_client()
+    body, headers = multipart(LIMIT + UPLOAD_FORM_OVERHEAD + 1)
+    response = client.post("/upload", content=body, headers=headers)
+    assert response.status_code == 413
+    assert calls == []
+
+    body, headers = multipart(LIMIT)
+    assert client.post("/upload", content=body, headers=headers).json() == {"size": LIMIT}
+    # Bulk routes have their own limit
+    body, headers = multipart(2 * LIMIT + UPLOAD_FORM_OVERHEAD)
+    assert client.post("/batch", content=body, headers=headers).json() == {"size": 2 * LIMIT + UPLOAD_FORM_OVERHEAD}
+
+def test_chunked_upload_is_refused_once_it_passes_the_limit():
+    client, calls = make_client()
+    body, headers = multipart(LIMIT + UPLOAD_FORM_OVERHEAD + 1)
+    # Without a Content-Length the body is counted as it arrives
+    chunks = (body[i:i + 4096] for i in range(0, len(body), 4096))
+    response = client.post("/upload", content=chunks, headers=headers)
+    assert response.status_code == 413
+    assert calls == []
+
+def test_oversized_manifest_in_zip_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_upload, "MANIFEST_MAX_BYTES", 64)
+    zip_path = tmp_path / "class.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("manifest.csv", "file,student_id\n" + "scan.pdf,S1\n" * 10)
+        archive.writestr("S1.pdf", b"%PDF-1.4\n%%EOF\n")
+    files, manifest, rejected = unpack_zip(str(zip_path), str(tmp_path / "out"))
+    assert [file["file_name"] for file in files] == ["S1.pdf"]
+    assert manifest == {}
+    assert [(entry["file_name"], entry["error"]) for entry in rejected] == [("manifest.csv", batch_upload.MANIFEST_TOO_LARGE)]
+
+def test_oversized_uploaded_manifest_is_refused(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(teachers, "MANIFEST_MAX_BYTES", 64)
+    from app.main import app
+    db.add(User(id=1, email="t@x", name="Teacher", role="teacher"))
+    db.commit()
+    response = TestClient(app).post(
+        "/api/teachers/answer-sheets/batch",
+        params={"teacher_id": 1},
+        files=[("files", ("manifest.csv", b"scan.pdf,S1\n" * 10, "text/csv"))]
+    )
+    assert response.status_code == 413
+    assert db.query(UploadBatch).count() == 0